@@ -16,14 +16,34 @@ import tempfile
 import zipfile
 import hashlib
 import threading
+import itertools
 import queue
+import logging
+from concurrent.futures import ThreadPoolExecutor
 import webbrowser
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 from typing import Dict, List, Tuple, Optional
 import tkinter as tk
 
 # 种族UUID映射
 from src.race_uuid_mapping import VANILLA_RACE_MAPPING, is_vanilla_race, get_race_options
+# 设置和性能统计
+from src.settings import load_settings, save_settings
+from src.profiler import BuildProfiler, setup_build_logger
+from src.pak_backends import create_pak_backend
+from src.import_modes import import_pak, resolve_pak_path, PakRefError, PAK_SUFFIXES
+from src.lsx_output import (write_lsx_node_stream, safe_shard_name, shard_file_names, shard_fingerprint,
+                            load_shard_manifest, save_shard_manifest, STREAM_BUFFER_SIZE, BUDGET_NODE_BYTES, SHARD_MODES)
+from src.appearance_dedup import dedupe_nodes, dedupe_indices, DEDUP_POLICIES
+from src.dir_watcher import DirWatcher
+from src.pipeline import StagePipeline, ParseCache
+from src.build_planner import build_plan, is_oversized
+from src.blob_store import BlobStore, TEMP_SUFFIX as BLOB_TEMP_SUFFIX
+from src.profiles import DEFAULT_PROFILE, profile_dirs, list_profiles, create_profile, delete_profile
+from src.pak_vfs import PakMounts, PakPath
+from src.zip_import import ZIP_SUFFIX, PART_SUFFIX, list_zip_paks, import_zip_pak
+from src.patch_validator import PatchValidator
+from src.spill import spill_text, NodeSpill, SpilledNodes
 
 def get_application_path():
     """获取程序路径，支持开发和打包环境"""
@@ -71,15 +91,31 @@ class BG3CompatibilityGenerator:
         
         # 数据目录
         self.data_dir = self.app_dir / "Data"
-        self.sourcemod_dir = self.data_dir / "Sourcemod"
-        self.panagway_dir = self.data_dir / "Panagway"
-        self.output_dir = self.data_dir / "Output"
+        self.log_dir = self.data_dir / "Logs"
+        
+        # 设置、日志和性能统计
+        self.settings = load_settings(self.data_dir / "settings.json")
+        self.logger = setup_build_logger(self.log_dir, self.settings['log_max_bytes'], self.settings['log_backup_count'])
+        self.profiler = BuildProfiler(self.logger, self.log_dir)
+        self.pak_backend = create_pak_backend(self.settings, self.divine_exe, self.logger)
+        
+        # 配置和共享存储，种族/外观/输出目录随配置切换
+        self.blob_store = BlobStore(self.data_dir / "Store", self.logger)
+        self.active_profile = self.settings.get('active_profile', DEFAULT_PROFILE)
+        if self.active_profile not in list_profiles(self.data_dir):
+            self.active_profile = DEFAULT_PROFILE
+        self._apply_profile_dirs()
+        
+        # archive解析方式下打开的pak
+        self.pak_mounts = PakMounts(int(self.settings.get('vfs_cache_mb', 8) or 0) * 1024 * 1024)
         
         # 数据存储
         self.selected_race_paks = []
         self.selected_appearance_paks = []
         self.race_data = {}  # 种族数据
         self.appearance_data = {}  # 外观数据
+        self.dedup_dropped = 0  # 上次生成合并的重复外观节点数
+        self.parse_cache = ParseCache()  # 按文件夹签名缓存解析结果
         
         # 外观MOD种族选择
         self.appearance_race_selections = {}  # {pak_file_path: selected_race_uuid}
@@ -94,6 +130,10 @@ class BG3CompatibilityGenerator:
         self.current_task_thread = None
         self.is_task_running = False
         
+        # 目录监视，任务进行中的变化等任务结束后再处理
+        self.mod_watcher = None
+        self.pending_mod_changes = set()
+        
         # 创建UI管理器
         self.ui_manager = UIManager(self)
         
@@ -103,9 +143,15 @@ class BG3CompatibilityGenerator:
         # 确保目录存在
         self.ensure_directories()
         
+        # 清理上次运行中删除的MOD留下的存储文件
+        self.collect_store_garbage()
+        
         # 自动加载pak文件
         self.auto_load_preset_paks()
         
+        # 监视Sourcemod/Panagway
+        self.start_mod_watcher()
+        
         # 显示窗口并居中
         self.center_window()
         
@@ -155,8 +201,15 @@ class BG3CompatibilityGenerator:
                     # 生成完成后打开输出目录
                     if message.get('subtype') == 'generate_patch':
                         self.open_output_directory()
+                    # 重新导入替换了解包文件夹，旧内容不再被引用
+                    elif message.get('subtype') == 'import_files':
+                        self.collect_store_garbage()
+                    elif message.get('subtype') == 'create_profile':
+                        self.switch_profile(message['profile'])
                 elif message['type'] == 'error':
-                    # 错误消息
+                    # 错误消息，带subtype的是整个任务失败
+                    if message.get('subtype'):
+                        self.is_task_running = False
                     self.progress_bar['value'] = 0
                     self.progress_var.set(self.texts.get("progress_idle", "就绪"))
                     self.ui_manager.show_error_message(self.texts.get("error_title", "错误"), message['text'])
@@ -164,64 +217,162 @@ class BG3CompatibilityGenerator:
                     # 文件复制进度更新
                     self.progress_bar['value'] = message['value']
                     self.progress_var.set(message['text'])
+                elif message['type'] == 'build_plan':
+                    # 后台预估完成，对话框在主线程中显示
+                    self.is_task_running = False
+                    self.progress_var.set(self.texts.get("progress_idle", "就绪"))
+                    self.root.after(0, self._on_build_plan, message)
+                elif message['type'] == 'mod_folder_changed':
+                    # 目录监视发现变化
+                    if self.is_task_running:
+                        self.pending_mod_changes.update(message['paths'])
+                    else:
+                        self._reindex_safely(message['paths'])
         except queue.Empty:
             pass
         
+        # 任务结束后处理期间积累的目录变化
+        if self.pending_mod_changes and not self.is_task_running:
+            paths, self.pending_mod_changes = self.pending_mod_changes, set()
+            self._reindex_safely(paths)
+        
         # 每100ms检查队列
         self.root.after(100, self.process_task_queue)
     
     def _import_and_extract_files_async(self, files, dest_dir, file_type):
-        """异步导入解包文件"""
+        """异步导入解包文件
+        
+        导入、解包、解析通过流水线串联，一个pak解包完就开始解析，同时解包下一个。
+        需要批量解包的后端(Divine批量模式)先导入全部文件，解包完一个解析一个。
+        """
+        self.profiler.begin("import")
+        success = False
         try:
             # 确保目标目录存在
             dest_dir.mkdir(parents=True, exist_ok=True)
             
-            total_files = len(files)
-            processed_count = 0
-            
-            for i, file_path in enumerate(files):
+            # zip发布包中的每个pak作为一个导入项
+            import_items = self._expand_import_files(files)
+            total_files = len(import_items)
+            scan_kind = "race" if dest_dir == self.sourcemod_dir else "appearance"
+            scan_func = self._scan_race_folder if scan_kind == "race" else self._scan_appearance_folder
+            # 导入和解包各占一半进度
+            imported = [0]
+            extracted = [0]
+            
+            def import_file(indexed_item):
+                index, (file_path, zip_member) = indexed_item
                 try:
                     source_file = Path(file_path)
-                    dest_file = dest_dir / source_file.name
+                    file_name = Path(zip_member).name if zip_member else source_file.name
                     
                     # 复制进度
-                    progress = (i / total_files) * 50  # 复制占50%进度
                     self.task_queue.put({
                         'type': 'file_progress',
-                        'value': progress,
-                        'text': self.texts.get("progress_copying_race" if file_type == "种族" else "progress_copying_appearance", f"正在复制{file_type}文件: {{file_name}} ({{current}}/{{total}})").format(file_name=source_file.name, current=i+1, total=total_files)
+                        'value': (imported[0] + extracted[0]) / (total_files * 2) * 100,
+                        'text': self.texts.get("progress_copying_race" if file_type == "种族" else "progress_copying_appearance", f"正在复制{file_type}文件: {{file_name}} ({{current}}/{{total}})").format(file_name=file_name, current=index + 1, total=total_files)
                     })
                     
                     # 文件存在则跳过复制
-                    if not dest_file.exists():
-                        shutil.copy2(source_file, dest_file)
+                    with self.profiler.stage("import"):
+                        if zip_member:
+                            # zip中的pak直接流式写入导入目录，总是实际写出文件
+                            dest_entry, method = import_zip_pak(source_file, zip_member, dest_dir, self.logger)
+                        else:
+                            dest_entry, method = import_pak(source_file, dest_dir, self.settings.get('import_mode', 'link'))
+                        if method != "exists":
+                            file_size = dest_entry.stat().st_size if zip_member else source_file.stat().st_size
+                            self.profiler.count("import", files_scanned=1, bytes_read=file_size if method in ("copy", "reference", "zip") else 0,
+                                                bytes_written=file_size if method in ("copy", "zip") else 0)
+                            self.logger.info("导入 %s (%s)", file_name, method)
+                    if method in ("copy", "zip") and self.settings.get('use_blob_store', True):
+                        # 复制来的pak也共享存储；链接和引用方式指向用户的原文件，不放入
+                        self.blob_store.ingest_file(dest_entry)
+                    imported[0] += 1
+                    
+                    # 引用方式直接解包原文件
+                    return str(resolve_pak_path(dest_entry)), dest_dir / dest_entry.stem
                     
-                    # 解包进度
-                    progress = 50 + (i / total_files) * 50  # 解包占50%进度
+                except Exception as e:
+                    self.logger.warning("处理文件 %s 失败: %s", file_path, e)
                     self.task_queue.put({
-                        'type': 'file_progress',
-                        'value': progress,
-                        'text': self.texts.get("progress_unpacking_race" if file_type == "种族" else "progress_unpacking_appearance", f"正在解包{file_type}文件: {{file_name}} ({{current}}/{{total}})").format(file_name=source_file.name, current=i+1, total=total_files)
+                        'type': 'error',
+                        'text': self.texts.get("progress_copy_failed", "处理文件 {file_name} 失败: {error}").format(file_name=Path(file_path).name, error=str(e))
                     })
-                    
-                    # 解包文件
-                    pak_type = "race" if file_type == "种族" else "appearance"
-                    extract_dir = dest_dir / source_file.stem
-                    
-                    # 删除旧解包目录
-                    if extract_dir.exists():
-                        shutil.rmtree(extract_dir)
-                    
-                    # 解包文件
-                    self._extract_pak_to_directory(str(dest_file), extract_dir)
-                    processed_count += 1
-                    
+                    raise
+            
+            def extract_file(extract_job):
+                pak_file, extract_dir = extract_job
+                self.task_queue.put({
+                    'type': 'file_progress',
+                    'value': (imported[0] + extracted[0]) / (total_files * 2) * 100,
+                    'text': self.texts.get("progress_unpacking_race" if file_type == "种族" else "progress_unpacking_appearance", f"正在解包{file_type}文件: {{file_name}} ({{current}}/{{total}})").format(file_name=Path(pak_file).name, current=extracted[0] + 1, total=total_files)
+                })
+                try:
+                    with self.profiler.stage("extract"):
+                        self._extract_pak_to_directory(pak_file, extract_dir)
+                        self._count_extracted(pak_file, extract_dir)
                 except Exception as e:
                     self.task_queue.put({
                         'type': 'error',
-                        'text': self.texts.get("progress_copy_failed", "处理文件 {file_name} 失败: {error}").format(file_name=source_file.name, error=str(e))
+                        'text': self.texts.get("progress_copy_failed", "处理文件 {file_name} 失败: {error}").format(file_name=Path(pak_file).name, error=str(e))
                     })
-                    continue
+                    raise
+                finally:
+                    extracted[0] += 1
+                return extract_dir
+            
+            def parse_folder(extract_dir):
+                # 先放进共享存储再解析，避免存储替换文件后缓存签名变化
+                if not isinstance(extract_dir, PakPath):
+                    self._store_extracted(extract_dir)
+                # 结果进入解析缓存，刷新列表和生成时直接使用
+                with self.profiler.stage("parse"):
+                    return self.parse_cache.get_or_scan(scan_kind, extract_dir, scan_func)
+            
+            def open_archive(extract_job):
+                # archive方式不解包，直接读取pak；读取不了的pak(非LSPK v18)仍然解包
+                pak_file, extract_dir = extract_job
+                try:
+                    root = self.pak_mounts.root(self._pak_entry(dest_dir, extract_dir.name))
+                except Exception as e:
+                    self.logger.warning("无法直接读取 %s，改为解包: %s", Path(pak_file).name, e)
+                    return extract_file(extract_job)
+                extracted[0] += 1
+                return root
+            
+            queue_size = self.settings.get('pipeline_queue_size', 4)
+            if self.settings.get('parse_mode', "extract") == "archive":
+                pipeline = StagePipeline([("import", import_file), ("open", open_archive), ("parse", parse_folder)],
+                                         queue_size, self.logger)
+                results = pipeline.run(list(enumerate(import_items)))
+            elif self.pak_backend.batch_extract:
+                def produce(emit):
+                    extract_jobs = []
+                    for indexed_file in enumerate(import_items):
+                        try:
+                            extract_jobs.append(import_file(indexed_file))
+                        except Exception:
+                            continue
+                    
+                    # 批量解包，每个pak完成后立即交给解析
+                    extract_dirs = dict(extract_jobs)
+                    results = self._extract_paks(extract_jobs, file_type,
+                                                 on_extracted=lambda pak_file: emit(extract_dirs[pak_file]))
+                    for pak_file, error in results.items():
+                        if error:
+                            self.task_queue.put({
+                                'type': 'error',
+                                'text': self.texts.get("progress_copy_failed", "处理文件 {file_name} 失败: {error}").format(file_name=Path(pak_file).name, error=error)
+                            })
+                
+                pipeline = StagePipeline([("parse", parse_folder)], queue_size, self.logger)
+                results = pipeline.run(producer=produce)
+            else:
+                pipeline = StagePipeline([("import", import_file), ("extract", extract_file), ("parse", parse_folder)],
+                                         queue_size, self.logger)
+                results = pipeline.run(list(enumerate(import_items)))
+            processed_count = sum(1 for index in range(len(results)) if index not in pipeline.errors)
             
             # 刷新列表
             self.task_queue.put({
@@ -229,46 +380,115 @@ class BG3CompatibilityGenerator:
                 'subtype': 'import_files',
                 'text': self.texts.get("progress_copy_success", "成功处理 {count} 个{file_type}文件").format(count=processed_count, file_type=file_type)
             })
+            success = True
             
             # 主线程刷新pak列表
             self.root.after(0, self.refresh_pak_lists)
             
         except Exception as e:
+            self.logger.exception("导入%s文件时发生错误", file_type)
             self.task_queue.put({
                 'type': 'error',
+                'subtype': 'import_files',
                 'text': f"导入{file_type}文件时发生错误: {str(e)}"
             })
+        finally:
+            self.profiler.finish(success)
+    
+    def _expand_import_files(self, files) -> list:
+        """把选择的文件展开为[(文件路径, zip成员名或None), ...]，zip中的每个pak各占一项
+        
+        导入后只用文件名，重名(不区分大小写)的pak只导入第一个，其余报告后跳过。
+        """
+        import_items = []
+        seen_names = set()
+        
+        def add_item(file_path, member):
+            name = PurePosixPath(member).name if member else Path(file_path).name
+            if name.lower() in seen_names:
+                self.logger.warning("跳过重名的pak %s (%s)", name, f"{file_path}:{member}" if member else file_path)
+                self.task_queue.put({
+                    'type': 'error',
+                    'text': self.texts.get("import_duplicate_pak", "{file_name} 中的 {pak_name} 与已选择的pak重名，已跳过").format(
+                        file_name=Path(file_path).name, pak_name=member or name)
+                })
+                return
+            seen_names.add(name.lower())
+            import_items.append((file_path, member))
+        
+        for file_path in files:
+            if Path(file_path).suffix.lower() != ZIP_SUFFIX:
+                add_item(file_path, None)
+                continue
+            try:
+                members = list_zip_paks(Path(file_path))
+                if not members:
+                    raise ValueError(self.texts.get("zip_no_pak", "压缩包中没有pak文件"))
+            except Exception as e:
+                self.logger.warning("读取压缩包 %s 失败: %s", file_path, e)
+                self.task_queue.put({
+                    'type': 'error',
+                    'text': self.texts.get("progress_copy_failed", "处理文件 {file_name} 失败: {error}").format(file_name=Path(file_path).name, error=str(e))
+                })
+                continue
+            for member in members:
+                add_item(file_path, member)
+        return import_items
+    
+    def _extract_paks(self, extract_jobs, file_type, on_extracted=None):
+        """解包多个pak，返回{pak_file: 错误信息或None}，on_extracted(pak_file)在每个pak解包成功后调用"""
+        total_files = len(extract_jobs)
+        if not total_files:
+            return {}
+        
+        self.task_queue.put({
+            'type': 'file_progress',
+            'value': 50,
+            'text': self.texts.get("progress_unpacking_race" if file_type == "种族" else "progress_unpacking_appearance", f"正在解包{file_type}文件: {{file_name}} ({{current}}/{{total}})").format(file_name=Path(extract_jobs[0][0]).name, current=1, total=total_files)
+        })
+        
+        done = []
+        def on_done(pak_file, error):
+            done.append(pak_file)
+            if not error:
+                self._count_extracted(pak_file, dict(extract_jobs)[pak_file])
+                if on_extracted:
+                    on_extracted(pak_file)
+            # 解包进度
+            self.task_queue.put({
+                'type': 'file_progress',
+                'value': 50 + (len(done) / total_files) * 50,  # 解包占50%进度
+                'text': self.texts.get("progress_unpacking_race" if file_type == "种族" else "progress_unpacking_appearance", f"正在解包{file_type}文件: {{file_name}} ({{current}}/{{total}})").format(file_name=Path(pak_file).name, current=len(done), total=total_files)
+            })
+        
+        with self.profiler.stage("extract"):
+            return self.pak_backend.extract_many(extract_jobs, on_done=on_done)
     
     def _extract_pak_to_directory(self, pak_file: str, extract_dir: Path):
         """解包pak文件"""
         try:
-            # 确保目录存在
-            extract_dir.mkdir(parents=True, exist_ok=True)
-            
-            # 调用Divine.exe解包
-            cmd = [
-                str(self.divine_exe),
-                "--game", "bg3",
-                "--action", "extract-package",
-                "--source", pak_file,
-                "--destination", str(extract_dir)
-            ]
+            # 删除旧解包目录
+            if extract_dir.exists():
+                shutil.rmtree(extract_dir)
             
-            # Windows隐藏控制台
-            creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=self.divine_exe.parent, creationflags=creation_flags)
-            
-            if result.returncode != 0:
-                error_msg = result.stderr if result.stderr else result.stdout
-                raise Exception(f"Divine.exe解包失败 (返回码: {result.returncode}): {error_msg}")
-            
-            # 检查解包结果
-            if not extract_dir.exists() or not any(extract_dir.iterdir()):
-                raise Exception(f"解包后目录为空或不存在: {extract_dir}")
+            self.pak_backend.extract(pak_file, extract_dir)
                 
         except Exception as e:
             raise Exception(f"解包 {Path(pak_file).name} 失败: {e}")
     
+    def _count_extracted(self, pak_file: str, extract_dir: Path):
+        """统计解包读写量"""
+        if not self.profiler.active:
+            return
+        extracted_files = 0
+        extracted_bytes = 0
+        for root, _, files in os.walk(extract_dir):
+            for name in files:
+                extracted_files += 1
+                extracted_bytes += os.path.getsize(os.path.join(root, name))
+        self.profiler.count("extract", files_scanned=extracted_files,
+                            bytes_read=os.path.getsize(pak_file), bytes_written=extracted_bytes)
+    
     def load_language(self, language_code):
         """加载语言文件"""
         try:
@@ -435,7 +655,209 @@ class BG3CompatibilityGenerator:
 
             self.refresh_pak_lists()
         except Exception as e:
-            pass
+            self.logger.warning("自动加载pak文件失败: %s", e)
+    
+    def start_mod_watcher(self):
+        """启动Sourcemod/Panagway目录监视"""
+        if not self.settings.get('watch_mod_folders', True):
+            return
+        try:
+            self.mod_watcher = DirWatcher([self.sourcemod_dir, self.panagway_dir],
+                                          lambda paths: self.task_queue.put({'type': 'mod_folder_changed', 'paths': paths}),
+                                          self.logger, poll_interval=self.settings.get('watch_poll_interval', 0.25))
+            backend = self.mod_watcher.start()
+            self.logger.info("目录监视已启动 (%s)", backend)
+        except Exception as e:
+            self.mod_watcher = None
+            self.logger.warning("启动目录监视失败: %s", e)
+    
+    def _apply_profile_dirs(self):
+        """按当前配置设置种族、外观、输出目录"""
+        dirs = profile_dirs(self.data_dir, self.active_profile)
+        self.sourcemod_dir = dirs['sourcemod']
+        self.panagway_dir = dirs['panagway']
+        self.output_dir = dirs['output']
+    
+    def switch_profile(self, profile_name: str):
+        """切换配置，只切换目录并刷新列表，不复制文件"""
+        if profile_name == self.active_profile:
+            return
+        if self.is_task_running:
+            self.ui_manager.show_warning_message(self.texts.get("warning_title", "警告"), self.texts.get("warning_task_running", "有任务正在运行，请等待完成后再操作"))
+            return
+        
+        if self.mod_watcher:
+            self.mod_watcher.stop()
+            self.mod_watcher = None
+        self.pending_mod_changes.clear()
+        
+        # 解析数据按目录记录，换目录后清空，刷新时从解析缓存重新取
+        self.race_data.clear()
+        self.appearance_data.clear()
+        
+        self.active_profile = profile_name
+        self._apply_profile_dirs()
+        self.ensure_directories()
+        self.settings['active_profile'] = profile_name
+        save_settings(self.data_dir / "settings.json", self.settings)
+        self.logger.info("切换到配置 %s", profile_name)
+        
+        self.refresh_pak_lists()
+        self.start_mod_watcher()
+    
+    def create_new_profile(self, profile_name: str, clone_current: bool = True):
+        """新建配置，完成后切换过去，clone_current时共享当前配置的MOD文件"""
+        if self.is_task_running:
+            self.ui_manager.show_warning_message(self.texts.get("warning_title", "警告"), self.texts.get("warning_task_running", "有任务正在运行，请等待完成后再操作"))
+            return
+        self.is_task_running = True
+        self.progress_var.set(self.texts.get("progress_creating_profile", "正在创建配置..."))
+        self.current_task_thread = threading.Thread(target=self._create_profile_async, args=(profile_name, clone_current))
+        self.current_task_thread.daemon = True
+        self.current_task_thread.start()
+    
+    def _create_profile_async(self, profile_name: str, clone_current: bool):
+        """后台创建配置，放进存储要计算每个文件的哈希，不能在主线程中进行"""
+        try:
+            if clone_current and self.settings.get('use_blob_store', True):
+                # 克隆前先把当前文件放进存储，新配置只是硬链接
+                for directory in (self.sourcemod_dir, self.panagway_dir):
+                    self.blob_store.ingest_tree(directory)
+            create_profile(self.data_dir, profile_name, self.blob_store, self.active_profile if clone_current else None)
+        except Exception as e:
+            self.logger.exception("创建配置失败")
+            self.task_queue.put({'type': 'error', 'subtype': 'create_profile', 'text': str(e)})
+            return
+        self.task_queue.put({'type': 'complete', 'subtype': 'create_profile', 'profile': profile_name,
+                             'text': self.texts.get("profile_created", "已创建配置 {}").format(profile_name)})
+    
+    def delete_current_profile(self):
+        """删除当前配置并回到默认配置"""
+        profile_name = self.active_profile
+        if profile_name == DEFAULT_PROFILE or self.is_task_running:
+            return
+        self.switch_profile(DEFAULT_PROFILE)
+        try:
+            removed, freed = delete_profile(self.data_dir, profile_name, self.blob_store)
+            self.logger.info("删除配置 %s，清理存储文件 %d 个 (%d 字节)", profile_name, removed, freed)
+        except Exception as e:
+            self.ui_manager.show_error_message(self.texts.get("error_title", "错误"), str(e))
+    
+    def _pak_entry(self, pak_dir: Path, stem: str):
+        """导入目录中名为stem的pak或.pakref，没有时返回None"""
+        for suffix in PAK_SUFFIXES:
+            candidate = pak_dir / f"{stem}{suffix}"
+            if candidate.is_file():
+                return candidate
+        return None
+    
+    def _mod_root(self, pak_dir: Path, stem: str, strict: bool = False):
+        """MOD的解析根目录
+        
+        archive方式下是pak本身(PakPath)，读取不了时用解包文件夹；都没有时返回None。
+        引用的原文件丢失或变化时，strict为True则抛出PakRefError，否则跳过这个MOD。
+        """
+        extract_dir = pak_dir / stem
+        if self.settings.get('parse_mode', "extract") == "archive":
+            pak_entry = self._pak_entry(pak_dir, stem)
+            if pak_entry:
+                try:
+                    return self.pak_mounts.root(pak_entry)
+                except PakRefError as e:
+                    if strict:
+                        raise
+                    self.logger.warning("跳过 %s: %s", pak_entry.name, e)
+                    return None
+                except Exception as e:
+                    self.logger.warning("无法直接读取 %s，使用解包文件夹: %s", pak_entry.name, e)
+        return extract_dir if extract_dir.is_dir() else None
+    
+    def _mod_roots(self, pak_dir: Path, strict: bool = False) -> list:
+        """导入目录中所有MOD的解析根目录，strict见_mod_root"""
+        if not pak_dir.exists():
+            return []
+        if self.settings.get('parse_mode', "extract") != "archive":
+            return [folder for folder in pak_dir.iterdir() if folder.is_dir()]
+        
+        roots = []
+        for pak_entry in pak_dir.iterdir():
+            if pak_entry.is_file() and pak_entry.suffix in PAK_SUFFIXES:
+                root = self._mod_root(pak_dir, pak_entry.stem, strict)
+                if root is not None:
+                    roots.append(root)
+        return roots
+    
+    def _memory_budget(self) -> int:
+        """内存预算(字节)，0表示不限制"""
+        return max(0, int(self.settings.get('memory_budget_mb', 0) or 0)) * 1024 * 1024
+    
+    def _stream_buffer_size(self) -> int:
+        """输出写入缓冲区大小，有内存预算时按预算缩小"""
+        budget = self._memory_budget()
+        if not budget:
+            return STREAM_BUFFER_SIZE
+        return max(64 * 1024, min(STREAM_BUFFER_SIZE, budget // 16))
+    
+    def _shard_max_nodes(self) -> int:
+        """每个分片文件的最大节点数，有内存预算时不超过预算允许的大小"""
+        max_nodes = int(self.settings.get('output_shard_max_nodes', 0) or 0)
+        budget = self._memory_budget()
+        if budget:
+            # 打包时一个文件的内容和压缩结果同时在内存中，单个文件不超过预算的1/4
+            budget_nodes = max(1, budget // (4 * BUDGET_NODE_BYTES))
+            max_nodes = min(max_nodes, budget_nodes) if max_nodes > 0 else budget_nodes
+        return max_nodes
+    
+    def _appearance_content(self, appearance_info: dict) -> str:
+        """外观文件内容，内存预算模式下从临时文件读取"""
+        content = appearance_info.get('content')
+        if content is None:
+            content = Path(appearance_info['content_file']).read_text(encoding='utf-8')
+        return content
+    
+    def _prune_spill(self):
+        """删除内存预算模式下不再被解析缓存引用的临时文件
+        
+        缓存中的外观内容文件保留，下次预估或生成可以继续使用；
+        节点临时文件、过期内容和上次异常退出留下的文件都会删除。
+        """
+        spill_dir = self.temp_dir / "spill"
+        if not spill_dir.exists():
+            return
+        referenced = {info['content_file'] for result in self.parse_cache.results() if isinstance(result, dict)
+                      for _, info in result.get('entries', []) if 'content_file' in info}
+        for spill_file in spill_dir.iterdir():
+            if str(spill_file) not in referenced:
+                try:
+                    spill_file.unlink()
+                except OSError as e:
+                    self.logger.debug("删除临时文件 %s 失败: %s", spill_file, e)
+    
+    def _store_extracted(self, extract_dir: Path):
+        """把解包结果放进共享存储，相同内容只保留一份"""
+        if not self.settings.get('use_blob_store', True):
+            return
+        with self.profiler.stage("store"):
+            files, saved = self.blob_store.ingest_tree(extract_dir)
+        if saved:
+            self.logger.info("%s 放入存储 %d 个文件，与已有内容重复 %d 字节", extract_dir.name, files, saved)
+    
+    def collect_store_garbage(self):
+        """在后台删除不再被任何配置引用的存储文件，删除、清空或重新导入MOD后调用，返回清理线程"""
+        if not self.blob_store.blob_dir.exists():
+            return
+        thread = threading.Thread(target=self._collect_store_garbage_async)
+        thread.daemon = True
+        thread.start()
+        return thread
+    
+    def _collect_store_garbage_async(self):
+        try:
+            removed, freed = self.blob_store.gc()
+            if removed:
+                self.logger.info("清理存储文件 %d 个 (%d 字节)", removed, freed)
+        except Exception as e:
+            self.logger.warning("清理存储失败: %s", e)
     
     def ensure_directories(self):
         """确保目录存在"""
@@ -444,6 +866,7 @@ class BG3CompatibilityGenerator:
         self.sourcemod_dir.mkdir(parents=True, exist_ok=True)
         self.panagway_dir.mkdir(parents=True, exist_ok=True)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
 
 
     
@@ -591,6 +1014,7 @@ class BG3CompatibilityGenerator:
                     extract_dir = self.panagway_dir / pak_file.stem
                     if extract_dir.exists():
                         shutil.rmtree(extract_dir)
+                    self.collect_store_garbage()
                     
                     # 更新显示
                     self.update_appearance_listbox()
@@ -602,30 +1026,115 @@ class BG3CompatibilityGenerator:
             self.ui_manager.show_error_message(self.texts.get("error", "错误"), 
                                 self.texts.get("delete_error", "删除文件时出错: {error}").format(error=str(e)))
     
+    def show_last_run_stats(self):
+        """显示上次运行统计"""
+        self.ui_manager.show_stats_dialog(self.profiler.load_last_stats())
+    
+    def show_build_plan(self):
+        """显示生成预估"""
+        if self.is_task_running:
+            self.ui_manager.show_warning_message(self.texts.get("warning_title", "警告"), self.texts.get("warning_task_running", "有任务正在运行，请等待完成后再操作"))
+            return
+        self._start_build_plan("show")
+    
+    def _start_build_plan(self, purpose: str):
+        """在后台线程中预估生成规模，完成后由_on_build_plan处理，purpose为show或generate"""
+        self.is_task_running = True
+        self.progress_var.set(self.texts.get("progress_planning", "正在预估生成规模..."))
+        self.current_task_thread = threading.Thread(target=self._build_plan_async, args=(purpose,))
+        self.current_task_thread.daemon = True
+        self.current_task_thread.start()
+    
+    def _build_plan_async(self, purpose: str):
+        """后台预估，解析和提取节点可能需要较长时间，不能在主线程中进行"""
+        try:
+            self.task_queue.put({'type': 'build_plan', 'purpose': purpose, 'plan': self.plan_build(), 'error': None})
+        except Exception as e:
+            self.logger.exception("生成预估失败")
+            self.task_queue.put({'type': 'build_plan', 'purpose': purpose, 'plan': None, 'error': str(e)})
+    
+    def _on_build_plan(self, message: dict):
+        """预估完成后显示结果，或者确认后开始生成"""
+        if message['purpose'] == "show":
+            if message['error']:
+                self.ui_manager.show_error_message(self.texts.get("error_title", "错误"), message['error'])
+            else:
+                self.ui_manager.show_plan_dialog(message['plan'])
+            return
+        
+        # 预估失败不阻止生成
+        plan = message['plan']
+        if plan and is_oversized(plan, self.settings):
+            if not messagebox.askyesno(self.texts.get("build_plan_too_large_title", "生成规模过大"),
+                                       self.texts.get("build_plan_too_large", "预计输出 {nodes} 个外观节点，约 {size:.1f}MB，需要约 {seconds:.0f} 秒。\n是否继续生成？").format(
+                                           nodes=plan['total_nodes'], size=plan['projected_bytes'] / (1024 * 1024), seconds=plan['estimated_seconds'])):
+                return
+        self._start_generation()
+    
+    def plan_build(self) -> dict:
+        """统计生成规模，不生成输出，也不改动race_data/appearance_data
+        
+        和生成时一样解析(使用解析缓存)、提取匹配节点并去重，但不为每个种族展开。
+        """
+        target_races = 0
+        for race_subfolder in self._mod_roots(self.sourcemod_dir):
+            target_races += len(self.parse_cache.get_or_scan("race", race_subfolder, self._scan_race_folder))
+        
+        rows = []
+        source_nodes = []
+        for appearance_subfolder in self._mod_roots(self.panagway_dir):
+            pak_path = self._find_appearance_pak(appearance_subfolder)
+            selected_race_uuid = self.appearance_race_selections.get(pak_path)
+            race_info = VANILLA_RACE_MAPPING.get(selected_race_uuid.lower()) if selected_race_uuid else None
+            if not race_info:
+                continue
+                
+            scan_result = self.parse_cache.get_or_scan("appearance", appearance_subfolder, self._scan_appearance_folder)
+            node_count = 0
+            for appearance_key, appearance_info in scan_result['entries']:
+                for description_part, attributes_part in self._extract_source_nodes(self._appearance_content(appearance_info), selected_race_uuid):
+                    source_nodes.append({'description': description_part, 'attributes': attributes_part})
+                    node_count += 1
+            rows.append({'pak': Path(pak_path).name, 'race': race_info['name_en'], 'nodes': node_count})
+        
+        kept_nodes, dropped = dedupe_nodes(source_nodes, self.settings.get('appearance_dedup_policy', "first"),
+                                           include_race=target_races == 0)
+        plan = build_plan(rows, kept_nodes, dropped, target_races, self.profiler.load_history("generate"))
+        self.logger.info("生成预估: %d 个节点, %.1fMB, 约 %.1fs", plan['total_nodes'],
+                         plan['projected_bytes'] / (1024 * 1024), plan['estimated_seconds'])
+        return plan
+    
     def refresh_pak_lists(self):
         """刷新pak文件列表"""
         try:
+            # 记住已有的种族选择，刷新后恢复
+            previous_selections = dict(self.appearance_race_selections)
+            
             # 清空当前列表和数据
             self.selected_race_paks.clear()
             self.selected_appearance_paks.clear()
             self.appearance_vanilla_races.clear()
             self.appearance_race_selections.clear()
             
-            # 扫描Sourcemod文件夹中的pak文件
+            # 扫描Sourcemod文件夹中的pak文件(含引用)
             if self.sourcemod_dir.exists():
-                for pak_file in self.sourcemod_dir.glob("*.pak"):
-                    self.selected_race_paks.append(str(pak_file))
+                for pak_file in self.sourcemod_dir.iterdir():
+                    if pak_file.is_file() and pak_file.suffix in PAK_SUFFIXES:
+                        self.selected_race_paks.append(str(pak_file))
             
-            # 扫描Panagway文件夹中的pak文件
+            # 扫描Panagway文件夹中的pak文件(含引用)
             if self.panagway_dir.exists():
-                for pak_file in self.panagway_dir.glob("*.pak"):
-                    self.selected_appearance_paks.append(str(pak_file))
+                for pak_file in self.panagway_dir.iterdir():
+                    if pak_file.is_file() and pak_file.suffix in PAK_SUFFIXES:
+                        self.selected_appearance_paks.append(str(pak_file))
             
             # 解析外观数据以检测原版种族UUID
-            if self.panagway_dir.exists():
-                for appearance_subfolder in self.panagway_dir.iterdir():
-                    if appearance_subfolder.is_dir():
-                        self.parse_appearance_data(appearance_subfolder)
+            for appearance_subfolder in self._mod_roots(self.panagway_dir):
+                self.parse_appearance_data(appearance_subfolder)
+            
+            for pak_path, race_uuid in previous_selections.items():
+                if race_uuid in self.appearance_vanilla_races.get(pak_path, []):
+                    self.appearance_race_selections[pak_path] = race_uuid
             
             # 更新列表框显示
             self.update_race_listbox()
@@ -641,8 +1150,125 @@ class BG3CompatibilityGenerator:
             self.progress_var.set(message)
             
         except Exception as e:
+            self.logger.exception("刷新列表时出错")
             self.progress_var.set(f"刷新列表时出错：{str(e)}")
     
+    def _reindex_safely(self, paths):
+        """处理目录变化，出错只记录日志，不影响任务状态和消息循环"""
+        try:
+            self.reindex_mod_paths(paths)
+        except Exception:
+            self.logger.exception("处理目录变化失败")
+    
+    def reindex_mod_paths(self, paths):
+        """增量更新变化的pak和解包文件夹，不清空列表，保留已有的种族选择
+        
+        直接放进目录、还没有解包的pak按导入的流程在后台解包和解析。
+        """
+        race_changed = False
+        appearance_stems = set()
+        dropped_paks = {}
+        for path in map(Path, paths):
+            # zip导入和共享存储写入中的临时文件
+            if path.name.endswith((PART_SUFFIX, BLOB_TEMP_SUFFIX)):
+                continue
+            if path.parent == self.sourcemod_dir:
+                # 种族数据在生成时解析，这里只更新pak列表
+                if path.suffix in PAK_SUFFIXES:
+                    race_changed |= self._sync_pak_entry(self.selected_race_paks, path)
+                    if self._needs_extract(self.sourcemod_dir, path):
+                        dropped_paks.setdefault(self.sourcemod_dir, []).append(str(path))
+            elif path.parent == self.panagway_dir:
+                if path.suffix in PAK_SUFFIXES:
+                    self._sync_pak_entry(self.selected_appearance_paks, path)
+                    appearance_stems.add(path.stem)
+                    if self._needs_extract(self.panagway_dir, path):
+                        dropped_paks.setdefault(self.panagway_dir, []).append(str(path))
+                elif path.is_dir() or not path.exists():
+                    # 解包文件夹(新增、修改或已删除)
+                    appearance_stems.add(path.name)
+        
+        for stem in sorted(appearance_stems):
+            self._reindex_appearance_mod(stem)
+        
+        if race_changed:
+            self.update_race_listbox()
+        if appearance_stems:
+            self.update_appearance_listbox()
+        if race_changed or appearance_stems:
+            self.logger.info("目录变化: 更新 %d 个种族pak、%d 个外观MOD", int(race_changed), len(appearance_stems))
+            self.progress_var.set(self.texts.get("refresh_success", "刷新完成！找到 {race_count} 个种族文件，{appearance_count} 个外观文件。").format(
+                race_count=len(self.selected_race_paks), appearance_count=len(self.selected_appearance_paks)
+            ))
+        if dropped_paks:
+            self._extract_dropped_paks(dropped_paks)
+    
+    def _needs_extract(self, pak_dir: Path, pak_file: Path) -> bool:
+        """目录中的pak是否还要解包: 没有可解析的根目录，或者extract方式下pak比解包文件夹新"""
+        if not pak_file.is_file():
+            return False
+        extract_dir = pak_dir / pak_file.stem
+        if self.settings.get('parse_mode', "extract") != "archive" and extract_dir.is_dir():
+            return pak_file.stat().st_mtime_ns > extract_dir.stat().st_mtime_ns
+        return self._mod_root(pak_dir, pak_file.stem) is None
+    
+    def _extract_dropped_paks(self, dropped_paks: dict):
+        """在后台按导入的流程解包和解析{导入目录: [pak路径]}
+        
+        一次只运行一个任务，有任务在运行或者两个目录都有新pak时，其余的留到任务结束后再处理。
+        """
+        if self.is_task_running:
+            for pak_files in dropped_paks.values():
+                self.pending_mod_changes.update(pak_files)
+            return
+        (dest_dir, pak_files), *others = dropped_paks.items()
+        for _, remaining in others:
+            self.pending_mod_changes.update(remaining)
+        self.logger.info("目录中新增 %d 个未解包的pak，开始解包", len(pak_files))
+        self.is_task_running = True
+        self.current_task_thread = threading.Thread(
+            target=self._import_and_extract_files_async,
+            args=(pak_files, dest_dir, "种族" if dest_dir == self.sourcemod_dir else "外观")
+        )
+        self.current_task_thread.daemon = True
+        self.current_task_thread.start()
+    
+    def _sync_pak_entry(self, pak_list: list, pak_file: Path) -> bool:
+        """按文件是否存在增删列表项，返回列表是否变化"""
+        key = str(pak_file)
+        if pak_file.is_file() and key not in pak_list:
+            pak_list.append(key)
+            return True
+        if not pak_file.is_file() and key in pak_list:
+            pak_list.remove(key)
+            return True
+        return False
+    
+    def _reindex_appearance_mod(self, stem: str):
+        """重新解析一个外观MOD的解包文件夹"""
+        # 同名pak可能以.pak或.pakref导入
+        candidates = {str(self.panagway_dir / f"{stem}{suffix}") for suffix in PAK_SUFFIXES}
+        for pak_path in candidates:
+            self.appearance_vanilla_races.pop(pak_path, None)
+        for appearance_key in [key for key, info in self.appearance_data.items() if info.get('pak_path') in candidates]:
+            del self.appearance_data[appearance_key]
+        
+        pak_path = next((p for p in self.selected_appearance_paks if Path(p).stem == stem), None)
+        mod_root = self._mod_root(self.panagway_dir, stem) if pak_path else None
+        if mod_root is not None:
+            self.parse_appearance_data(mod_root)
+        else:
+            self.parse_cache.discard(self.panagway_dir / stem)
+            for candidate in candidates:
+                self.parse_cache.discard(candidate)
+                self.pak_mounts.discard(candidate)
+        
+        # 只保留仍然有效的选择
+        for candidate in candidates:
+            selected_uuid = self.appearance_race_selections.get(candidate)
+            if selected_uuid and selected_uuid not in self.appearance_vanilla_races.get(candidate, []):
+                del self.appearance_race_selections[candidate]
+    
     def show_race_context_menu(self, event):
         """显示种族列表框右键菜单"""
         self.ui_manager.show_race_context_menu(event)
@@ -692,8 +1318,20 @@ class BG3CompatibilityGenerator:
             self.ui_manager.show_error_message(self.texts.get("error_title", "错误"), self.texts.get("error_no_appearance_pak", "请至少选择一个外观pak文件"))
             return
         
-        if not self.divine_exe.exists():
-            self.ui_manager.show_error_message(self.texts.get("error_title", "错误"), self.texts.get("error_divine_not_found", "找不到Divine.exe工具: {path}").format(path=self.divine_exe))
+        backend_error = self.pak_backend.check()
+        if backend_error:
+            # Divine.exe缺失用本地化文本，其他后端直接显示后端的错误信息
+            if self.pak_backend.name == "divine":
+                backend_error = self.texts.get("error_divine_not_found", "找不到Divine.exe工具: {path}").format(path=self.divine_exe)
+            self.ui_manager.show_error_message(self.texts.get("error_title", "错误"), backend_error)
+            return
+        
+        # 先在后台预估生成规模，过大时确认后再继续
+        self._start_build_plan("generate")
+    
+    def _start_generation(self):
+        """填写补丁信息并启动生成任务"""
+        if self.is_task_running:
             return
         
         # 检查是否存在meta.lsx文件并预填充信息
@@ -718,6 +1356,8 @@ class BG3CompatibilityGenerator:
     
     def _generate_compatibility_async(self):
         """异步生成补丁"""
+        self.profiler.begin("generate", enable_cprofile=self.settings.get('enable_cprofile', False))
+        success = False
         try:
             self.task_queue.put({
                 'type': 'progress',
@@ -732,9 +1372,12 @@ class BG3CompatibilityGenerator:
             # 清空之前的数据缓存
             self.race_data.clear()
             self.appearance_data.clear()
+            self.dedup_dropped = 0
+            self._prune_spill()
             
             # 解析数据
-            self.parse_extracted_data()
+            with self.profiler.stage("parse"):
+                self.parse_extracted_data()
             current_step += 1
             progress = (current_step / total_steps) * 100
             self.task_queue.put({
@@ -744,7 +1387,8 @@ class BG3CompatibilityGenerator:
             })
             
             # 生成补丁
-            self.create_compatibility_patches()
+            with self.profiler.stage("generate"):
+                self.create_compatibility_patches()
             current_step += 1
             progress = (current_step / total_steps) * 100
             self.task_queue.put({
@@ -753,7 +1397,12 @@ class BG3CompatibilityGenerator:
                 'text': self.texts.get("progress_generating_patch", "正在生成兼容性补丁...")
             })
             
-            # 打包MOD
+            # 校验生成的外观配置，有问题时不打包
+            if self.settings.get('validate_output', True):
+                with self.profiler.stage("validate"):
+                    self.validate_patch()
+            
+            # 打包MOD(包含zip阶段)
             self.pack_mod()
             current_step += 1
             self.task_queue.put({
@@ -763,39 +1412,90 @@ class BG3CompatibilityGenerator:
             })
             
             # 完成
+            success = True
+            stats = self.profiler.finish(success)
+            budget = self._memory_budget()
+            if budget and stats.get('peak_memory') and stats['peak_memory'] > budget:
+                # 峰值包含程序本身和之前的任务，只作提示
+                self.logger.warning("进程内存峰值 %dMB 超过内存预算 %dMB", stats['peak_memory'] // (1024 * 1024), budget // (1024 * 1024))
+            complete_text = self.texts.get("success_generation_complete", "兼容性补丁生成完成！") + f" ({stats['wall_time']:.1f}s)"
+            if self.dedup_dropped:
+                complete_text += "  " + self.texts.get("dedup_dropped_nodes", "已合并 {count} 个重复外观节点").format(count=self.dedup_dropped)
             self.task_queue.put({
                 'type': 'complete',
                 'subtype': 'generate_patch',
-                'text': self.texts.get("success_generation_complete", "兼容性补丁生成完成！")
+                'text': complete_text
             })
             
         except Exception as e:
+            self.logger.exception("生成补丁失败")
             self.task_queue.put({
                 'type': 'error',
+                'subtype': 'generate_patch',
                 'text': f"{self.texts.get('error_generation_failed', '生成失败')}: {str(e)}"
             })
             import traceback
             traceback.print_exc()
+        finally:
+            self._prune_spill()
+            if not success:
+                self.profiler.finish(success)
     
 
     
     def parse_extracted_data(self):
-        """解析数据"""
+        """解析数据
+        
+        各文件夹在流水线中并行扫描，外观MOD解析完立即提取外观节点，
+        结果按目录顺序合并，和逐个解析的结果一致。
+        """
+        jobs = []
         # 解析种族数据
-        if self.sourcemod_dir.exists():
-            for race_subfolder in self.sourcemod_dir.iterdir():
-                if race_subfolder.is_dir():
-                    self.parse_race_data(race_subfolder)
+        # 生成时引用的pak有问题直接失败，不用过期内容
+        jobs.extend(("race", folder) for folder in self._mod_roots(self.sourcemod_dir, strict=True))
         
         # 解析外观数据
-        if self.panagway_dir.exists():
-            for appearance_subfolder in self.panagway_dir.iterdir():
-                if appearance_subfolder.is_dir():
-                    self.parse_appearance_data(appearance_subfolder)
+        jobs.extend(("appearance", folder) for folder in self._mod_roots(self.panagway_dir, strict=True))
+        
+        def scan_folder(job):
+            kind, folder = job
+            scan_func = self._scan_race_folder if kind == "race" else self._scan_appearance_folder
+            return kind, folder, self.parse_cache.get_or_scan(kind, folder, scan_func)
+        
+        def extract_nodes(parsed):
+            kind, folder, scan_result = parsed
+            selected_race_uuid = self.appearance_race_selections.get(self._find_appearance_pak(folder)) if kind == "appearance" else None
+            # 内存预算模式下不预先提取，生成时逐个MOD提取
+            if not selected_race_uuid or self._memory_budget():
+                return kind, folder, scan_result, None
+            try:
+                source_nodes = [self._extract_source_nodes(self._appearance_content(appearance_info), selected_race_uuid)
+                                for appearance_key, appearance_info in scan_result['entries']]
+            except Exception as e:
+                # 生成时再处理并记录错误
+                return kind, folder, scan_result, None
+            return kind, folder, scan_result, (selected_race_uuid, source_nodes)
+        
+        def merge(index, parsed):
+            kind, folder, scan_result, source_nodes = parsed
+            if kind == "race":
+                self._merge_race_entries(folder, scan_result)
+            else:
+                self._merge_appearance_scan(folder, scan_result, source_nodes)
+        
+        workers = max(1, int(self.settings.get('pipeline_workers', 2) or 1))
+        pipeline = StagePipeline([("parse", scan_folder, workers), ("nodes", extract_nodes)],
+                                 self.settings.get('pipeline_queue_size', 4), self.logger)
+        pipeline.run(jobs, on_result=merge)
     
     def parse_race_data(self, race_folder: Path):
         """解析种族数据"""
+        race_entries = self.parse_cache.get_or_scan("race", race_folder, self._scan_race_folder)
+        self._merge_race_entries(race_folder, race_entries)
 
+    def _scan_race_folder(self, race_folder: Path) -> list:
+        """扫描种族文件夹，返回[(种族名, 种族信息), ...]，不修改race_data，可以在线程中调用"""
+        race_entries = []
         
         # 查找Races.lsx文件
         races_files = list(race_folder.rglob("Races.lsx"))
@@ -805,13 +1505,12 @@ class BG3CompatibilityGenerator:
             for races_file in races_files:
                 pass
         
-        race_found = False
-        
         # 提取种族UUID
         if races_files:
             for races_file in races_files:
                 try:
                     content = races_file.read_text(encoding='utf-8')
+                    self.profiler.count("parse", files_scanned=1, bytes_read=len(content))
                     
                     # 查找种族UUID
                     race_pattern = r'<node id="Race">.*?<attribute id="UUID" type="guid" value="([^"]+)"\s*/>'
@@ -826,31 +1525,45 @@ class BG3CompatibilityGenerator:
                         race_name = race_parent_folder.name
                         race_uuid = race_matches[0]
                         
-                        # 避免重名
-                        original_race_name = race_name
-                        counter = 1
-                        while race_name in self.race_data:
-                            race_name = f"{original_race_name}_{counter}"
-                            counter += 1
-                        
-                        self.race_data[race_name] = {
+                        race_entries.append((race_name, {
                             'uuid': race_uuid,
+                            'mod_name': race_folder.name,
                             'folder': race_parent_folder,
                             'files': list(race_parent_folder.rglob("*.lsx")),
                             'source_file': races_file
-                        }
-                        
-
-                        race_found = True
+                        }))
                         
                 except Exception as e:
-                    pass
+                    self.logger.warning("解析种族文件 %s 失败: %s", races_file, e)
         
-        if not race_found:
-            pass
+        return race_entries
+    
+    def _merge_race_entries(self, race_folder: Path, race_entries: list):
+        """把扫描结果加入race_data"""
+        for race_name, race_info in race_entries:
+            # 避免重名
+            original_race_name = race_name
+            counter = 1
+            while race_name in self.race_data:
+                race_name = f"{original_race_name}_{counter}"
+                counter += 1
+            
+            self.race_data[race_name] = dict(race_info)
+        
+        if not race_entries:
+            self.logger.info("%s 中没有找到种族数据", race_folder.name)
     
     def parse_appearance_data(self, appearance_folder: Path):
         """解析外观数据"""
+        scan_result = self.parse_cache.get_or_scan("appearance", appearance_folder, self._scan_appearance_folder)
+        self._merge_appearance_scan(appearance_folder, scan_result)
+    
+    def _scan_appearance_folder(self, appearance_folder: Path) -> dict:
+        """扫描外观文件夹，返回{'entries': [(外观key, 外观信息), ...], 'vanilla_races': [...]}
+        
+        不修改appearance_data，可以在线程中调用。
+        """
+        appearance_entries = []
         
         # 查找外观配置文件
         appearance_file_patterns = [
@@ -877,6 +1590,7 @@ class BG3CompatibilityGenerator:
                         
                     try:
                         content = appearance_file.read_text(encoding='utf-8')
+                        self.profiler.count("parse", files_scanned=1, bytes_read=len(content))
                         
                         # 检查外观内容
                         if any(keyword in content for keyword in ['VisualResource', 'RaceUUID', 'BodyShape', 'Head']):
@@ -898,34 +1612,17 @@ class BG3CompatibilityGenerator:
                             # 文件名标识
                             appearance_key = f"{appearance_folder.name}_{appearance_file.stem}"
                             
-                            # 处理重名
-                            original_key = appearance_key
-                            counter = 1
-                            while appearance_key in self.appearance_data:
-                                appearance_key = f"{original_key}_{counter}"
-                                counter += 1
-                            
-                            # 找pak路径
-                            pak_path = None
-                            for selected_pak in self.selected_appearance_paks:
-                                pak_name = Path(selected_pak).stem
-                                if pak_name == appearance_folder.name:
-                                    pak_path = selected_pak
-                                    break
-                            
-                            self.appearance_data[appearance_key] = {
+                            appearance_entries.append((appearance_key, {
                                 'file': str(relative_path),
                                 'content': content,
-                                'folder': str(appearance_folder.relative_to(Path.cwd())),
-                                'pak_path': pak_path
-                            }
-                            
+                                'folder': str(appearance_folder),
+                            }))
 
                             appearance_found = True
                             processed_files.add(relative_path)
                             
                     except Exception as e:
-                        pass
+                        self.logger.warning("解析外观文件 %s 失败: %s", appearance_file, e)
         
         # 查找所有lsx文件
         if not appearance_found:
@@ -939,6 +1636,7 @@ class BG3CompatibilityGenerator:
                     
                 try:
                     content = lsx_file.read_text(encoding='utf-8')
+                    self.profiler.count("parse", files_scanned=1, bytes_read=len(content))
                     
                     # 检查外观相关内容
                     if any(keyword in content for keyword in ['VisualResource', 'CharacterCreation', 'Head', 'Hair']):
@@ -959,71 +1657,86 @@ class BG3CompatibilityGenerator:
                         # 用文件名做标识
                         appearance_key = f"{appearance_folder.name}_{lsx_file.stem}"
                         
-                        # 处理重名
-                        original_key = appearance_key
-                        counter = 1
-                        while appearance_key in self.appearance_data:
-                            appearance_key = f"{original_key}_{counter}"
-                            counter += 1
-                        
-                        # 找pak路径
-                        pak_path = None
-                        for selected_pak in self.selected_appearance_paks:
-                            pak_name = Path(selected_pak).stem
-                            if pak_name == appearance_folder.name:
-                                pak_path = selected_pak
-                                break
-                        
-                        self.appearance_data[appearance_key] = {
+                        appearance_entries.append((appearance_key, {
                             'file': str(relative_lsx_path),
                             'content': content,
-                            'folder': str(appearance_folder.relative_to(Path.cwd())),
-                            'pak_path': pak_path
-                        }
-                        
+                            'folder': str(appearance_folder),
+                        }))
 
                         appearance_found = True
                         processed_files.add(relative_lsx_path)
                         
                 except Exception as e:
-                    pass
+                    self.logger.warning("解析外观文件 %s 失败: %s", lsx_file, e)
         
         if not appearance_found:
-            pass
+            self.logger.info("%s 中没有找到外观数据", appearance_folder.name)
         
-        # 保存检测到的原版种族
-        # 找对应pak文件
-        pak_path = None
+        # 内存预算模式下内容写到临时文件，解析缓存中只保留路径和哈希
+        if self._memory_budget():
+            for appearance_key, appearance_info in appearance_entries:
+                content_file, content_sha1 = spill_text(self.temp_dir / "spill", appearance_info.pop('content'))
+                appearance_info['content_file'] = str(content_file)
+                appearance_info['content_sha1'] = content_sha1
+        
+        return {'entries': appearance_entries, 'vanilla_races': list(vanilla_races_found)}
+    
+    def _find_appearance_pak(self, appearance_folder: Path):
+        """找解包文件夹对应的pak文件"""
         for selected_pak in self.selected_appearance_paks:
             pak_name = Path(selected_pak).stem
             if pak_name == appearance_folder.name:
-                pak_path = selected_pak
-                break
+                return selected_pak
+        return None
+        
+    def _merge_appearance_scan(self, appearance_folder: Path, scan_result: dict, source_nodes=None):
+        """把扫描结果加入appearance_data，并记录该MOD包含的原版种族
+        
+        source_nodes为流水线中已提取的(选择的种族UUID, [每个外观的节点])，生成时直接使用。
+        """
+        # 找对应pak文件
+        pak_path = self._find_appearance_pak(appearance_folder)
         
-        if pak_path and vanilla_races_found:
-            self.appearance_vanilla_races[pak_path] = list(vanilla_races_found)
+        for entry_index, (appearance_key, appearance_info) in enumerate(scan_result['entries']):
+            # 处理重名
+            original_key = appearance_key
+            counter = 1
+            while appearance_key in self.appearance_data:
+                appearance_key = f"{original_key}_{counter}"
+                counter += 1
+            
+            self.appearance_data[appearance_key] = dict(appearance_info, pak_path=pak_path)
+            if source_nodes:
+                self.appearance_data[appearance_key]['source_nodes'] = (source_nodes[0], source_nodes[1][entry_index])
+        
+        # 保存检测到的原版种族
+        if pak_path and scan_result['vanilla_races']:
+            self.appearance_vanilla_races[pak_path] = list(scan_result['vanilla_races'])
     
     def create_compatibility_patches(self):
-        """创建兼容性补丁"""
+        """创建兼容性补丁
 
-        
-
-        
-        if not self.race_data or not self.appearance_data:
-            raise Exception("没有找到有效的种族或外观数据")
+        种族MOD中没有找到种族时，外观节点保留所选的原版种族，只合并和去重。
+        """
+        if not self.appearance_data:
+            raise Exception("没有找到有效的外观数据")
+        if not self.race_data:
+            self.logger.warning("所选种族MOD中没有找到种族，外观节点保留原版种族")
         
         # 使用用户输入的信息
         mod_name = self.patch_info['mod_name']
         author = self.patch_info['author']
         
-        # 清理输出目录
+        # 清理输出目录(按种族分片时保留本MOD目录，以便复用未变化的分片)
+        shard_mode = self._shard_mode()
+        keep_dir = self.output_dir / mod_name if shard_mode == "race" else None
         if self.output_dir.exists():
             for item in self.output_dir.iterdir():
-                if item.is_dir():
+                if item.is_dir() and item != keep_dir:
                     try:
                         shutil.rmtree(item)
-                    except:
-                        pass
+                    except Exception as e:
+                        self.logger.warning("清理输出目录 %s 失败: %s", item, e)
         
         # 创建目录
         output_mod_dir = self.output_dir / mod_name
@@ -1048,7 +1761,7 @@ class BG3CompatibilityGenerator:
         self.create_meta_file(mods_dir / "meta.lsx", mod_name, author, mod_uuid)
         
         # 生成配置
-        self.create_appearance_compatibility(public_dir / "CharacterCreationAppearanceVisuals.lsx")
+        self.create_appearance_compatibility(public_dir / "CharacterCreationAppearanceVisuals.lsx", shard_mode)
         
 
     
@@ -1118,15 +1831,42 @@ class BG3CompatibilityGenerator:
         meta_path.write_text(meta_content, encoding='utf-8')
 
     
-    def create_appearance_compatibility(self, output_file: Path):
-        """创建外观兼容性配置"""
+    def _shard_mode(self) -> str:
+        """设置中的分片方式，未知的值按单文件输出并记录警告"""
+        shard_mode = self.settings.get('output_shard_mode', "none")
+        if shard_mode not in SHARD_MODES:
+            self.logger.warning("未知的分片方式 %s，按单文件(none)输出", shard_mode)
+            return "none"
+        return shard_mode
+    
+    def create_appearance_compatibility(self, output_file: Path, shard_mode: str = "none"):
+        """创建外观兼容性配置，shard_mode见SHARD_MODES"""
         if not self.appearance_data:
             return
             
-        # 收集配置 - 按种族分组，每个种族内按外观排序
-        all_race_configs = []
-        
         # 准备外观数据
+        valid_appearances = self._collect_valid_appearances()
+        # 展开到各种族之前去重
+        source_nodes = self._collect_source_nodes(valid_appearances)
+        
+        try:
+            if shard_mode in ("race", "count"):
+                self._write_sharded_appearance_output(output_file, valid_appearances, source_nodes, shard_mode)
+                return
+        
+            if self._memory_budget():
+                self.logger.warning("单文件输出在打包时需要整个文件的内存，内存预算模式下建议使用分片输出")
+        
+            # 按种族分组，每个种族内按外观排序，生成一个写一个
+            for output, node_count, bytes_written in write_lsx_node_stream([output_file], self._iter_all_race_nodes(source_nodes),
+                                                                           0, self._stream_buffer_size()):
+                self.profiler.count("generate", files_scanned=1, nodes_emitted=node_count, bytes_written=bytes_written)
+        finally:
+            if isinstance(source_nodes, SpilledNodes):
+                source_nodes.close()
+    
+    def _collect_valid_appearances(self) -> list:
+        """收集已选择原版种族的外观配置"""
         valid_appearances = []
         for appearance_key, appearance_info in self.appearance_data.items():
             pak_path = appearance_info.get('pak_path', '')
@@ -1141,186 +1881,332 @@ class BG3CompatibilityGenerator:
                         'selected_race_uuid': selected_race_uuid,
                         'race_name': race_info['name_en']
                     })
-        
-        # 按种族分组，每个种族内包含所有外观
+        return valid_appearances
+        
+    def _collect_source_nodes(self, valid_appearances: list) -> list:
+        """提取所有外观节点并按外观标识去重
+        
+        去重策略见设置appearance_dedup_policy。有目标种族时所有节点都会改成目标种族，
+        标识不含RaceUUID；没有种族数据时保留原版种族，标识加上RaceUUID。
+        """
+        # 内存预算模式下节点写到临时文件，返回SpilledNodes
+        budget = self._memory_budget()
+        source_nodes = NodeSpill(self.temp_dir / "spill") if budget else []
+        for appearance in valid_appearances:
+            # 解析流水线中已经提取过的直接使用
+            cached = appearance['info'].get('source_nodes')
+            if cached and cached[0] == appearance['selected_race_uuid']:
+                extracted = cached[1]
+            else:
+                try:
+                    extracted = self._extract_source_nodes(self._appearance_content(appearance['info']), appearance['selected_race_uuid'])
+                except Exception:
+                    self.logger.exception("处理外观配置失败 (%s)", appearance['race_name'])
+                    continue
+            for description_part, attributes_part in extracted:
+                source_nodes.append({
+                    'description': description_part,
+                    'attributes': attributes_part,
+                    'pak_path': appearance['pak_path'],
+                })
+        
+        policy = self.settings.get('appearance_dedup_policy', "first")
+        if policy not in DEDUP_POLICIES:
+            self.logger.warning("未知的外观去重策略 %s，不去重", policy)
+        if budget:
+            source_nodes.finish()
+            kept_indices, dropped = dedupe_indices(source_nodes.iter_nodes(), policy, include_race=not self.race_data)
+            kept_nodes = SpilledNodes(source_nodes, kept_indices)
+        else:
+            kept_nodes, dropped = dedupe_nodes(source_nodes, policy, include_race=not self.race_data)
+        self.dedup_dropped = dropped
+        if dropped:
+            self.logger.info("外观去重(%s): %d 个节点中合并了 %d 个重复", policy, len(source_nodes), dropped)
+        return kept_nodes
+    
+    def _iter_target_races(self):
+        """目标种族列表 [(种族名, UUID)]，没有种族数据时保留原版种族"""
         if self.race_data:
-            # 为每个种族生成所有外观的配置
-            for race_key, race_info_data in self.race_data.items():
-                target_race_uuid = race_info_data['uuid']
+            return [(race_key, race_info_data['uuid']) for race_key, race_info_data in self.race_data.items()]
+        return [(None, None)]
                 
-                # 为当前种族生成所有外观配置
-                for appearance in valid_appearances:
-                    appearance_content = appearance['info']['content']
-                    race_name = appearance['race_name']
-                    selected_race_uuid = appearance['selected_race_uuid']
+    def _race_shard_key(self, race_key, target_race_uuid, used_keys: set) -> str:
+        """种族分片名，用种族MOD名，重名时加UUID前缀区分，保证多次生成一致"""
+        if race_key is None:
+            return "vanilla"
+        shard_key = safe_shard_name(self.race_data[race_key].get('mod_name', race_key))
+        if shard_key in used_keys:
+            shard_key = f"{shard_key}_{safe_shard_name(target_race_uuid[:8])}"
+        while shard_key in used_keys:
+            shard_key += "_"
+        return shard_key
                     
-                    # 处理外观配置
-                    race_config = self.process_appearance_for_race(appearance_content, race_name, selected_race_uuid, target_race_uuid)
-                    if race_config:
-                        all_race_configs.append(race_config)
-        else:
-            # 没有种族数据时，使用原版种族
-            for appearance in valid_appearances:
-                appearance_content = appearance['info']['content']
-                race_name = appearance['race_name']
-                selected_race_uuid = appearance['selected_race_uuid']
+    def _iter_race_nodes(self, source_nodes, target_race_uuid):
+        """为一个目标种族逐个生成外观节点"""
+        for node in source_nodes:
+            yield self._render_appearance_node(node['description'], node['attributes'], target_race_uuid)
+    
+    def _iter_all_race_nodes(self, source_nodes):
+        """所有目标种族的外观节点，按种族分组"""
+        for race_key, target_race_uuid in self._iter_target_races():
+            yield from self._iter_race_nodes(source_nodes, target_race_uuid)
+    
+    def _iter_node_range(self, source_nodes: list, start: int, stop: int):
+        """所有目标种族的外观节点中第start到stop-1个，顺序和_iter_all_race_nodes相同"""
+        per_race = len(source_nodes)
+        for race_index, (race_key, target_race_uuid) in enumerate(self._iter_target_races()):
+            race_start = race_index * per_race
+            low = max(start, race_start) - race_start
+            high = min(stop, race_start + per_race) - race_start
+            if low < high:
+                yield from self._iter_race_nodes(source_nodes[low:high], target_race_uuid)
+    
+    def _write_sharded_appearance_output(self, output_file: Path, valid_appearances: list, source_nodes: list, shard_mode: str):
+        """分片写入外观配置
+        
+        race: 每个目标种族一个文件，超过output_shard_max_nodes再切分；输入没变的分片直接复用。
+        count: 所有节点按output_shard_max_nodes切分。
+        节点生成后直接写入文件；分片并发写入(内存预算模式下逐个写入)，旧文件按清单清理。
+        """
+        shard_dir = output_file.parent
+        base_name = output_file.stem
+        max_nodes = self._shard_max_nodes()
+        workers = 1 if self._memory_budget() else max(1, int(self.settings.get('output_shard_workers', 4) or 1))
+        buffer_size = self._stream_buffer_size()
+        manifest_file = self.output_dir / f"{self.patch_info['mod_name']}.shards.json"
+        old_manifest = load_shard_manifest(manifest_file) if shard_mode == "race" else {}
+        new_manifest = {}
+        
+        def write_shard(shard_key, fingerprint, nodes, node_count):
+            parts = -(-node_count // max_nodes) if max_nodes > 0 else 1
+            output_files = (shard_dir / file_name for file_name in shard_file_names(base_name, shard_key, parts))
+            file_names = []
+            for output, chunk_nodes, bytes_written in write_lsx_node_stream(output_files, nodes, max_nodes, buffer_size):
+                self.profiler.count("generate", files_scanned=1, nodes_emitted=chunk_nodes, bytes_written=bytes_written)
+                file_names.append(output.name)
+            return shard_key, {'fingerprint': fingerprint, 'files': file_names}
+        
+        tasks = []
+        reused = 0
+        if shard_mode == "race":
+            # 外观内容哈希，用于判断分片是否需要重新生成
+            appearance_inputs = [
+                (appearance['key'], appearance['selected_race_uuid'],
+                 appearance['info'].get('content_sha1') or hashlib.sha1(appearance['info']['content'].encode('utf-8')).hexdigest())
+                for appearance in valid_appearances
+            ]
+            used_keys = set()
+            for race_key, target_race_uuid in self._iter_target_races():
+                shard_key = self._race_shard_key(race_key, target_race_uuid, used_keys)
+                used_keys.add(shard_key)
+                
+                fingerprint = shard_fingerprint(target_race_uuid, appearance_inputs, max_nodes,
+                                                self.settings.get('appearance_dedup_policy', "first"))
+                previous = old_manifest.get(shard_key)
+                if (previous and previous.get('fingerprint') == fingerprint and
+                        all((shard_dir / file_name).exists() for file_name in previous.get('files', []))):
+                    new_manifest[shard_key] = previous
+                    reused += 1
+                    continue
+                tasks.append((shard_key, fingerprint, target_race_uuid))
+            
+            def run_task(task):
+                shard_key, fingerprint, target_race_uuid = task
+                return write_shard(shard_key, fingerprint, self._iter_race_nodes(source_nodes, target_race_uuid), len(source_nodes))
+        elif self._memory_budget():
+            # 内存预算模式下所有种族的节点依次写入，写满max_nodes换下一个文件，只有一个任务
+            tasks.append(None)
                 
-                race_config = self.process_appearance_for_race(appearance_content, race_name, selected_race_uuid, None)
-                if race_config:
-                    all_race_configs.append(race_config)
+            def run_task(task):
+                shard_keys = (f"{i:03d}" for i in itertools.count(1))
+                output_files = (shard_dir / shard_file_names(base_name, shard_key, 1)[0] for shard_key in shard_keys)
+                written = write_lsx_node_stream(output_files, self._iter_all_race_nodes(source_nodes), max_nodes, buffer_size)
+                for output, chunk_nodes, bytes_written in written:
+                    self.profiler.count("generate", files_scanned=1, nodes_emitted=chunk_nodes, bytes_written=bytes_written)
+                    new_manifest[output.stem[len(base_name) + 1:]] = {'fingerprint': None, 'files': [output.name]}
+                return None, None
+        else:
+            # 按节点范围切分，各分片并发生成和写入
+            total_nodes = len(source_nodes) * len(self._iter_target_races())
+            chunk_size = max_nodes if max_nodes > 0 else max(1, total_nodes)
+            tasks = [(f"{i + 1:03d}", start, min(start + chunk_size, total_nodes))
+                     for i, start in enumerate(range(0, total_nodes, chunk_size))]
+            
+            def run_task(task):
+                shard_key, start, stop = task
+                return write_shard(shard_key, None, self._iter_node_range(source_nodes, start, stop), stop - start)
     
+        # 并发写入
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for shard_key, entry in executor.map(run_task, tasks):
+                if shard_key is not None:
+                    new_manifest[shard_key] = entry
+        
+        # 删除不再使用的分片
+        current_files = {file_name for entry in new_manifest.values() for file_name in entry['files']}
+        for old_file in shard_dir.glob(f"{base_name}*.lsx"):
+            if old_file.name not in current_files:
+                old_file.unlink()
+            
+        save_shard_manifest(manifest_file, new_manifest)
+        self.logger.info("分片输出: 写入 %d 个，复用 %d 个", len(tasks), reused)
+    
+    def _extract_source_nodes(self, appearance_content: str, race_uuid: str) -> list:
+        """提取RaceUUID为race_uuid的外观节点，返回[(描述文本, 属性内容), ...]，与目标种族无关"""
+        # 提取配置主体
+        start_marker = '<children>'
+        end_marker = '</children>'
         
-        if all_race_configs:
-            # 构建XML内容
-            xml_header = '<?xml version="1.0" encoding="utf-8"?>\n<save>\n    <version major="4" minor="0" revision="9" build="331" />\n    <region id="CharacterCreationAppearanceVisuals">\n        <node id="root">\n            <children>'
-            xml_footer = '\n            </children>\n        </node>\n    </region>\n</save>'
-            
-            # 合并配置
-            combined_content = xml_header + '\n' + '\n'.join(all_race_configs) + xml_footer
-            
-            # 确保目录存在
-            output_file.parent.mkdir(parents=True, exist_ok=True)
-            
-            # 写入文件
-            output_file.write_text(combined_content, encoding='utf-8')
+        start_idx = appearance_content.find(start_marker)
+        end_idx = appearance_content.find(end_marker)
+        
+        if start_idx == -1 or end_idx == -1:
+            return []
+        
+        start_idx += len(start_marker)
+        config_body = appearance_content[start_idx:end_idx]
+        
+        if not config_body.strip():
+            return []
+        
+        # 解析所有CharacterCreationAppearanceVisual节点
+        import re
+        # 匹配完整节点
+        node_pattern = r'<node id="CharacterCreationAppearanceVisual"[^>]*>([\s\S]*?)</node>'
+        node_matches = re.finditer(node_pattern, config_body, re.DOTALL)
+        
+        source_nodes = []
+        for match in node_matches:
+            full_node_content = match.group(1)  # 完整的节点内容
+            
+            # 分离描述文本和属性内容
+            # 查找第一个<attribute标签的位置
+            first_attr_match = re.search(r'<attribute', full_node_content)
+            if first_attr_match:
+                # 描述文本是第一个<attribute之前的内容
+                description_part = full_node_content[:first_attr_match.start()]
+                attributes_part = full_node_content[first_attr_match.start():]
+            else:
+                # 没属性就全是描述
+                description_part = full_node_content
+                attributes_part = ""
+            
+            # 检查节点中的RaceUUID是否匹配目标种族
+            race_uuid_match = re.search(r'<attribute id="RaceUUID"[^>]*value="([^"]+)"', attributes_part)
+            if race_uuid_match:
+                node_race_uuid = race_uuid_match.group(1)
+                # RaceUUID匹配就包含
+                if node_race_uuid.lower() == race_uuid.lower():
+                    source_nodes.append((description_part, attributes_part))
+        
+        return source_nodes
     
-    def process_appearance_for_race(self, appearance_content: str, race_name: str, race_uuid: str, target_race_uuid: str = None) -> str:
-        """处理外观配置"""
-        try:
-            # 提取配置主体
-            start_marker = '<children>'
-            end_marker = '</children>'
-            
-            start_idx = appearance_content.find(start_marker)
-            end_idx = appearance_content.find(end_marker)
-            
-            if start_idx == -1 or end_idx == -1:
-                return ""
-            
-            start_idx += len(start_marker)
-            config_body = appearance_content[start_idx:end_idx]
-            
-            if not config_body.strip():
-                return ""
-            
-            # 解析所有CharacterCreationAppearanceVisual节点
-            import re
-            # 匹配完整节点
-            node_pattern = r'<node id="CharacterCreationAppearanceVisual"[^>]*>([\s\S]*?)</node>'
-            node_matches = re.finditer(node_pattern, config_body, re.DOTALL)
-            
-            filtered_nodes = []
-            for match in node_matches:
-                full_node_content = match.group(1)  # 完整的节点内容
-                
-                # 分离描述文本和属性内容
-                # 查找第一个<attribute标签的位置
-                first_attr_match = re.search(r'<attribute', full_node_content)
-                if first_attr_match:
-                    # 描述文本是第一个<attribute之前的内容
-                    description_part = full_node_content[:first_attr_match.start()]
-                    attributes_part = full_node_content[first_attr_match.start():]
+    def _render_appearance_node(self, description_part: str, attributes_part: str, target_race_uuid: str = None) -> str:
+        """为目标种族生成一个外观节点：新UUID、替换RaceUUID、修复IconIdOverride"""
+        # 替换UUID为新生成的UUID（保持每个节点的UUID唯一）
+        def replace_uuid(match):
+            return f'{match.group(1)}{self.generate_bg3_uuid()}{match.group(2)}'
+        
+        uuid_pattern = r'(<attribute id="UUID" type="guid" value=")[^"]+(")'
+        processed_attributes = re.sub(uuid_pattern, replace_uuid, attributes_part)
+        
+        # 有目标UUID就替换
+        if target_race_uuid:
+            def replace_race_uuid(match):
+                return f'{match.group(1)}{target_race_uuid}{match.group(2)}'
+            
+            race_uuid_pattern = r'(<attribute id="RaceUUID"[^>]*value=")[^"]+(")'
+            processed_attributes = re.sub(race_uuid_pattern, replace_race_uuid, processed_attributes)
+        
+        # 检查并修复错误的IconIdOverride
+        slot_name_match = re.search(r'<attribute id="SlotName"[^>]*value="([^"]+)"', processed_attributes)
+        visual_resource_match = re.search(r'<attribute id="VisualResource"[^>]*value="([^"]+)"', processed_attributes)
+        body_type_match = re.search(r'<attribute id="BodyType"[^>]*value="([^"]+)"', processed_attributes)
+        icon_override_match = re.search(r'<attribute id="IconIdOverride"[^>]*value="([^"]+)"', processed_attributes)
+        
+        if slot_name_match and visual_resource_match:
+            slot_name = slot_name_match.group(1)
+            visual_resource_uuid = visual_resource_match.group(1)
+            body_type = body_type_match.group(1) if body_type_match else "1"
+            
+            # 生成正确的IconIdOverride格式：{BodyType}_{SlotName}_{VisualResourceUUID}
+            correct_icon_id = f"{body_type}_{slot_name}_{visual_resource_uuid}"
+            
+            # 检查现有的IconIdOverride是否需要修复
+            need_fix = False
+            if icon_override_match:
+                existing_icon_id = icon_override_match.group(1)
+                # 检查格式是否有问题
+                if ("Horns" in existing_icon_id or 
+                    "Horn" in existing_icon_id or
+                    not existing_icon_id.startswith(f"{body_type}_{slot_name}_") or
+                    existing_icon_id != correct_icon_id):
+                    # 正确格式就不改
+                    expected_pattern = rf"^{body_type}_{slot_name}_[a-f0-9\-]{{36}}$"
+                    if not re.match(expected_pattern, existing_icon_id, re.IGNORECASE):
+                        need_fix = True
+            else:
+                # 没有就添加
+                need_fix = True
+            
+            if need_fix:
+                icon_override_pattern = r'<attribute id="IconIdOverride"[^>]*value="[^"]+"[^>]*/>'
+                if re.search(icon_override_pattern, processed_attributes):
+                    # 有就替换
+                    def replace_icon_override(match):
+                        return f'<attribute id="IconIdOverride" type="FixedString" value="{correct_icon_id}"/>'
+                    processed_attributes = re.sub(icon_override_pattern, replace_icon_override, processed_attributes)
                 else:
-                    # 没属性就全是描述
-                    description_part = full_node_content
-                    attributes_part = ""
-                
-                # 检查节点中的RaceUUID是否匹配目标种族
-                race_uuid_match = re.search(r'<attribute id="RaceUUID"[^>]*value="([^"]+)"', attributes_part)
-                if race_uuid_match:
-                    node_race_uuid = race_uuid_match.group(1)
-                    # RaceUUID匹配就包含
-                    if node_race_uuid.lower() == race_uuid.lower():
-                        # 替换UUID为新生成的UUID（保持每个节点的UUID唯一）
-                        def replace_uuid(match):
-                            return f'{match.group(1)}{self.generate_bg3_uuid()}{match.group(2)}'
-                        
-                        uuid_pattern = r'(<attribute id="UUID" type="guid" value=")[^"]+(")'
-                        processed_attributes = re.sub(uuid_pattern, replace_uuid, attributes_part)
-                        
-                        # 有目标UUID就替换
-                        if target_race_uuid:
-                            def replace_race_uuid(match):
-                                return f'{match.group(1)}{target_race_uuid}{match.group(2)}'
-                            
-                            race_uuid_pattern = r'(<attribute id="RaceUUID"[^>]*value=")[^"]+(")'
-                            processed_attributes = re.sub(race_uuid_pattern, replace_race_uuid, processed_attributes)
-                        
-                        # 检查并修复错误的IconIdOverride
-                        slot_name_match = re.search(r'<attribute id="SlotName"[^>]*value="([^"]+)"', processed_attributes)
-                        visual_resource_match = re.search(r'<attribute id="VisualResource"[^>]*value="([^"]+)"', processed_attributes)
-                        body_type_match = re.search(r'<attribute id="BodyType"[^>]*value="([^"]+)"', processed_attributes)
-                        icon_override_match = re.search(r'<attribute id="IconIdOverride"[^>]*value="([^"]+)"', processed_attributes)
-                        
-                        if slot_name_match and visual_resource_match:
-                            slot_name = slot_name_match.group(1)
-                            visual_resource_uuid = visual_resource_match.group(1)
-                            body_type = body_type_match.group(1) if body_type_match else "1"
-                            
-                            # 生成正确的IconIdOverride格式：{BodyType}_{SlotName}_{VisualResourceUUID}
-                            correct_icon_id = f"{body_type}_{slot_name}_{visual_resource_uuid}"
-                            
-                            # 检查现有的IconIdOverride是否需要修复
-                            need_fix = False
-                            if icon_override_match:
-                                existing_icon_id = icon_override_match.group(1)
-                                # 检查格式是否有问题
-                                if ("Horns" in existing_icon_id or 
-                                    "Horn" in existing_icon_id or
-                                    not existing_icon_id.startswith(f"{body_type}_{slot_name}_") or
-                                    existing_icon_id != correct_icon_id):
-                                    # 正确格式就不改
-                                    expected_pattern = rf"^{body_type}_{slot_name}_[a-f0-9\-]{{36}}$"
-                                    if not re.match(expected_pattern, existing_icon_id, re.IGNORECASE):
-                                        need_fix = True
-                            else:
-                                # 没有就添加
-                                need_fix = True
-                            
-                            if need_fix:
-                                icon_override_pattern = r'<attribute id="IconIdOverride"[^>]*value="[^"]+"[^>]*/>'
-                                if re.search(icon_override_pattern, processed_attributes):
-                                    # 有就替换
-                                    def replace_icon_override(match):
-                                        return f'<attribute id="IconIdOverride" type="FixedString" value="{correct_icon_id}"/>'
-                                    processed_attributes = re.sub(icon_override_pattern, replace_icon_override, processed_attributes)
-                                else:
-                                    # 没有就在SlotName后加
-                                    slot_name_pattern = r'(<attribute id="SlotName"[^>]*/>)'
-                                    def add_icon_override(match):
-                                        return f'{match.group(1)}\n                    <attribute id="IconIdOverride" type="FixedString" value="{correct_icon_id}"/>'
-                                    processed_attributes = re.sub(slot_name_pattern, add_icon_override, processed_attributes)
-                        
-                        # 重建节点
-                        # 为属性行添加适当的缩进
-                        if processed_attributes:
-                            indented_attributes = '\n'.join(['                    ' + line.strip() for line in processed_attributes.split('\n') if line.strip()])
-                        else:
-                            indented_attributes = ""
-                        
-                        # 构建节点
-                        if description_part.strip():
-                            # 去掉末尾换行
-                            clean_description = description_part.rstrip()
-                            if indented_attributes:
-                                complete_node = f'                <node id="CharacterCreationAppearanceVisual">{clean_description}\n{indented_attributes}\n                </node>'
-                            else:
-                                complete_node = f'                <node id="CharacterCreationAppearanceVisual">{clean_description}\n                </node>'
-                        else:
-                            if indented_attributes:
-                                complete_node = f'                <node id="CharacterCreationAppearanceVisual">\n{indented_attributes}\n                </node>'
-                            else:
-                                complete_node = f'                <node id="CharacterCreationAppearanceVisual">\n                </node>'
-                        
-                        filtered_nodes.append(complete_node)
-            
-            if filtered_nodes:
-                return '\n'.join(filtered_nodes)
+                    # 没有就在SlotName后加
+                    slot_name_pattern = r'(<attribute id="SlotName"[^>]*/>)'
+                    def add_icon_override(match):
+                        return f'{match.group(1)}\n                    <attribute id="IconIdOverride" type="FixedString" value="{correct_icon_id}"/>'
+                    processed_attributes = re.sub(slot_name_pattern, add_icon_override, processed_attributes)
+        
+        # 重建节点
+        # 为属性行添加适当的缩进
+        if processed_attributes:
+            indented_attributes = '\n'.join(['                    ' + line.strip() for line in processed_attributes.split('\n') if line.strip()])
+        else:
+            indented_attributes = ""
+        
+        # 构建节点
+        if description_part.strip():
+            # 去掉末尾换行
+            clean_description = description_part.rstrip()
+            if indented_attributes:
+                complete_node = f'                <node id="CharacterCreationAppearanceVisual">{clean_description}\n{indented_attributes}\n                </node>'
             else:
-                return ""
-            
-        except Exception as e:
-            return ""
+                complete_node = f'                <node id="CharacterCreationAppearanceVisual">{clean_description}\n                </node>'
+        else:
+            if indented_attributes:
+                complete_node = f'                <node id="CharacterCreationAppearanceVisual">\n{indented_attributes}\n                </node>'
+            else:
+                complete_node = f'                <node id="CharacterCreationAppearanceVisual">\n                </node>'
+        
+        return complete_node
+    
+    def validate_patch(self):
+        """流式校验生成的外观配置(含分片)，有问题时记录全部问题并抛出异常"""
+        mod_name = self.patch_info['mod_name']
+        public_dir = self.output_dir / mod_name / "Public" / mod_name / "CharacterCreation"
+        lsx_files = sorted(public_dir.glob("CharacterCreationAppearanceVisuals*.lsx"))
+        
+        # 没有种族数据时保留原版种族，不检查RaceUUID的范围
+        race_uuids = [race_info['uuid'] for race_info in self.race_data.values()] or None
+        validator = PatchValidator(race_uuids,
+                                   int(self.settings.get('validate_max_errors', 20) or 1), self.logger)
+        problems = validator.validate_files(lsx_files)
+        self.profiler.count("validate", files_scanned=len(lsx_files),
+                            bytes_read=sum(lsx_file.stat().st_size for lsx_file in lsx_files))
+        
+        if problems:
+            for problem in problems:
+                self.logger.error("补丁校验: %s", problem)
+            raise Exception(self.texts.get("validation_failed", "补丁校验失败，发现 {count} 个问题(详见日志)，第一个: {first}").format(
+                count=len(problems), first=problems[0]))
+        self.logger.info("补丁校验通过: %d 个文件，%d 个外观节点", len(lsx_files), validator.nodes_checked)
     
     def pack_mod(self):
         """打包MOD"""
@@ -1334,48 +2220,28 @@ class BG3CompatibilityGenerator:
                 if item.is_file() and item.suffix == '.pak':
                     try:
                         item.unlink()
-                    except:
-                        pass
+                    except Exception as e:
+                        self.logger.warning("删除旧pak %s 失败: %s", item, e)
         
         try:
             # 检查目录
             if not mod_dir.exists():
                 raise Exception(f"MOD目录不存在: {mod_dir}")
                 
-            # 使用Divine.exe打包
-            cmd = [
-                str(self.divine_exe),
-                "-g", "bg3",
-                "--action", "create-package",
-                "--source", str(mod_dir),
-                "--destination", str(pak_file),
-                "-l", "all"
-            ]
-            
-            # 隐藏控制台窗口
-            creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=self.divine_exe.parent, creationflags=creation_flags)
-            
-            # 记录输出
-            if result.stdout:
-                pass
-            
-            if result.stderr:
-                pass
-            
-            if result.returncode != 0:
-                error_msg = result.stderr if result.stderr else result.stdout
-                raise Exception(f"Divine.exe打包失败 (返回码: {result.returncode}): {error_msg}")
+            # 使用pak后端打包
+            with self.profiler.stage("pack"):
+                self.pak_backend.pack(mod_dir, pak_file)
             
             # 检查pak文件
             if not pak_file.exists():
     
                 raise Exception(f"打包后的pak文件不存在: {pak_file}")
                 
-
+            self.profiler.count("pack", bytes_written=pak_file.stat().st_size)
             
             # 创建ZIP压缩包
-            self.create_zip_package(pak_file, mod_dir, mod_name)
+            with self.profiler.stage("zip"):
+                self.create_zip_package(pak_file, mod_dir, mod_name)
             
         except Exception as e:
             raise Exception(f"打包MOD失败: {e}")
@@ -1427,6 +2293,8 @@ class BG3CompatibilityGenerator:
                 zf.write(temp_pak, pak_file.name)
                 # 添加info.json
                 zf.write(info_file, "info.json")
+            self.profiler.count("zip", files_scanned=2, bytes_read=temp_pak.stat().st_size,
+                                bytes_written=zip_file.stat().st_size)
             
 
             
@@ -1434,7 +2302,7 @@ class BG3CompatibilityGenerator:
             shutil.rmtree(temp_dir)
             
         except Exception as e:
-
+            self.logger.exception("创建ZIP压缩包失败")
             # 清理临时目录
             temp_dir = self.output_dir / "temp"
             if temp_dir.exists():
@@ -1496,6 +2364,9 @@ class BG3CompatibilityGenerator:
 
         self.root.mainloop()
 
+        if self.mod_watcher:
+            self.mod_watcher.stop()
+
 def main():
     """主入口"""
     try:
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - 外观节点去重
+不同外观MOD经常包含相同的VisualResource + SlotName + BodyType + BodyShape，
+在展开到每个种族之前按外观标识合并，只保留一个节点
+"""
+
+import re
+import hashlib
+from array import array
+
+# 去重策略: off(不去重), first(先出现的优先), last(后出现的优先), most_complete(属性最多的优先)
+DEDUP_POLICIES = ("off", "first", "last", "most_complete")
+
+# 外观标识使用的属性
+IDENTITY_ATTRIBUTES = ("VisualResource", "SlotName", "BodyType", "BodyShape")
+
+_ATTRIBUTE_PATTERNS = {
+    name: re.compile(rf'<attribute id="{name}"[^>]*value="([^"]*)"') for name in IDENTITY_ATTRIBUTES + ("RaceUUID",)
+}
+_ATTRIBUTE_TAG = re.compile(r'<attribute\b')
+
+
+def _attribute_value(attributes_part: str, name: str) -> str:
+    match = _ATTRIBUTE_PATTERNS[name].search(attributes_part)
+    return match.group(1).lower() if match else ""
+
+
+def visual_identity(attributes_part: str, include_race: bool = False):
+    """节点的外观标识，没有VisualResource的节点返回None(不参与去重)
+    
+    include_race为True时加上RaceUUID，用于没有目标种族、保留原版种族的情况。
+    """
+    if not _attribute_value(attributes_part, "VisualResource"):
+        return None
+    identity = tuple(_attribute_value(attributes_part, name) for name in IDENTITY_ATTRIBUTES)
+    if include_race:
+        identity += (_attribute_value(attributes_part, "RaceUUID"),)
+    return identity
+
+
+def completeness(attributes_part: str) -> int:
+    """节点的属性数量"""
+    return len(_ATTRIBUTE_TAG.findall(attributes_part))
+
+
+def dedupe_nodes(source_nodes: list, policy: str = "first", include_race: bool = False):
+    """按外观标识去重，返回(保留的节点, 丢弃数量)
+    
+    source_nodes中每项是包含'attributes'的字典。保留的节点留在该标识第一次出现的位置，
+    所以输出顺序和策略无关，只有保留哪个来源不同。
+    """
+    if policy not in DEDUP_POLICIES or policy == "off":
+        return list(source_nodes), 0
+    
+    kept = []
+    index = {}  # 外观标识 -> kept中的位置
+    dropped = 0
+    for node in source_nodes:
+        identity = visual_identity(node['attributes'], include_race)
+        if identity is None:
+            kept.append(node)
+            continue
+        
+        position = index.get(identity)
+        if position is None:
+            index[identity] = len(kept)
+            kept.append(node)
+            continue
+        
+        dropped += 1
+        if policy == "last":
+            kept[position] = node
+        elif policy == "most_complete" and completeness(node['attributes']) > completeness(kept[position]['attributes']):
+            kept[position] = node
+    return kept, dropped
+
+
+def dedupe_indices(nodes, policy: str = "first", include_race: bool = False):
+    """和dedupe_nodes规则相同，返回(保留节点的编号, 丢弃数量)
+    
+    nodes只顺序读取一次，不保存节点内容，外观标识压缩为16字节摘要，
+    适合遍历写在临时文件中的节点。
+    """
+    enabled = policy in DEDUP_POLICIES and policy != "off"
+    kept = array('q')
+    index = {}  # 标识摘要 -> (kept中的位置, 属性数)
+    dropped = 0
+    for node_index, node in enumerate(nodes):
+        identity = visual_identity(node['attributes'], include_race) if enabled else None
+        if identity is None:
+            kept.append(node_index)
+            continue
+        
+        key = hashlib.blake2b("\0".join(identity).encode('utf-8'), digest_size=16).digest()
+        entry = index.get(key)
+        if entry is None:
+            index[key] = (len(kept), completeness(node['attributes']) if policy == "most_complete" else 0)
+            kept.append(node_index)
+            continue
+        
+        dropped += 1
+        position, score = entry
+        if policy == "last":
+            kept[position] = node_index
+        elif policy == "most_complete":
+            node_score = completeness(node['attributes'])
+            if node_score > score:
+                kept[position] = node_index
+                index[key] = (position, node_score)
+    return kept, dropped
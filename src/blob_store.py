@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - 内容寻址存储
+解包出的文件按SHA256存一份到Data/Store，各配置中的文件都是指向它的硬链接，
+相同内容只占一份磁盘空间
+"""
+
+import os
+import shutil
+import logging
+from pathlib import Path
+
+from src.import_modes import file_sha256
+
+# 硬链接替换时的临时文件后缀
+TEMP_SUFFIX = ".blobtmp"
+
+
+class BlobStore:
+    """按内容哈希存放文件，文件以硬链接方式放进各配置目录
+    
+    存储中的文件只被硬链接引用，没有其他链接(链接数为1)时可以被gc删除。
+    文件系统不支持硬链接时保留原文件，不去重。
+    """
+    
+    def __init__(self, root: Path, logger: logging.Logger = None):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.logger = logger or logging.getLogger("bg3_cc")
+    
+    def blob_path(self, digest: str) -> Path:
+        """哈希对应的存储路径，按前两位分目录"""
+        return self.blob_dir / digest[:2] / digest
+    
+    def ingest_file(self, file_path: Path):
+        """把文件放进存储并替换为硬链接，返回(哈希, 节省的字节数)
+        
+        已经是硬链接的文件(链接数大于1)视为已存储，跳过。失败时返回(None, 0)。
+        """
+        file_path = Path(file_path)
+        try:
+            stat = file_path.stat()
+            if stat.st_nlink > 1:
+                return None, 0
+            
+            digest = file_sha256(file_path)
+            blob = self.blob_path(digest)
+            if blob.exists():
+                # 已有相同内容，换成指向存储的链接
+                temp_path = file_path.with_name(file_path.name + TEMP_SUFFIX)
+                os.link(blob, temp_path)
+                os.replace(temp_path, file_path)
+                return digest, stat.st_size
+            
+            # 新内容，文件本身成为存储的一个链接
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.link(file_path, blob)
+            return digest, 0
+        except OSError as e:
+            self.logger.debug("文件未放入存储 %s: %s", file_path, e)
+            return None, 0
+    
+    def ingest_tree(self, directory: Path):
+        """把目录中的所有文件放进存储，返回(处理文件数, 节省的字节数)"""
+        files = 0
+        saved = 0
+        for root, _, names in os.walk(directory):
+            for name in names:
+                if name.endswith(TEMP_SUFFIX):
+                    continue
+                digest, saved_bytes = self.ingest_file(Path(root) / name)
+                if digest:
+                    files += 1
+                    saved += saved_bytes
+        return files, saved
+    
+    def link_tree(self, source: Path, dest: Path) -> int:
+        """用硬链接复制目录，不支持硬链接时复制文件，返回文件数"""
+        count = 0
+        for root, _, names in os.walk(source):
+            target_dir = Path(dest) / Path(root).relative_to(source)
+            target_dir.mkdir(parents=True, exist_ok=True)
+            for name in names:
+                try:
+                    os.link(Path(root) / name, target_dir / name)
+                except OSError:
+                    shutil.copy2(Path(root) / name, target_dir / name)
+                count += 1
+        return count
+    
+    def gc(self):
+        """删除没有被任何配置引用的存储文件，返回(删除数, 释放的字节数)"""
+        removed = 0
+        freed = 0
+        if not self.blob_dir.exists():
+            return removed, freed
+        for blob in self.blob_dir.glob("*/*"):
+            try:
+                stat = blob.stat()
+                if stat.st_nlink <= 1:
+                    blob.unlink()
+                    removed += 1
+                    freed += stat.st_size
+            except OSError as e:
+                self.logger.warning("清理存储文件 %s 失败: %s", blob, e)
+        return removed, freed
+    
+    def usage(self):
+        """存储占用(文件数, 字节数)"""
+        count = 0
+        size = 0
+        if self.blob_dir.exists():
+            for blob in self.blob_dir.glob("*/*"):
+                count += 1
+                size += blob.stat().st_size
+        return count, size
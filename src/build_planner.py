@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - 生成预估
+生成前统计外观节点数，估算输出大小和耗时，不生成任何输出
+"""
+
+from statistics import median
+
+from src.lsx_output import LSX_HEADER, LSX_FOOTER
+
+# 每个输出节点在属性原文之外增加的字节(缩进、node标签、补上的IconIdOverride等)
+NODE_OVERHEAD_BYTES = 160
+
+# 没有运行历史时的估算参数
+DEFAULT_SECONDS_PER_NODE = 0.00005
+DEFAULT_SECONDS_PER_BYTE = 0.00000002
+DEFAULT_FIXED_SECONDS = 1.0
+
+# 用最近几次生成校准
+CALIBRATION_RUNS = 10
+
+
+def _stage(result: dict, name: str) -> dict:
+    for stage in result.get('stages', []):
+        if stage['name'] == name:
+            return stage
+    return {}
+
+
+def calibrate(history: list) -> dict:
+    """根据历史生成记录估算每节点、每字节耗时和固定耗时
+    
+    节点耗时取generate阶段，字节耗时取pack+zip阶段，其余阶段算固定耗时，各取中位数。
+    """
+    per_node, per_byte, fixed = [], [], []
+    for result in history[-CALIBRATION_RUNS:]:
+        if not result.get('success'):
+            continue
+        generate = _stage(result, "generate")
+        nodes = generate.get('nodes_emitted', 0)
+        bytes_written = generate.get('bytes_written', 0)
+        if nodes <= 0:
+            continue
+        per_node.append(generate['wall_time'] / nodes)
+        pack_time = _stage(result, "pack").get('wall_time', 0) + _stage(result, "zip").get('wall_time', 0)
+        if bytes_written > 0:
+            per_byte.append(pack_time / bytes_written)
+        fixed.append(max(0.0, result.get('wall_time', 0) - generate['wall_time'] - pack_time))
+    
+    return {
+        'seconds_per_node': median(per_node) if per_node else DEFAULT_SECONDS_PER_NODE,
+        'seconds_per_byte': median(per_byte) if per_byte else DEFAULT_SECONDS_PER_BYTE,
+        'fixed_seconds': median(fixed) if fixed else DEFAULT_FIXED_SECONDS,
+        'calibration_runs': len(per_node),
+    }
+
+
+def build_plan(rows: list, kept_nodes: list, dropped: int, target_races: int, history: list) -> dict:
+    """汇总预估结果
+    
+    rows为每个外观MOD的[{'pak': 名称, 'race': 选择的种族, 'nodes': 匹配节点数}]，
+    kept_nodes为去重后的源节点，每个都会为target_races个目标种族各输出一次。
+    """
+    target_races = max(1, target_races)
+    node_bytes = sum(len(node['description']) + len(node['attributes']) + NODE_OVERHEAD_BYTES for node in kept_nodes)
+    total_nodes = len(kept_nodes) * target_races
+    projected_bytes = node_bytes * target_races + len(LSX_HEADER) + len(LSX_FOOTER)
+    
+    timing = calibrate(history)
+    estimated_seconds = (timing['fixed_seconds'] + total_nodes * timing['seconds_per_node'] +
+                         projected_bytes * timing['seconds_per_byte'])
+    return {
+        'rows': rows,
+        'source_nodes': len(kept_nodes) + dropped,
+        'dropped': dropped,
+        'target_races': target_races,
+        'total_nodes': total_nodes,
+        'projected_bytes': projected_bytes,
+        'estimated_seconds': estimated_seconds,
+        'calibration_runs': timing['calibration_runs'],
+    }
+
+
+def is_oversized(plan: dict, settings: dict) -> bool:
+    """超过设置中的节点数或大小上限"""
+    max_nodes = settings.get('plan_warn_nodes', 0) or 0
+    max_mb = settings.get('plan_warn_mb', 0) or 0
+    return ((max_nodes > 0 and plan['total_nodes'] > max_nodes) or
+            (max_mb > 0 and plan['projected_bytes'] > max_mb * 1024 * 1024))
+
+
+def format_plan(plan: dict) -> list:
+    """预估结果转成文本行"""
+    lines = [f"{'pak':<40} {'race':<20} {'nodes':>8}"]
+    for row in plan['rows']:
+        lines.append(f"{row['pak'][:40]:<40} {row['race'][:20]:<20} {row['nodes']:>8}")
+    lines.append("")
+    lines.append(f"source nodes={plan['source_nodes']}  duplicates={plan['dropped']}  target races={plan['target_races']}")
+    lines.append(f"output nodes={plan['total_nodes']}  size={plan['projected_bytes'] / (1024 * 1024):.1f}MB  "
+                 f"time~{plan['estimated_seconds']:.1f}s (calibrated from {plan['calibration_runs']} runs)")
+    return lines
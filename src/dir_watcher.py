@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - 目录监视
+监视Sourcemod/Panagway中的增删改(包括解包文件夹内部)，Linux下用inotify，其他系统用mtime轮询
+"""
+
+import os
+import sys
+import time
+import select
+import struct
+import logging
+import threading
+from pathlib import Path
+
+# inotify事件
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event: wd, mask, cookie, len, 后面是name
+EVENT_STRUCT = struct.Struct("iIII")
+
+
+def _load_inotify():
+    """加载libc中的inotify函数，不可用时返回None"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def _tree_signature(directory: str) -> tuple:
+    """文件夹内所有条目的(相对路径, 大小, 修改时间)，内部任何文件增删改时变化"""
+    signature = []
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                    except OSError:
+                        continue
+                    signature.append((os.path.relpath(entry.path, directory), stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            continue
+    return tuple(sorted(signature))
+
+
+def _snapshot(directory: Path) -> dict:
+    """目录顶层条目 {名称: (是否目录, 大小, 修改时间, 文件夹内容签名)}"""
+    entries = {}
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                    is_dir = entry.is_dir()
+                    entries[entry.name] = (is_dir, stat.st_size, stat.st_mtime_ns,
+                                           _tree_signature(entry.path) if is_dir else None)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return entries
+
+
+class DirWatcher:
+    """在后台线程监视多个目录
+    
+    子文件夹内的变化归到所在的顶层条目，变化先累积，静默debounce秒后一次性回调callback(paths)，
+    paths为变化的顶层条目路径列表(可能已被删除)。回调在监视线程中执行，界面更新需要调用方转到主线程。
+    """
+    
+    def __init__(self, directories: list, callback, logger: logging.Logger = None,
+                 poll_interval: float = 0.25, debounce: float = 0.2):
+        self.directories = [Path(d) for d in directories]
+        self.callback = callback
+        self.logger = logger or logging.getLogger("bg3_cc")
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.backend = None
+        self._libc = None
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """启动监视线程，返回实际使用的方式(inotify或polling)"""
+        fd, watches = self._init_inotify()
+        if fd is not None:
+            self.backend = "inotify"
+            target, args = self._run_inotify, (fd, watches)
+        else:
+            self.backend = "polling"
+            # 在启动线程前取初始快照，start()返回后的变化都能检测到
+            snapshots = {directory: _snapshot(directory) for directory in self.directories}
+            target, args = self._run_polling, (snapshots,)
+        self._thread = threading.Thread(target=target, args=args, name="DirWatcher", daemon=True)
+        self._thread.start()
+        return self.backend
+    
+    def stop(self):
+        """停止监视"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+    
+    def _emit(self, paths: set):
+        try:
+            self.callback(sorted(paths))
+        except Exception:
+            self.logger.exception("处理目录变化失败")
+    
+    def _init_inotify(self):
+        """初始化inotify，失败时返回(None, None)"""
+        libc = _load_inotify()
+        if libc is None:
+            return None, None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None, None
+        
+        self._libc = libc
+        watches = {}
+        for directory in self.directories:
+            if not self._add_watch_tree(fd, watches, directory, directory):
+                self.logger.warning("inotify无法监视 %s，改用轮询", directory)
+                os.close(fd)
+                return None, None
+        return fd, watches
+    
+    def _add_watch_tree(self, fd: int, watches: dict, root: Path, directory: Path) -> bool:
+        """监视directory及其所有子文件夹，watches记录{wd: (监视的根目录, 文件夹)}"""
+        for current, _, _ in os.walk(directory):
+            wd = self._libc.inotify_add_watch(fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                return False
+            watches[wd] = (root, Path(current))
+        return True
+    
+    def _run_inotify(self, fd: int, watches: dict):
+        pending = set()
+        last_event = 0.0
+        try:
+            while not self._stop_event.is_set():
+                timeout = self.debounce if pending else self.poll_interval
+                readable, _, _ = select.select([fd], [], [], timeout)
+                if readable:
+                    try:
+                        data = os.read(fd, 64 * 1024)
+                    except BlockingIOError:
+                        data = b""
+                    offset = 0
+                    while offset + EVENT_STRUCT.size <= len(data):
+                        wd, mask, cookie, name_length = EVENT_STRUCT.unpack_from(data, offset)
+                        offset += EVENT_STRUCT.size
+                        name = data[offset:offset + name_length].split(b"\0", 1)[0]
+                        offset += name_length
+                        if mask & IN_IGNORED:
+                            # 子文件夹被删除时监视自动移除，根目录失效才需要提示
+                            root, folder = watches.pop(wd, (None, None))
+                            if folder is not None and folder == root:
+                                self.logger.warning("监视目录已失效: %s", root)
+                            continue
+                        if wd in watches and name:
+                            root, folder = watches[wd]
+                            path = folder / os.fsdecode(name)
+                            # 新建或移入的子文件夹也要监视
+                            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                                if not self._add_watch_tree(fd, watches, root, path) and path.exists():
+                                    self.logger.warning("inotify无法监视 %s", path)
+                            pending.add(root / path.relative_to(root).parts[0])
+                            last_event = time.monotonic()
+                
+                # 文件还在写入时继续等待
+                if pending and time.monotonic() - last_event >= self.debounce:
+                    self._emit(pending)
+                    pending = set()
+        finally:
+            os.close(fd)
+    
+    def _run_polling(self, snapshots: dict):
+        pending = set()
+        while not self._stop_event.wait(self.poll_interval):
+            changed = set()
+            for directory in self.directories:
+                current = _snapshot(directory)
+                previous = snapshots[directory]
+                for name in previous.keys() | current.keys():
+                    if previous.get(name) != current.get(name):
+                        changed.add(directory / name)
+                snapshots[directory] = current
+            
+            # 连续两次扫描没有变化才回调，避免拿到复制到一半的文件
+            if changed:
+                pending |= changed
+            elif pending:
+                self._emit(pending)
+                pending = set()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - Divine.exe调用模块
+把多个pak合并成一次extract-packages调用，减少Divine.exe启动和.NET预热开销
+"""
+
+import os
+import sys
+import shutil
+import logging
+import subprocess
+import tempfile
+from pathlib import Path
+
+# 批量解包时检查输出文件夹的间隔(秒)
+BATCH_POLL_INTERVAL = 0.2
+
+
+class DivineError(Exception):
+    """Divine.exe执行失败"""
+    pass
+
+
+def _link_or_copy(source: Path, dest: Path):
+    """优先硬链接到暂存目录，其次符号链接，都不支持时复制"""
+    try:
+        os.link(source, dest)
+        return
+    except OSError:
+        pass
+    try:
+        os.symlink(source, dest)
+    except OSError:
+        shutil.copy2(source, dest)
+
+
+class DivineRunner:
+    """Divine.exe命令封装"""
+    
+    def __init__(self, divine_exe: Path, logger: logging.Logger = None):
+        self.divine_exe = Path(divine_exe)
+        self.logger = logger or logging.getLogger("bg3_cc")
+    
+    def run(self, args: list, action: str, on_poll=None, poll_interval: float = BATCH_POLL_INTERVAL) -> subprocess.CompletedProcess:
+        """执行Divine.exe，输出写入日志
+        
+        on_poll不为空时，进程运行期间每poll_interval秒调用一次on_poll()。
+        """
+        cmd = [str(self.divine_exe)] + [str(arg) for arg in args]
+        
+        # Windows隐藏控制台
+        creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        if on_poll is None:
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=self.divine_exe.parent, creationflags=creation_flags)
+        else:
+            with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                  cwd=self.divine_exe.parent, creationflags=creation_flags) as process:
+                while True:
+                    try:
+                        # 超时后再次调用不会丢失输出
+                        stdout, stderr = process.communicate(timeout=poll_interval)
+                        break
+                    except subprocess.TimeoutExpired:
+                        on_poll()
+            result = subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+        
+        if result.stdout and result.stdout.strip():
+            self.logger.info("%s stdout:\n%s", action, result.stdout.strip())
+        if result.stderr and result.stderr.strip():
+            self.logger.warning("%s stderr:\n%s", action, result.stderr.strip())
+        return result
+    
+    def _check(self, result: subprocess.CompletedProcess, what: str):
+        if result.returncode != 0:
+            error_msg = result.stderr if result.stderr else result.stdout
+            raise DivineError(f"Divine.exe{what}失败 (返回码: {result.returncode}): {error_msg}")
+    
+    def extract_package(self, pak_file, extract_dir: Path):
+        """解包单个pak"""
+        extract_dir = Path(extract_dir)
+        extract_dir.mkdir(parents=True, exist_ok=True)
+        
+        result = self.run(["--game", "bg3", "--action", "extract-package",
+                           "--source", pak_file, "--destination", extract_dir],
+                          f"extract-package {Path(pak_file).name}")
+        self._check(result, "解包")
+        
+        # 检查解包结果
+        if not extract_dir.exists() or not any(extract_dir.iterdir()):
+            raise DivineError(f"解包后目录为空或不存在: {extract_dir}")
+    
+    def extract_packages(self, jobs: list, on_done=None) -> dict:
+        """批量解包
+        
+        jobs为[(pak_file, extract_dir), ...]。所有pak先硬链接到一个暂存目录，
+        用一次extract-packages解包，再按文件名把结果移到各自的extract_dir。
+        Divine逐个解包(顺序不一定和jobs相同)，按在磁盘上看到输出文件夹的先后判断：
+        比最新看到的文件夹更早一轮看到的都已完成，运行期间就移走并调用on_done，调用方可以一边解包一边解析；
+        同一轮看到的几个分不清先后，和最后一个一起在进程结束后处理。
+        批量调用失败或某个pak没有产出时，回退到单个extract-package。
+        on_done(pak_file, error)在每个pak处理完后调用。
+        返回{pak_file: 错误信息或None}。
+        """
+        results = {}
+        if not jobs:
+            return results
+        
+        # 同名pak无法放进同一个暂存目录，只批量处理第一个
+        batch_jobs = {}
+        fallback_jobs = []
+        for pak_file, extract_dir in jobs:
+            stem = Path(pak_file).stem
+            if stem in batch_jobs:
+                fallback_jobs.append((pak_file, extract_dir))
+            else:
+                batch_jobs[stem] = (pak_file, Path(extract_dir))
+        
+        if len(batch_jobs) > 1:
+            staging_root = Path(tempfile.mkdtemp(prefix="bg3_divine_batch_"))
+            try:
+                source_dir = staging_root / "source"
+                output_dir = staging_root / "output"
+                source_dir.mkdir()
+                output_dir.mkdir()
+                for stem, (pak_file, _) in batch_jobs.items():
+                    _link_or_copy(Path(pak_file), source_dir / f"{stem}.pak")
+                
+                def finish(stem):
+                    # 按文件名映射回对应的MOD
+                    pak_file, extract_dir = batch_jobs[stem]
+                    batch_output = output_dir / stem
+                    if not (batch_output.is_dir() and any(batch_output.iterdir())):
+                        return False
+                    if extract_dir.exists():
+                        shutil.rmtree(extract_dir)
+                    extract_dir.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(str(batch_output), str(extract_dir))
+                    results[pak_file] = None
+                    if on_done:
+                        on_done(pak_file, None)
+                    return True
+                
+                first_seen = {}  # 输出文件夹第一次出现在第几轮检查
+                polls = [0]
+                
+                def poll():
+                    polls[0] += 1
+                    for stem in batch_jobs:
+                        if stem not in first_seen and (output_dir / stem).exists():
+                            first_seen[stem] = polls[0]
+                    if not first_seen:
+                        return
+                    # 最新一轮出现的文件夹中有一个可能还在写入，更早出现的都已经解包完
+                    latest = max(first_seen.values())
+                    for stem, seen in first_seen.items():
+                        if seen < latest and batch_jobs[stem][0] not in results:
+                            finish(stem)
+                
+                result = self.run(["--game", "bg3", "--action", "extract-packages",
+                                   "--source", source_dir, "--destination", output_dir],
+                                  f"extract-packages ({len(batch_jobs)})", on_poll=poll)
+                
+                remaining = [stem for stem, (pak_file, _) in batch_jobs.items() if pak_file not in results]
+                if result.returncode == 0:
+                    for stem in remaining:
+                        if not finish(stem):
+                            self.logger.warning("批量解包没有产出 %s，改为单独解包", Path(batch_jobs[stem][0]).name)
+                            fallback_jobs.append(batch_jobs[stem])
+                else:
+                    self.logger.warning("批量解包失败 (返回码: %s)，剩余 %d 个改为逐个解包", result.returncode, len(remaining))
+                    fallback_jobs.extend(batch_jobs[stem] for stem in remaining)
+            except Exception as e:
+                self.logger.warning("批量解包出错，改为逐个解包: %s", e)
+                queued = {job[0] for job in fallback_jobs}
+                fallback_jobs.extend(job for job in batch_jobs.values()
+                                     if job[0] not in results and job[0] not in queued)
+            finally:
+                shutil.rmtree(staging_root, ignore_errors=True)
+        else:
+            fallback_jobs.extend(batch_jobs.values())
+        
+        # 逐个解包
+        for pak_file, extract_dir in fallback_jobs:
+            try:
+                if Path(extract_dir).exists():
+                    shutil.rmtree(extract_dir)
+                self.extract_package(pak_file, extract_dir)
+                results[pak_file] = None
+            except Exception as e:
+                results[pak_file] = f"解包 {Path(pak_file).name} 失败: {e}"
+            if on_done:
+                on_done(pak_file, results[pak_file])
+        
+        return results
+    
+    def create_package(self, source_dir: Path, pak_file: Path):
+        """打包目录为pak"""
+        result = self.run(["-g", "bg3", "--action", "create-package",
+                           "--source", source_dir, "--destination", pak_file, "-l", "all"],
+                          f"create-package {Path(pak_file).name}")
+        self._check(result, "打包")
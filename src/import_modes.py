@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - pak导入方式
+copy: 复制文件
+link: 优先写时复制(reflink)，其次硬链接，都不支持时复制
+reference: 不复制，只记录原文件路径和内容哈希(.pakref)
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+from pathlib import Path
+
+IMPORT_MODES = ("copy", "link", "reference")
+
+# 引用文件后缀，文件名主干与pak相同
+PAK_REF_SUFFIX = ".pakref"
+
+# 导入文件后缀
+PAK_SUFFIXES = (".pak", PAK_REF_SUFFIX)
+
+# Linux FICLONE ioctl
+FICLONE = 0x40049409
+
+
+class PakRefError(Exception):
+    """.pakref引用的原文件丢失或内容已变化"""
+    pass
+
+
+def reflink(source: Path, dest: Path):
+    """写时复制，文件系统不支持时抛出OSError"""
+    if sys.platform.startswith("linux"):
+        import fcntl
+        with open(source, 'rb') as src, open(dest, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except OSError:
+                dst.close()
+                os.unlink(dest)
+                raise
+        shutil.copystat(source, dest)
+    elif sys.platform == "darwin":
+        import ctypes
+        libc = ctypes.CDLL("libc.dylib", use_errno=True)
+        if libc.clonefile(os.fsencode(source), os.fsencode(dest), 0) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+    else:
+        raise OSError("当前系统不支持reflink")
+
+
+def link_or_copy(source: Path, dest: Path) -> str:
+    """按reflink、硬链接、复制的顺序放置文件，返回实际使用的方式"""
+    try:
+        reflink(source, dest)
+        return "reflink"
+    except OSError:
+        pass
+    try:
+        os.link(source, dest)
+        return "hardlink"
+    except OSError:
+        pass
+    shutil.copy2(source, dest)
+    return "copy"
+
+
+def file_sha256(file_path: Path) -> str:
+    """计算文件SHA256"""
+    hash_sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hash_sha256.update(chunk)
+    return hash_sha256.hexdigest()
+
+
+def write_pak_ref(source: Path, ref_file: Path):
+    """记录原文件路径、大小、修改时间和哈希"""
+    stat = source.stat()
+    ref_data = {
+        "source": str(source.resolve()),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": file_sha256(source),
+    }
+    with open(ref_file, 'w', encoding='utf-8') as f:
+        json.dump(ref_data, f, indent=4, ensure_ascii=False)
+
+
+def read_pak_ref(ref_file: Path) -> dict:
+    """读取引用文件"""
+    with open(ref_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def resolve_pak_path(pak_path, verify: bool = True) -> Path:
+    """把导入目录中的条目解析为真实pak路径
+    
+    普通pak直接返回；.pakref返回记录的原文件。原文件丢失时抛出PakRefError。
+    verify为True时，大小或修改时间和记录不同就重新计算哈希：不一致抛出PakRefError，
+    一致时(例如只是被touch或复制回原处)更新记录，下次不再重复计算。
+    """
+    pak_path = Path(pak_path)
+    if pak_path.suffix != PAK_REF_SUFFIX:
+        return pak_path
+    
+    ref_data = read_pak_ref(pak_path)
+    source = Path(ref_data["source"])
+    if not source.exists():
+        raise PakRefError(f"{pak_path.stem} 引用的原文件不存在: {source}，请重新导入")
+    
+    stat = source.stat()
+    if verify and (stat.st_size != ref_data.get("size") or stat.st_mtime != ref_data.get("mtime")):
+        if file_sha256(source) != ref_data.get("sha256"):
+            raise PakRefError(f"{pak_path.stem} 引用的原文件内容已变化: {source}，请重新导入")
+        ref_data["size"] = stat.st_size
+        ref_data["mtime"] = stat.st_mtime
+        try:
+            with open(pak_path, 'w', encoding='utf-8') as f:
+                json.dump(ref_data, f, indent=4, ensure_ascii=False)
+        except OSError:
+            pass
+    return source
+
+
+def import_pak(source: Path, dest_dir: Path, mode: str):
+    """按导入方式把pak放进导入目录
+    
+    返回(导入目录中的条目, 实际方式)，目标已存在时方式为"exists"。
+    """
+    source = Path(source)
+    if mode == "reference":
+        dest = dest_dir / f"{source.stem}{PAK_REF_SUFFIX}"
+        if dest.exists() or (dest_dir / source.name).exists():
+            return (dest if dest.exists() else dest_dir / source.name), "exists"
+        write_pak_ref(source, dest)
+        return dest, "reference"
+    
+    dest = dest_dir / source.name
+    if dest.exists():
+        return dest, "exists"
+    
+    # 之前以引用方式导入过，改为实际文件
+    ref_file = dest_dir / f"{source.stem}{PAK_REF_SUFFIX}"
+    if ref_file.exists():
+        ref_file.unlink()
+    
+    if mode == "link":
+        return dest, link_or_copy(source, dest)
+    shutil.copy2(source, dest)
+    return dest, "copy"
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - LSPK(pak)读写模块
+纯Python实现BG3使用的LSPK v18格式，不依赖Divine.exe
+"""
+
+import zlib
+import shutil
+import struct
+from pathlib import Path
+
+# 可选依赖，有就用C实现
+try:
+    import lz4.block as _lz4_block
+except ImportError:
+    _lz4_block = None
+
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+LSPK_SIGNATURE = b"LSPK"
+LSPK_VERSION = 18
+
+# 文件头: 签名, 版本, 文件表偏移, 文件表大小, 标志, 优先级, MD5, 分卷数
+HEADER_STRUCT = struct.Struct("<4sIQIBB16sH")
+# 文件表项: 名称, 偏移低32位, 偏移高16位, 分卷号, 标志, 磁盘大小, 解压大小
+ENTRY_STRUCT = struct.Struct("<256sIHBBII")
+
+# 压缩方式(标志低4位)
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZ4 = 2
+COMPRESSION_ZSTD = 3
+
+# 包标志
+PACKAGE_FLAG_SOLID = 0x04
+
+# 文件数据按64字节对齐
+DATA_ALIGNMENT = 64
+
+# 不压缩时分块复制文件数据的块大小
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class LSPKError(Exception):
+    """pak格式错误或不支持"""
+    pass
+
+
+def lz4_block_decompress(data: bytes, uncompressed_size: int) -> bytes:
+    """LZ4块解压"""
+    if _lz4_block is not None:
+        return _lz4_block.decompress(data, uncompressed_size=uncompressed_size)
+    
+    dst = bytearray()
+    i = 0
+    n = len(data)
+    while i < n:
+        token = data[i]
+        i += 1
+        
+        # 字面量
+        literal_length = token >> 4
+        if literal_length == 15:
+            while True:
+                extra = data[i]
+                i += 1
+                literal_length += extra
+                if extra != 255:
+                    break
+        dst += data[i:i + literal_length]
+        i += literal_length
+        if i >= n:
+            break
+        
+        # 匹配
+        offset = data[i] | (data[i + 1] << 8)
+        i += 2
+        match_length = token & 0x0F
+        if match_length == 15:
+            while True:
+                extra = data[i]
+                i += 1
+                match_length += extra
+                if extra != 255:
+                    break
+        match_length += 4
+        
+        start = len(dst) - offset
+        if offset <= 0 or start < 0:
+            raise LSPKError("LZ4数据损坏")
+        if offset >= match_length:
+            dst += dst[start:start + match_length]
+        else:
+            # 重叠复制
+            pattern = bytes(dst[start:])
+            dst += (pattern * (match_length // offset + 1))[:match_length]
+    
+    if len(dst) != uncompressed_size:
+        raise LSPKError(f"LZ4解压大小不符: {len(dst)} != {uncompressed_size}")
+    return bytes(dst)
+
+
+def lz4_block_compress(data: bytes) -> bytes:
+    """LZ4块压缩，没有lz4库时输出只含字面量的合法块"""
+    if _lz4_block is not None:
+        return _lz4_block.compress(data, store_size=False)
+    
+    length = len(data)
+    if length < 15:
+        return bytes([length << 4]) + data
+    out = bytearray([0xF0])
+    remaining = length - 15
+    while remaining >= 255:
+        out.append(255)
+        remaining -= 255
+    out.append(remaining)
+    out += data
+    return bytes(out)
+
+
+def decompress(data: bytes, flags: int, uncompressed_size: int) -> bytes:
+    """按文件标志解压"""
+    method = flags & 0x0F
+    if method == COMPRESSION_NONE or uncompressed_size == 0:
+        return data
+    if method == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    if method == COMPRESSION_LZ4:
+        return lz4_block_decompress(data, uncompressed_size)
+    if method == COMPRESSION_ZSTD:
+        if _zstd is None:
+            raise LSPKError("该pak使用Zstd压缩，需要安装zstandard库")
+        return _zstd.ZstdDecompressor().decompress(data, max_output_size=uncompressed_size)
+    raise LSPKError(f"不支持的压缩方式: {method}")
+
+
+class PakEntry:
+    """pak中的一个文件"""
+    
+    __slots__ = ("name", "offset", "archive_part", "flags", "size_on_disk", "uncompressed_size")
+    
+    def __init__(self, name, offset, archive_part, flags, size_on_disk, uncompressed_size):
+        self.name = name
+        self.offset = offset
+        self.archive_part = archive_part
+        self.flags = flags
+        self.size_on_disk = size_on_disk
+        self.uncompressed_size = uncompressed_size
+    
+    @property
+    def size(self) -> int:
+        """解压后大小"""
+        return self.uncompressed_size if (self.flags & 0x0F) and self.uncompressed_size else self.size_on_disk
+
+
+class PakReader:
+    """读取LSPK v18文件表和文件内容"""
+    
+    def __init__(self, pak_file):
+        self.pak_file = Path(pak_file)
+        self.entries = {}
+        self._read_file_table()
+    
+    def _read_file_table(self):
+        with open(self.pak_file, 'rb') as f:
+            header = f.read(HEADER_STRUCT.size)
+            if len(header) < HEADER_STRUCT.size:
+                raise LSPKError(f"不是有效的pak文件: {self.pak_file.name}")
+            signature, version, file_list_offset, file_list_size, flags, priority, md5, num_parts = HEADER_STRUCT.unpack(header)
+            if signature != LSPK_SIGNATURE:
+                raise LSPKError(f"不是有效的pak文件: {self.pak_file.name}")
+            if version != LSPK_VERSION:
+                raise LSPKError(f"不支持的pak版本: {version}")
+            if flags & PACKAGE_FLAG_SOLID:
+                raise LSPKError("不支持solid压缩的pak")
+            
+            f.seek(file_list_offset)
+            num_files, compressed_size = struct.unpack("<II", f.read(8))
+            table = lz4_block_decompress(f.read(compressed_size), num_files * ENTRY_STRUCT.size)
+        
+        for i in range(num_files):
+            name, offset1, offset2, part, file_flags, size_on_disk, uncompressed_size = \
+                ENTRY_STRUCT.unpack_from(table, i * ENTRY_STRUCT.size)
+            name = name.split(b"\0", 1)[0].decode('utf-8').replace("\\", "/")
+            self.entries[name] = PakEntry(name, offset1 | (offset2 << 32), part, file_flags,
+                                          size_on_disk, uncompressed_size)
+    
+    def names(self) -> list:
+        """所有文件路径"""
+        return list(self.entries.keys())
+    
+    def _part_path(self, part: int) -> Path:
+        """分卷文件路径，例如Mod_1.pak"""
+        if part == 0:
+            return self.pak_file
+        return self.pak_file.with_name(f"{self.pak_file.stem}_{part}{self.pak_file.suffix}")
+    
+    def read_raw(self, entry: PakEntry) -> bytes:
+        """读取文件的原始(可能压缩的)数据"""
+        with open(self._part_path(entry.archive_part), 'rb') as f:
+            f.seek(entry.offset)
+            return f.read(entry.size_on_disk)
+    
+    def read(self, name: str) -> bytes:
+        """读取并解压文件"""
+        entry = self.entries.get(name)
+        if entry is None:
+            raise FileNotFoundError(name)
+        return decompress(self.read_raw(entry), entry.flags, entry.uncompressed_size)
+    
+    def extract_all(self, dest_dir: Path) -> int:
+        """解包全部文件，返回文件数"""
+        dest_dir = Path(dest_dir)
+        for name in self.entries:
+            target = dest_dir / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(self.read(name))
+        return len(self.entries)
+
+
+def write_pak(source_dir: Path, pak_file: Path, compress: bool = True, priority: int = 0):
+    """把目录打包为LSPK v18
+    
+    有lz4库时文件数据用LZ4压缩，否则不压缩存储(分块复制，不把整个文件读进内存)；
+    文件表总是LZ4块格式。
+    """
+    source_dir = Path(source_dir)
+    files = sorted(p for p in source_dir.rglob("*") if p.is_file())
+    use_lz4 = compress and _lz4_block is not None
+    
+    entries = []
+    with open(pak_file, 'wb') as f:
+        f.write(b"\0" * HEADER_STRUCT.size)
+        
+        for path in files:
+            # 对齐
+            position = f.tell()
+            padding = (-position) % DATA_ALIGNMENT
+            if padding:
+                f.write(b"\0" * padding)
+                position += padding
+            
+            if use_lz4 and path.stat().st_size:
+                data = path.read_bytes()
+                stored = lz4_block_compress(data)
+                flags = COMPRESSION_LZ4
+                uncompressed_size = len(data)
+                f.write(stored)
+                stored_size = len(stored)
+                # 读下一个文件前释放，内存中最多只有一个文件
+                del data, stored
+            else:
+                with open(path, 'rb') as source:
+                    shutil.copyfileobj(source, f, COPY_CHUNK_SIZE)
+                flags = COMPRESSION_NONE
+                uncompressed_size = 0
+                stored_size = f.tell() - position
+            
+            name = path.relative_to(source_dir).as_posix().encode('utf-8')
+            if len(name) >= 256:
+                raise LSPKError(f"文件路径过长: {name.decode('utf-8')}")
+            entries.append(ENTRY_STRUCT.pack(name, position & 0xFFFFFFFF, position >> 32, 0, flags,
+                                             stored_size, uncompressed_size))
+        
+        # 文件表
+        file_list_offset = f.tell()
+        table = lz4_block_compress(b"".join(entries))
+        f.write(struct.pack("<II", len(entries), len(table)))
+        f.write(table)
+        file_list_size = f.tell() - file_list_offset
+        
+        f.seek(0)
+        f.write(HEADER_STRUCT.pack(LSPK_SIGNATURE, LSPK_VERSION, file_list_offset, file_list_size,
+                                   0, priority, b"\0" * 16, 1))
+    return len(entries)
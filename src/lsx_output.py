@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - LSX输出模块
+CharacterCreationAppearanceVisuals的写入、分片和分片清单
+"""
+
+import re
+import json
+import hashlib
+from pathlib import Path
+
+# 外观配置文件头尾
+LSX_HEADER = '<?xml version="1.0" encoding="utf-8"?>\n<save>\n    <version major="4" minor="0" revision="9" build="331" />\n    <region id="CharacterCreationAppearanceVisuals">\n        <node id="root">\n            <children>'
+LSX_FOOTER = '\n            </children>\n        </node>\n    </region>\n</save>'
+
+# 分片方式: none(单文件), race(每个目标种族一个文件), count(按节点数切分)
+SHARD_MODES = ("none", "race", "count")
+
+# 输出格式变化时修改，使旧分片失效
+SHARD_FORMAT_VERSION = 1
+
+# 流式写入的缓冲区大小
+STREAM_BUFFER_SIZE = 1024 * 1024
+
+# 按内存预算计算分片大小时每个节点的估计字节数(实际约850字节)
+BUDGET_NODE_BYTES = 1024
+
+
+class _StreamFile:
+    """正在流式写入的一个外观配置文件"""
+    
+    def __init__(self, output_file: Path, buffer_size: int):
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        self.output_file = output_file
+        self.file = open(output_file, 'wb', buffering=buffer_size)
+        self.nodes = 0
+        self.bytes_written = 0
+        self._write(LSX_HEADER)
+    
+    def _write(self, text: str):
+        data = text.encode('utf-8')
+        self.file.write(data)
+        self.bytes_written += len(data)
+    
+    def add(self, node: str):
+        self._write('\n' + node)
+        self.nodes += 1
+    
+    def close(self):
+        self._write(LSX_FOOTER)
+        self.file.close()
+        return self.output_file, self.nodes, self.bytes_written
+
+
+def write_lsx_node_stream(output_files, nodes, max_nodes: int, buffer_size: int = STREAM_BUFFER_SIZE) -> list:
+    """流式写入外观节点，不在内存中保留节点列表
+    
+    output_files为依次使用的文件路径(可以是生成器)，每个文件最多max_nodes个节点，<=0时不切分。
+    每个文件是LSX_HEADER、每个节点前加换行、LSX_FOOTER；没有节点时不创建文件。
+    返回[(文件, 节点数, 字节数), ...]
+    """
+    output_files = iter(output_files)
+    written = []
+    current = None
+    try:
+        for node in nodes:
+            if current is None or (max_nodes > 0 and current.nodes >= max_nodes):
+                if current is not None:
+                    written.append(current.close())
+                    current = None
+                output_file = next(output_files, None)
+                if output_file is None:
+                    raise ValueError("输出文件数量不足")
+                current = _StreamFile(Path(output_file), buffer_size)
+            current.add(node)
+        if current is not None:
+            written.append(current.close())
+            current = None
+    finally:
+        if current is not None:
+            current.file.close()
+    return written
+
+
+def safe_shard_name(name: str) -> str:
+    """种族名转成可用作文件名的形式"""
+    return re.sub(r'[^A-Za-z0-9_\-]', '_', name) or "race"
+
+
+def shard_file_names(base_name: str, shard_key: str, parts: int) -> list:
+    """分片文件名，例如CharacterCreationAppearanceVisuals_MyRace.lsx，切分时加_partN"""
+    if parts <= 1:
+        return [f"{base_name}_{shard_key}.lsx"]
+    return [f"{base_name}_{shard_key}_part{i + 1}.lsx" for i in range(parts)]
+
+
+def shard_fingerprint(target_race_uuid, appearances: list, max_nodes: int, dedup_policy: str = "off") -> str:
+    """计算种族分片的输入指纹，输入不变时分片可以复用
+    
+    appearances为[(外观key, 选择的种族UUID, 内容哈希), ...]
+    """
+    hash_sha1 = hashlib.sha1()
+    hash_sha1.update(f"{SHARD_FORMAT_VERSION}|{target_race_uuid}|{max_nodes}|{dedup_policy}".encode('utf-8'))
+    for appearance_key, selected_race_uuid, content_hash in appearances:
+        hash_sha1.update(f"|{appearance_key}|{selected_race_uuid}|{content_hash}".encode('utf-8'))
+    return hash_sha1.hexdigest()
+
+
+def load_shard_manifest(manifest_file: Path) -> dict:
+    """读取分片清单 {分片key: {"fingerprint": ..., "files": [...]}}"""
+    try:
+        if manifest_file.exists():
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception:
+        pass
+    return {}
+
+
+def save_shard_manifest(manifest_file: Path, manifest: dict):
+    """保存分片清单"""
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
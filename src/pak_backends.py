@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - pak解包/打包后端
+统一列出、解包、打包接口，按设置中的pak_backend选择实现
+"""
+
+import shutil
+import logging
+from pathlib import Path
+
+from src.divine_runner import DivineRunner
+from src.lspk import PakReader, write_pak
+
+
+class PakBackend:
+    """pak后端基类"""
+    
+    name = ""
+    # 为True时多个pak应一起交给extract_many，不适合逐个解包
+    batch_extract = False
+    
+    def __init__(self, logger: logging.Logger = None):
+        self.logger = logger or logging.getLogger("bg3_cc")
+    
+    def check(self):
+        """检查后端是否可用，不可用时返回错误信息"""
+        return None
+    
+    def list_files(self, pak_file) -> list:
+        """列出pak中的文件路径"""
+        raise NotImplementedError
+    
+    def extract(self, pak_file, extract_dir: Path):
+        """解包到目录"""
+        raise NotImplementedError
+    
+    def extract_many(self, jobs: list, on_done=None) -> dict:
+        """解包多个pak，jobs为[(pak_file, extract_dir), ...]
+        
+        返回{pak_file: 错误信息或None}，on_done(pak_file, error)在每个pak完成后调用。
+        """
+        results = {}
+        for pak_file, extract_dir in jobs:
+            try:
+                if Path(extract_dir).exists():
+                    shutil.rmtree(extract_dir)
+                self.extract(pak_file, Path(extract_dir))
+                results[pak_file] = None
+            except Exception as e:
+                results[pak_file] = f"解包 {Path(pak_file).name} 失败: {e}"
+            if on_done:
+                on_done(pak_file, results[pak_file])
+        return results
+    
+    def pack(self, source_dir: Path, pak_file: Path):
+        """打包目录为pak"""
+        raise NotImplementedError
+
+
+class DivineBackend(PakBackend):
+    """调用Divine.exe子进程"""
+    
+    name = "divine"
+    
+    def __init__(self, divine_exe: Path, logger: logging.Logger = None, batch_extract: bool = True):
+        super().__init__(logger)
+        self.runner = DivineRunner(divine_exe, self.logger)
+        self.batch_extract = batch_extract
+    
+    def check(self):
+        if not self.runner.divine_exe.exists():
+            return f"找不到Divine.exe工具: {self.runner.divine_exe}"
+        return None
+    
+    def list_files(self, pak_file) -> list:
+        result = self.runner.run(["--game", "bg3", "--action", "list-package", "--source", pak_file],
+                                 f"list-package {Path(pak_file).name}")
+        self.runner._check(result, "列出文件")
+        files = []
+        for line in result.stdout.splitlines():
+            # 每行第一列是文件路径，后面是大小等信息
+            name = line.split("\t")[0].strip()
+            if name:
+                files.append(name.replace("\\", "/"))
+        return files
+    
+    def extract(self, pak_file, extract_dir: Path):
+        self.runner.extract_package(pak_file, extract_dir)
+    
+    def extract_many(self, jobs: list, on_done=None) -> dict:
+        if self.batch_extract:
+            # 合并成一次Divine.exe调用，失败时自动逐个解包
+            return self.runner.extract_packages(jobs, on_done=on_done)
+        return super().extract_many(jobs, on_done)
+    
+    def pack(self, source_dir: Path, pak_file: Path):
+        self.runner.create_package(source_dir, pak_file)
+
+
+class NativeBackend(PakBackend):
+    """进程内读写LSPK，不需要Divine.exe"""
+    
+    name = "native"
+    
+    def list_files(self, pak_file) -> list:
+        return PakReader(pak_file).names()
+    
+    def extract(self, pak_file, extract_dir: Path):
+        extract_dir = Path(extract_dir)
+        extract_dir.mkdir(parents=True, exist_ok=True)
+        if PakReader(pak_file).extract_all(extract_dir) == 0:
+            raise Exception(f"解包后目录为空或不存在: {extract_dir}")
+    
+    def pack(self, source_dir: Path, pak_file: Path):
+        write_pak(source_dir, pak_file)
+
+
+class FakeBackend(PakBackend):
+    """内存中的假后端，用于测试和基准
+    
+    paks保存{pak路径: {文件路径: bytes}}，pack时把目录内容存进内存，
+    并在磁盘上写一个占位文件，让后续流程能看到pak存在。
+    内容需要先用add_pak注册，所以不能在设置中选择，只在测试中直接创建。
+    """
+    
+    name = "fake"
+    
+    def __init__(self, logger: logging.Logger = None, paks: dict = None):
+        super().__init__(logger)
+        self.paks = {str(key): dict(value) for key, value in (paks or {}).items()}
+        self.calls = []
+    
+    def add_pak(self, pak_file, files: dict):
+        """注册一个内存pak"""
+        self.paks[str(pak_file)] = dict(files)
+    
+    def _get(self, pak_file) -> dict:
+        if str(pak_file) not in self.paks:
+            raise FileNotFoundError(f"内存中没有pak: {pak_file}")
+        return self.paks[str(pak_file)]
+    
+    def list_files(self, pak_file) -> list:
+        self.calls.append(("list", str(pak_file)))
+        return list(self._get(pak_file).keys())
+    
+    def extract(self, pak_file, extract_dir: Path):
+        self.calls.append(("extract", str(pak_file)))
+        files = self._get(pak_file)
+        extract_dir = Path(extract_dir)
+        for name, data in files.items():
+            target = extract_dir / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+    
+    def pack(self, source_dir: Path, pak_file: Path):
+        self.calls.append(("pack", str(pak_file)))
+        source_dir = Path(source_dir)
+        self.paks[str(pak_file)] = {
+            path.relative_to(source_dir).as_posix(): path.read_bytes()
+            for path in sorted(source_dir.rglob("*")) if path.is_file()
+        }
+        Path(pak_file).write_bytes(b"FAKE")
+
+
+# 可以在设置中选择的后端
+PAK_BACKENDS = {
+    DivineBackend.name: DivineBackend,
+    NativeBackend.name: NativeBackend,
+}
+
+
+def create_pak_backend(settings: dict, divine_exe: Path, logger: logging.Logger = None) -> PakBackend:
+    """根据设置创建后端，未知名称回退到divine"""
+    name = settings.get('pak_backend', DivineBackend.name)
+    if name not in PAK_BACKENDS:
+        (logger or logging.getLogger("bg3_cc")).warning("未知的pak后端 %s，使用divine", name)
+        name = DivineBackend.name
+    
+    if name == DivineBackend.name:
+        return DivineBackend(divine_exe, logger, settings.get('divine_batch_extract', True))
+    return PAK_BACKENDS[name](logger)
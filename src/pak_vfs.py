@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - pak只读虚拟文件系统
+直接按pak文件表列出和读取文件，解析时不用先解包到磁盘。
+PakPath提供解析代码用到的Path接口(rglob、read_text、relative_to等)
+"""
+
+import io
+import os
+import fnmatch
+import threading
+from collections import OrderedDict
+from pathlib import Path, PurePosixPath
+
+from src.lspk import PakReader, decompress
+from src.import_modes import resolve_pak_path
+
+# 默认解压缓存大小
+DEFAULT_CACHE_BYTES = 8 * 1024 * 1024
+# 最多同时保持打开的pak文件表
+MAX_MOUNTS = 64
+
+
+class PakFileSystem:
+    """一个pak的只读文件系统
+    
+    文件表在打开时读取，文件内容在读取时才解压，解压结果放进按字节数限制的LRU缓存。
+    """
+    
+    def __init__(self, pak_file, name: str = None, display_path=None, cache_bytes: int = DEFAULT_CACHE_BYTES):
+        self.pak_file = Path(pak_file)
+        self.name = name or self.pak_file.stem
+        self.display_path = Path(display_path) if display_path else self.pak_file
+        self.reader = PakReader(self.pak_file)
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cached_size = 0
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # 目录索引 {目录: {子项名: 是否目录}}
+        self._dirs = {"": {}}
+        for name in self.reader.entries:
+            parts = name.split("/")
+            for depth in range(len(parts)):
+                parent = "/".join(parts[:depth])
+                children = self._dirs.setdefault(parent, {})
+                is_dir = depth < len(parts) - 1
+                children[parts[depth]] = children.get(parts[depth], False) or is_dir
+                if is_dir:
+                    self._dirs.setdefault("/".join(parts[:depth + 1]), {})
+    
+    def root(self) -> "PakPath":
+        return PakPath(self, "")
+    
+    def signature(self) -> tuple:
+        """pak文件(含分卷)的大小和修改时间，内容变化时签名变化"""
+        signature = []
+        for part in sorted({entry.archive_part for entry in self.reader.entries.values()} | {0}):
+            stat = os.stat(self.reader._part_path(part))
+            signature.append((part, stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+    
+    def is_dir(self, inner: str) -> bool:
+        return inner in self._dirs
+    
+    def is_file(self, inner: str) -> bool:
+        return inner in self.reader.entries
+    
+    def children(self, inner: str) -> list:
+        """目录下的子项名，按名称排序"""
+        return sorted(self._dirs.get(inner, {}))
+    
+    def size(self, inner: str) -> int:
+        return self.reader.entries[inner].size
+    
+    def read(self, inner: str) -> bytes:
+        """读取并解压文件，最近读取的文件从缓存返回"""
+        with self._lock:
+            data = self._cache.get(inner)
+            if data is not None:
+                self._cache.move_to_end(inner)
+                self.cache_hits += 1
+                return data
+            self.cache_misses += 1
+        
+        entry = self.reader.entries.get(inner)
+        if entry is None:
+            raise FileNotFoundError(f"{self.display_path}/{inner}")
+        data = decompress(self.reader.read_raw(entry), entry.flags, entry.uncompressed_size)
+        
+        # 超过缓存大小的文件不缓存
+        if len(data) <= self.cache_bytes:
+            with self._lock:
+                if inner not in self._cache:
+                    self._cache[inner] = data
+                    self._cached_size += len(data)
+                while self._cached_size > self.cache_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_size -= len(evicted)
+        return data
+
+
+class PakPath:
+    """pak中的路径，接口和pathlib.Path的只读部分一致"""
+    
+    __slots__ = ("fs", "inner")
+    
+    def __init__(self, fs: PakFileSystem, inner: str):
+        self.fs = fs
+        self.inner = inner.strip("/")
+    
+    def __str__(self):
+        if not self.inner:
+            return str(self.fs.display_path)
+        return str(self.fs.display_path / self.inner)
+    
+    def __repr__(self):
+        return f"PakPath({str(self)!r})"
+    
+    def __eq__(self, other):
+        return isinstance(other, PakPath) and other.fs is self.fs and other.inner == self.inner
+    
+    def __hash__(self):
+        return hash((id(self.fs), self.inner))
+    
+    def __truediv__(self, name):
+        return PakPath(self.fs, f"{self.inner}/{name}" if self.inner else str(name))
+    
+    @property
+    def name(self) -> str:
+        # 根目录用pak名，和解包文件夹名一致
+        if not self.inner:
+            return self.fs.name
+        return self.inner.rsplit("/", 1)[-1]
+    
+    @property
+    def stem(self) -> str:
+        return PurePosixPath(self.name).stem
+    
+    @property
+    def suffix(self) -> str:
+        return PurePosixPath(self.name).suffix
+    
+    @property
+    def parent(self) -> "PakPath":
+        if "/" not in self.inner:
+            return PakPath(self.fs, "")
+        return PakPath(self.fs, self.inner.rsplit("/", 1)[0])
+    
+    def relative_to(self, other: "PakPath") -> PurePosixPath:
+        if not other.inner:
+            return PurePosixPath(self.inner)
+        if self.inner != other.inner and not self.inner.startswith(other.inner + "/"):
+            raise ValueError(f"{self} 不在 {other} 中")
+        return PurePosixPath(self.inner).relative_to(other.inner)
+    
+    def exists(self) -> bool:
+        return self.fs.is_dir(self.inner) or self.fs.is_file(self.inner)
+    
+    def is_dir(self) -> bool:
+        return self.fs.is_dir(self.inner)
+    
+    def is_file(self) -> bool:
+        return self.fs.is_file(self.inner)
+    
+    def iterdir(self):
+        if not self.fs.is_dir(self.inner):
+            raise NotADirectoryError(str(self))
+        for name in self.fs.children(self.inner):
+            yield self / name
+    
+    def glob(self, pattern: str):
+        """匹配直接子项，大小写规则和所在系统的Path.glob一致"""
+        for child in self.iterdir():
+            if fnmatch.fnmatch(child.name, pattern):
+                yield child
+    
+    def rglob(self, pattern: str):
+        """递归匹配所有子项"""
+        for child in self.iterdir():
+            if fnmatch.fnmatch(child.name, pattern):
+                yield child
+            if child.is_dir():
+                yield from child.rglob(pattern)
+    
+    def stat_size(self) -> int:
+        return self.fs.size(self.inner)
+    
+    def read_bytes(self) -> bytes:
+        return self.fs.read(self.inner)
+    
+    def read_text(self, encoding: str = None, errors: str = None) -> str:
+        return self.read_bytes().decode(encoding or "utf-8", errors or "strict")
+    
+    def open(self, mode: str = "r", encoding: str = None, errors: str = None, newline: str = None):
+        if any(flag in mode for flag in "wax+"):
+            raise PermissionError(f"pak只读: {self}")
+        stream = io.BytesIO(self.read_bytes())
+        if "b" in mode:
+            return stream
+        return io.TextIOWrapper(stream, encoding=encoding or "utf-8", errors=errors, newline=newline)
+
+
+class PakMounts:
+    """打开的pak文件系统，pak未变化时复用文件表和解压缓存"""
+    
+    def __init__(self, cache_bytes: int = DEFAULT_CACHE_BYTES):
+        self.cache_bytes = cache_bytes
+        self._mounts = OrderedDict()  # {条目路径: (签名, PakFileSystem)}
+        self._lock = threading.Lock()
+    
+    def root(self, pak_entry) -> PakPath:
+        """导入目录中的pak或.pakref对应的根路径，pak无法读取时抛出异常"""
+        pak_entry = Path(pak_entry)
+        pak_file = resolve_pak_path(pak_entry)
+        stat = os.stat(pak_file)
+        key = str(pak_entry)
+        stat_key = (str(pak_file), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            mounted = self._mounts.get(key)
+            if mounted is not None and mounted[0] == stat_key:
+                self._mounts.move_to_end(key)
+                return mounted[1].root()
+        
+        fs = PakFileSystem(pak_file, pak_entry.stem, pak_entry, self.cache_bytes)
+        with self._lock:
+            self._mounts[key] = (stat_key, fs)
+            self._mounts.move_to_end(key)
+            while len(self._mounts) > MAX_MOUNTS:
+                self._mounts.popitem(last=False)
+        return fs.root()
+    
+    def discard(self, pak_entry):
+        with self._lock:
+            self._mounts.pop(str(Path(pak_entry)), None)
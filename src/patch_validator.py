@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - 补丁校验
+打包前用expat流式读取生成的外观配置，检查XML格式、节点UUID唯一、RaceUUID指向种族MOD、
+IconIdOverride格式，问题带文件名和行号报告，不用进游戏才发现
+"""
+
+import re
+import logging
+from pathlib import Path
+from xml.parsers import expat
+
+APPEARANCE_NODE_ID = "CharacterCreationAppearanceVisual"
+
+# 默认最多报告的问题数，达到后停止校验
+DEFAULT_MAX_ERRORS = 20
+
+READ_CHUNK_SIZE = 64 * 1024
+
+_ICON_SUFFIX_PATTERN = re.compile(r"^[a-f0-9\-]{36}$", re.IGNORECASE)
+
+
+class _StopValidation(Exception):
+    pass
+
+
+class PatchValidator:
+    """校验外观配置文件，多个文件共用一个UUID集合，问题记录为"文件:行:列: 问题"
+    
+    UUID按16字节存放，内存只和节点数有关，不保存节点内容。
+    """
+    
+    def __init__(self, race_uuids=None, max_errors: int = DEFAULT_MAX_ERRORS, logger: logging.Logger = None):
+        self.race_uuids = {race_uuid.lower() for race_uuid in race_uuids} if race_uuids is not None else None
+        self.max_errors = max(1, max_errors)
+        self.logger = logger or logging.getLogger("bg3_cc")
+        self.problems = []
+        self.nodes_checked = 0
+        self._seen_uuids = set()
+    
+    def _report(self, location: str, message: str):
+        self.problems.append(f"{location}: {message}")
+        if len(self.problems) >= self.max_errors:
+            raise _StopValidation()
+    
+    def validate_file(self, lsx_file: Path) -> bool:
+        """校验一个文件，返回是否还可以继续(没有达到问题上限)"""
+        lsx_file = Path(lsx_file)
+        parser = expat.ParserCreate("utf-8")
+        # 当前外观节点 {'line': 行号, 'column': 列号, 'attributes': {id: (value, 行号)}}，不在外观节点中时为None
+        state = {'node': None, 'depth': 0, 'node_depth': 0}
+        
+        def location(line, column=None):
+            return f"{lsx_file.name}:{line}" + (f":{column + 1}" if column is not None else "")
+        
+        def start_element(name, attributes):
+            state['depth'] += 1
+            if name == "node" and attributes.get("id") == APPEARANCE_NODE_ID:
+                if state['node'] is not None:
+                    self._report(location(parser.CurrentLineNumber, parser.CurrentColumnNumber), "外观节点嵌套")
+                state['node'] = {'line': parser.CurrentLineNumber, 'column': parser.CurrentColumnNumber, 'attributes': {}}
+                state['node_depth'] = state['depth']
+            elif name == "attribute" and state['node'] is not None and state['depth'] == state['node_depth'] + 1:
+                attribute_id = attributes.get("id")
+                if attribute_id:
+                    state['node']['attributes'][attribute_id] = (attributes.get("value"), parser.CurrentLineNumber)
+        
+        def end_element(name):
+            if state['node'] is not None and state['depth'] == state['node_depth']:
+                self._check_node(state['node'], location)
+                state['node'] = None
+            state['depth'] -= 1
+        
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        
+        try:
+            with open(lsx_file, 'rb') as f:
+                for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+                    parser.Parse(chunk, False)
+                parser.Parse(b"", True)
+        except expat.ExpatError as e:
+            self.problems.append(f"{location(e.lineno, e.offset)}: XML格式错误: {expat.ErrorString(e.code)}")
+            return len(self.problems) < self.max_errors
+        except _StopValidation:
+            return False
+        return True
+    
+    def validate_files(self, lsx_files: list) -> list:
+        """校验多个文件，返回问题列表"""
+        for lsx_file in lsx_files:
+            if not self.validate_file(lsx_file):
+                break
+        return self.problems
+    
+    def _check_node(self, node: dict, location):
+        self.nodes_checked += 1
+        attributes = node['attributes']
+        node_location = lambda: location(node['line'], node['column'])
+        
+        def value_of(attribute_id):
+            return attributes.get(attribute_id, (None, node['line']))
+        
+        # UUID唯一
+        node_uuid, line = value_of("UUID")
+        if not node_uuid:
+            self._report(node_location(), "外观节点缺少UUID")
+        else:
+            try:
+                key = bytes.fromhex(node_uuid.replace("-", ""))
+                if len(key) != 16:
+                    raise ValueError(node_uuid)
+            except ValueError:
+                self._report(location(line), f"UUID格式错误: {node_uuid}")
+            else:
+                if key in self._seen_uuids:
+                    self._report(location(line), f"UUID重复: {node_uuid}")
+                else:
+                    self._seen_uuids.add(key)
+        
+        # RaceUUID指向种族MOD
+        race_uuid, line = value_of("RaceUUID")
+        if not race_uuid:
+            self._report(node_location(), "外观节点缺少RaceUUID")
+        elif self.race_uuids is not None and race_uuid.lower() not in self.race_uuids:
+            self._report(location(line), f"RaceUUID不是所选种族MOD中的种族: {race_uuid}")
+        
+        # IconIdOverride: {BodyType}_{SlotName}_{UUID}，和生成时的修复规则一致
+        slot_name, _ = value_of("SlotName")
+        visual_resource, _ = value_of("VisualResource")
+        if slot_name and visual_resource:
+            body_type = value_of("BodyType")[0] or "1"
+            icon_id, line = value_of("IconIdOverride")
+            prefix = f"{body_type}_{slot_name}_"
+            if not icon_id:
+                self._report(node_location(), f"缺少IconIdOverride，应为 {prefix}{visual_resource}")
+            elif not (icon_id.lower().startswith(prefix.lower()) and _ICON_SUFFIX_PATTERN.match(icon_id[len(prefix):])):
+                self._report(location(line), f"IconIdOverride格式错误: {icon_id}，应为 {prefix}{visual_resource}")
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - 流水线和解析缓存
+导入、解包、解析、生成各阶段通过有界队列串联，前一个MOD解包完就可以开始解析，
+解析结果按文件夹内容签名缓存，导入、刷新和生成之间不重复解析
+"""
+
+import os
+import queue
+import logging
+import threading
+from pathlib import Path
+
+from src.pak_vfs import PakPath
+
+# 队列结束标记
+_DONE = object()
+
+
+class StagePipeline:
+    """由有界队列串联的多阶段流水线
+    
+    stages为[(阶段名, 函数, 线程数), ...]，线程数可省略(默认1)。每个阶段在自己的线程中运行，
+    上游处理完一项就交给下游，总耗时接近最慢的阶段而不是各阶段之和。
+    函数返回值交给下一阶段；抛出异常时该项不再往下传，异常记录在errors中。
+    最后一个阶段的结果按输入顺序交给on_result(序号, 结果)，在调用run的线程中执行。
+    """
+    
+    def __init__(self, stages: list, queue_size: int = 4, logger: logging.Logger = None):
+        self.stages = [(stage[0], stage[1], stage[2] if len(stage) > 2 else 1) for stage in stages]
+        self.queue_size = max(1, queue_size)
+        self.logger = logger or logging.getLogger("bg3_cc")
+        self.errors = {}  # {序号: 异常}
+    
+    def run(self, items=None, producer=None, on_result=None) -> list:
+        """运行流水线，返回按输入顺序排列的结果(失败项为None)
+        
+        输入可以是items列表，也可以是producer(emit)：在单独线程中调用emit(item)逐个提交，
+        适合解包回调这类边完成边产出的场景。
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self.errors = {}
+        threads = []
+        
+        def feed():
+            counter = [0]
+            
+            def emit(item):
+                queues[0].put((counter[0], item))
+                counter[0] += 1
+            try:
+                if producer is not None:
+                    producer(emit)
+                else:
+                    for item in items or []:
+                        emit(item)
+            except Exception as e:
+                self.logger.exception("流水线输入失败")
+                self.errors[-1] = e
+            finally:
+                queues[0].put(_DONE)
+        
+        def work(stage_index: int, name: str, func, remaining: list, lock: threading.Lock):
+            inbox, outbox = queues[stage_index], queues[stage_index + 1]
+            while True:
+                task = inbox.get()
+                if task is _DONE:
+                    # 让同阶段其他线程也能收到结束标记，最后一个线程通知下游
+                    inbox.put(_DONE)
+                    with lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last:
+                        outbox.put(_DONE)
+                    return
+                index, item = task
+                if index in self.errors:
+                    # 上游已失败，直接往下传
+                    outbox.put(task)
+                    continue
+                try:
+                    outbox.put((index, func(item)))
+                except Exception as e:
+                    self.logger.warning("流水线阶段 %s 处理第 %d 项失败: %s", name, index, e)
+                    self.errors[index] = e
+                    outbox.put((index, e))
+        
+        threads.append(threading.Thread(target=feed, name="Pipeline-input", daemon=True))
+        for stage_index, (name, func, workers) in enumerate(self.stages):
+            remaining = [workers]
+            lock = threading.Lock()
+            for worker in range(workers):
+                threads.append(threading.Thread(target=work, args=(stage_index, name, func, remaining, lock),
+                                                name=f"Pipeline-{name}-{worker}", daemon=True))
+        for thread in threads:
+            thread.start()
+        
+        # 按序号重排，保证结果和输入顺序一致
+        results = {}
+        buffered = {}
+        next_index = 0
+        outbox = queues[-1]
+        while True:
+            task = outbox.get()
+            if task is _DONE:
+                break
+            index, result = task
+            buffered[index] = None if index in self.errors else result
+            while next_index in buffered:
+                result = buffered.pop(next_index)
+                results[next_index] = result
+                if on_result is not None and next_index not in self.errors:
+                    on_result(next_index, result)
+                next_index += 1
+        
+        for thread in threads:
+            thread.join()
+        return [results.get(i) for i in range(len(results))]
+
+
+def folder_signature(folder: Path) -> tuple:
+    """文件夹中所有lsx文件的(相对路径, 大小, 修改时间)，内容变化时签名变化
+    
+    直接读取的pak(PakPath)用pak文件本身的大小和修改时间。
+    """
+    if isinstance(folder, PakPath):
+        return folder.fs.signature()
+    folder = Path(folder)
+    signature = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".lsx"):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                signature.append((os.path.relpath(path, folder), stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+class ParseCache:
+    """按文件夹签名缓存解析结果，线程安全"""
+    
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def get_or_scan(self, kind: str, folder: Path, scan_func):
+        """签名没变时返回缓存结果，否则调用scan_func(folder)并缓存"""
+        key = (kind, str(folder))
+        signature = folder_signature(folder)
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        result = scan_func(folder)
+        with self._lock:
+            self._entries[key] = (signature, result)
+        return result
+    
+    def discard(self, folder: Path):
+        """删除文件夹的缓存"""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == str(folder)]:
+                del self._entries[key]
+    
+    def results(self) -> list:
+        """所有缓存的解析结果"""
+        with self._lock:
+            return [result for _, result in self._entries.values()]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
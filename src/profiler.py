@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - 性能统计模块
+记录每个阶段的耗时、CPU时间、读写字节数、扫描文件数和输出节点数
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import pstats
+import cProfile
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+# 阶段顺序
+STAGES = ["import", "extract", "parse", "generate", "pack", "zip"]
+
+LOGGER_NAME = "bg3_cc"
+
+# 运行历史保留条数，用于估算生成耗时
+HISTORY_LIMIT = 50
+
+
+def setup_build_logger(log_dir: Path, max_bytes: int = 1024 * 1024, backup_count: int = 5) -> logging.Logger:
+    """创建滚动日志，写到log_dir/build.log"""
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(logging.INFO)
+    
+    # 避免重复添加handler
+    if not logger.handlers:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(log_dir / "build.log", maxBytes=max_bytes,
+                                      backupCount=backup_count, encoding='utf-8')
+        handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(threadName)s: %(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+
+def _cpu_seconds() -> float:
+    """本进程加子进程的CPU时间(子进程部分仅POSIX有效)"""
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+
+def peak_memory_bytes():
+    """进程启动以来的内存峰值(字节)，无法获取时返回None"""
+    # Linux下ru_maxrss会带上exec之前父进程的峰值，优先用本进程的VmHWM
+    try:
+        with open("/proc/self/status", 'r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux单位为KB，macOS为字节
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+        
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except Exception:
+        pass
+    return None
+
+
+class StageStats:
+    """单个阶段的统计"""
+    
+    COUNTERS = ("bytes_read", "bytes_written", "files_scanned", "nodes_emitted")
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.calls = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files_scanned = 0
+        self.nodes_emitted = 0
+    
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'wall_time': round(self.wall_time, 4),
+            'cpu_time': round(self.cpu_time, 4),
+            'calls': self.calls,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'files_scanned': self.files_scanned,
+            'nodes_emitted': self.nodes_emitted,
+        }
+
+
+class BuildProfiler:
+    """一次导入或生成任务的性能统计
+    
+    阶段可以多次进入(例如每个pak各解包一次)，时间和计数会累加。
+    没有正在进行的任务时，count()不做任何事。
+    """
+    
+    def __init__(self, logger: logging.Logger, log_dir: Path):
+        self.logger = logger
+        self.log_dir = log_dir
+        self.stats_file = log_dir / "last_run_stats.json"
+        self.history_file = log_dir / "run_history.jsonl"
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._profile = None
+        self._thread_profiles = []
+        self._started = None
+        self._started_cpu = 0.0
+        self.kind = None
+        self.active = False
+    
+    def begin(self, kind: str, enable_cprofile: bool = False):
+        """开始一次任务"""
+        with self._lock:
+            self._stages = {}
+            self.kind = kind
+            self.active = True
+            self._started = time.perf_counter()
+            self._started_cpu = _cpu_seconds()
+        self.logger.info("===== %s 开始 =====", kind)
+        
+        if enable_cprofile:
+            self._thread_profiles = []
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+            if sys.version_info < (3, 12):
+                # 3.12之前cProfile只统计启用它的线程，之后启动的工作线程各用一个，结束时合并
+                threading.setprofile(self._profile_new_thread)
+    
+    def _profile_new_thread(self, frame, event, arg):
+        """新线程中第一次调用时启用该线程的cProfile，之后由cProfile接管"""
+        profile = cProfile.Profile()
+        with self._lock:
+            self._thread_profiles.append(profile)
+        profile.enable()
+    
+    def _dump_profile(self):
+        """停止cProfile，合并所有线程的结果写到日志目录，返回(文件, 统计的线程数)"""
+        threading.setprofile(None)
+        self._profile.disable()
+        with self._lock:
+            profiles = [self._profile] + self._thread_profiles
+            self._thread_profiles = []
+        self._profile = None
+        
+        profile_file = self.log_dir / f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof"
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            # 工作线程已经结束，线程池中还在的线程到这里也不再运行任务
+            stats.add(profile)
+        stats.dump_stats(str(profile_file))
+        # 3.12起一个cProfile统计所有线程
+        return profile_file, len(profiles) if sys.version_info < (3, 12) else None
+    
+    @contextmanager
+    def stage(self, name: str):
+        """计时一个阶段"""
+        stats = self._get_stage(name)
+        wall_start = time.perf_counter()
+        cpu_start = _cpu_seconds()
+        try:
+            yield stats
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = _cpu_seconds() - cpu_start
+            with self._lock:
+                stats.wall_time += wall
+                stats.cpu_time += cpu
+                stats.calls += 1
+    
+    def count(self, stage: str, **counters):
+        """累加阶段计数，线程安全"""
+        if not self.active:
+            return
+        stats = self._get_stage(stage)
+        with self._lock:
+            for key, value in counters.items():
+                setattr(stats, key, getattr(stats, key) + value)
+    
+    def _get_stage(self, name: str) -> StageStats:
+        with self._lock:
+            if name not in self._stages:
+                self._stages[name] = StageStats(name)
+            return self._stages[name]
+    
+    def finish(self, success: bool = True) -> dict:
+        """结束任务，写日志和统计文件，返回统计结果"""
+        profile_file = None
+        profile_threads = None
+        if self._profile is not None:
+            try:
+                profile_file, profile_threads = self._dump_profile()
+            except Exception as e:
+                self.logger.warning("写入cProfile结果失败: %s", e)
+                profile_file = None
+                self._profile = None
+        
+        with self._lock:
+            self.active = False
+            ordered = sorted(self._stages.values(),
+                             key=lambda s: STAGES.index(s.name) if s.name in STAGES else len(STAGES))
+            result = {
+                'kind': self.kind,
+                'success': success,
+                'finished_at': datetime.now().isoformat(timespec='seconds'),
+                'wall_time': round(time.perf_counter() - self._started, 4),
+                'cpu_time': round(_cpu_seconds() - self._started_cpu, 4),
+                'peak_memory': peak_memory_bytes(),
+                'profile_file': str(profile_file) if profile_file else None,
+                'profile_threads': profile_threads,
+                'stages': [s.to_dict() for s in ordered],
+            }
+        
+        for line in format_stats(result):
+            self.logger.info(line)
+        self.logger.info("===== %s %s =====", self.kind, "完成" if success else "失败")
+        
+        try:
+            with open(self.stats_file, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=4, ensure_ascii=False)
+        except Exception as e:
+            self.logger.warning("写入统计文件失败: %s", e)
+        self._append_history(result)
+        return result
+    
+    def _append_history(self, result: dict):
+        """追加到运行历史，只保留最近HISTORY_LIMIT条"""
+        try:
+            lines = []
+            if self.history_file.exists():
+                lines = self.history_file.read_text(encoding='utf-8').splitlines()
+            lines.append(json.dumps(result, ensure_ascii=False))
+            self.history_file.write_text("\n".join(lines[-HISTORY_LIMIT:]) + "\n", encoding='utf-8')
+        except Exception as e:
+            self.logger.warning("写入运行历史失败: %s", e)
+    
+    def load_history(self, kind: str = None) -> list:
+        """读取运行历史，kind不为空时只返回该类任务"""
+        history = []
+        try:
+            if self.history_file.exists():
+                for line in self.history_file.read_text(encoding='utf-8').splitlines():
+                    if line.strip():
+                        result = json.loads(line)
+                        if kind is None or result.get('kind') == kind:
+                            history.append(result)
+        except Exception as e:
+            self.logger.warning("读取运行历史失败: %s", e)
+        return history
+    
+    def load_last_stats(self):
+        """读取上次任务的统计"""
+        try:
+            if self.stats_file.exists():
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            self.logger.warning("读取统计文件失败: %s", e)
+        return None
+
+
+def _format_bytes(size: int) -> str:
+    """字节数转可读格式"""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def format_stats(result: dict) -> list:
+    """统计结果转成文本行，用于日志和统计面板"""
+    lines = [
+        f"{result.get('kind')}  {result.get('finished_at')}  "
+        f"wall={result.get('wall_time', 0):.2f}s cpu={result.get('cpu_time', 0):.2f}s"
+        + (f" peak={_format_bytes(result['peak_memory'])}" if result.get('peak_memory') else "")
+    ]
+    for stage in result.get('stages', []):
+        lines.append(
+            f"{stage['name']:<9} wall={stage['wall_time']:>8.2f}s cpu={stage['cpu_time']:>8.2f}s "
+            f"read={_format_bytes(stage['bytes_read']):>8} write={_format_bytes(stage['bytes_written']):>8} "
+            f"files={stage['files_scanned']:>6} nodes={stage['nodes_emitted']:>8}"
+        )
+    if result.get('profile_file'):
+        threads = result.get('profile_threads')
+        lines.append(f"cProfile: {result['profile_file']}" + (f" ({threads} 个线程)" if threads else ""))
+    return lines
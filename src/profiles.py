@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - 配置(加载顺序方案)
+default使用原来的Data/Sourcemod、Data/Panagway、Data/Output，
+其他配置放在Data/Profiles/<名称>下，文件通过内容寻址存储共享
+"""
+
+import re
+import shutil
+from pathlib import Path
+
+DEFAULT_PROFILE = "default"
+
+# 配置名只允许字母数字、下划线、横线和中文
+_PROFILE_NAME_PATTERN = re.compile(r'^[\w\-一-鿿]{1,64}$')
+
+
+def is_valid_profile_name(name: str) -> bool:
+    return bool(name) and bool(_PROFILE_NAME_PATTERN.match(name))
+
+
+def profile_root(data_dir: Path, name: str) -> Path:
+    """配置根目录"""
+    if name == DEFAULT_PROFILE:
+        return Path(data_dir)
+    return Path(data_dir) / "Profiles" / name
+
+
+def profile_dirs(data_dir: Path, name: str) -> dict:
+    """配置的种族、外观、输出目录"""
+    root = profile_root(data_dir, name)
+    return {
+        'sourcemod': root / "Sourcemod",
+        'panagway': root / "Panagway",
+        'output': root / "Output",
+    }
+
+
+def list_profiles(data_dir: Path) -> list:
+    """所有配置名，default在最前"""
+    profiles_dir = Path(data_dir) / "Profiles"
+    names = []
+    if profiles_dir.exists():
+        names = sorted(path.name for path in profiles_dir.iterdir() if path.is_dir())
+    return [DEFAULT_PROFILE] + [name for name in names if name != DEFAULT_PROFILE]
+
+
+def create_profile(data_dir: Path, name: str, blob_store, clone_from: str = None) -> dict:
+    """创建配置，clone_from不为空时用硬链接复制该配置的种族和外观目录(不复制输出)"""
+    if not is_valid_profile_name(name) or name == DEFAULT_PROFILE:
+        raise ValueError(f"无效的配置名: {name}")
+    if profile_root(data_dir, name).exists():
+        raise FileExistsError(f"配置已存在: {name}")
+    
+    dirs = profile_dirs(data_dir, name)
+    if clone_from:
+        source_dirs = profile_dirs(data_dir, clone_from)
+        for key in ('sourcemod', 'panagway'):
+            if source_dirs[key].exists():
+                blob_store.link_tree(source_dirs[key], dirs[key])
+    for path in dirs.values():
+        path.mkdir(parents=True, exist_ok=True)
+    return dirs
+
+
+def delete_profile(data_dir: Path, name: str, blob_store):
+    """删除配置并清理不再被引用的存储文件，返回(删除的存储文件数, 释放的字节数)"""
+    if name == DEFAULT_PROFILE:
+        raise ValueError("不能删除默认配置")
+    root = profile_root(data_dir, name)
+    if root.exists():
+        shutil.rmtree(root)
+    return blob_store.gc()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - 设置模块
+读取Data/settings.json中的可选配置，缺省项使用默认值
+"""
+
+import json
+from pathlib import Path
+
+# 默认设置
+DEFAULT_SETTINGS = {
+    # 生成时启用cProfile并把结果写到Data/Logs
+    "enable_cprofile": False,
+    # 日志文件大小上限(字节)和保留份数
+    "log_max_bytes": 1024 * 1024,
+    "log_backup_count": 5,
+    # pak解包/打包后端: divine(Divine.exe), native(进程内)
+    "pak_backend": "divine",
+    # pak导入方式: copy(复制), link(reflink/硬链接，不支持时复制), reference(只记录原路径和哈希)
+    "import_mode": "link",
+    # 导入时把多个pak合并成一次Divine.exe调用
+    "divine_batch_extract": True,
+    # 外观配置分片: none(单文件), race(每个目标种族一个文件，输入不变时复用), count(按节点数切分)
+    "output_shard_mode": "none",
+    # 单个分片最多节点数，0表示不限制
+    "output_shard_max_nodes": 50000,
+    # 并发写分片的线程数
+    "output_shard_workers": 4,
+    # 相同外观(VisualResource+SlotName+BodyType+BodyShape)去重: off, first(先出现的优先), last(后出现的优先), most_complete(属性最多的优先)
+    "appearance_dedup_policy": "first",
+    # 监视Sourcemod/Panagway，有变化时只更新变化的MOD(Linux用inotify，其他系统轮询)
+    "watch_mod_folders": True,
+    # 轮询间隔(秒)
+    "watch_poll_interval": 0.25,
+    # 导入/解析流水线: 阶段间队列长度和解析线程数
+    "pipeline_queue_size": 4,
+    "pipeline_workers": 2,
+    # 生成前预估超过这些值时提示确认，0表示不检查
+    "plan_warn_nodes": 500000,
+    "plan_warn_mb": 200,
+    # 当前配置，default使用Data下原来的目录
+    "active_profile": "default",
+    # 解包文件放进Data/Store按内容共享(硬链接)，多个配置不重复占用空间
+    "use_blob_store": True,
+    # 解析方式: extract(解包到文件夹后解析), archive(直接读取pak，不解包；只支持LSPK v18)
+    "parse_mode": "extract",
+    # archive方式下每个pak的解压缓存大小(MB)
+    "vfs_cache_mb": 8,
+    # 打包前校验生成的外观配置(XML格式、UUID唯一、RaceUUID、IconIdOverride)，最多报告的问题数
+    "validate_output": True,
+    "validate_max_errors": 20,
+    # 内存预算(MB)，大于0时解析出的外观内容和节点写到临时文件，生成的节点直接写入文件，0表示不限制
+    "memory_budget_mb": 0,
+}
+
+
+def load_settings(settings_file: Path) -> dict:
+    """加载设置，文件不存在或损坏时返回默认值"""
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        if settings_file.exists():
+            with open(settings_file, 'r', encoding='utf-8') as f:
+                user_settings = json.load(f)
+            if isinstance(user_settings, dict):
+                settings.update(user_settings)
+    except Exception as e:
+        print(f"加载设置文件失败: {e}")
+    return settings
+
+
+def save_settings(settings_file: Path, settings: dict):
+    """保存设置，只写入和默认值不同的项，以后修改的默认值对已有用户也生效"""
+    changed = {key: value for key, value in settings.items()
+               if key not in DEFAULT_SETTINGS or DEFAULT_SETTINGS[key] != value}
+    settings_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(settings_file, 'w', encoding='utf-8') as f:
+        json.dump(changed, f, indent=4, ensure_ascii=False)
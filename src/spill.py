@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - 内存预算模式的临时文件
+解析出的外观文件内容和提取出的外观节点写到临时文件，生成时按顺序读回，
+内存中只保留文件路径和节点偏移
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+from array import array
+from pathlib import Path
+
+
+def spill_text(spill_dir: Path, text: str):
+    """把文本按内容哈希写到spill_dir，返回(文件路径, SHA1)，相同内容只写一次
+    
+    多个线程可以同时写入相同内容，各自写独立的临时文件再改名。
+    """
+    data = text.encode('utf-8')
+    digest = hashlib.sha1(data).hexdigest()
+    spill_file = Path(spill_dir) / f"{digest}.lsx"
+    if not spill_file.exists():
+        spill_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=spill_file.parent)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, spill_file)
+        except OSError:
+            # 其他线程已经写好了相同内容(Windows下目标正被读取时不能替换)
+            if not spill_file.exists():
+                raise
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+    return spill_file, digest
+
+
+class NodeSpill:
+    """外观节点临时文件，每行一个节点，按写入顺序编号
+    
+    内存中每个节点只占一个8字节偏移。读取时每次打开新的文件句柄，可以在多个线程中同时遍历。
+    """
+    
+    def __init__(self, spill_dir: Path):
+        Path(spill_dir).mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=".nodes", dir=spill_dir)
+        self.path = Path(path)
+        self._file = os.fdopen(fd, 'wb')
+        self._offsets = array('q')
+    
+    def __len__(self):
+        return len(self._offsets)
+    
+    def append(self, node: dict) -> int:
+        """追加节点，返回编号"""
+        self._offsets.append(self._file.tell())
+        self._file.write(json.dumps(node, ensure_ascii=False).encode('utf-8') + b"\n")
+        return len(self._offsets) - 1
+    
+    def finish(self):
+        """写入完成，之后才能读取"""
+        self._file.flush()
+    
+    def iter_nodes(self, indices=None):
+        """按编号顺序读取节点，indices为空时读取全部"""
+        if indices is None:
+            indices = range(len(self._offsets))
+        with open(self.path, 'rb') as f:
+            position = 0
+            for index in indices:
+                offset = self._offsets[index]
+                if offset != position:
+                    f.seek(offset)
+                line = f.readline()
+                position = offset + len(line)
+                yield json.loads(line)
+    
+    def close(self):
+        """关闭并删除临时文件"""
+        self._file.close()
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+class SpilledNodes:
+    """NodeSpill中按顺序选出的节点，可以多次遍历，用法和节点列表相同"""
+    
+    def __init__(self, spill: NodeSpill, indices: array):
+        self.spill = spill
+        self.indices = indices
+    
+    def __len__(self):
+        return len(self.indices)
+    
+    def __iter__(self):
+        return self.spill.iter_nodes(self.indices)
+    
+    def close(self):
+        self.spill.close()
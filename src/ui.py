@@ -14,9 +14,14 @@ import shutil
 import queue
 from pathlib import Path
 
+from src.profiler import format_stats
+from src.build_planner import format_plan
+from src.import_modes import PAK_SUFFIXES
+from src.profiles import DEFAULT_PROFILE, list_profiles
+
 try:
     import tkinter as tk
-    from tkinter import ttk, filedialog, messagebox, scrolledtext
+    from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
     from tkinter.ttk import Progressbar
 except ImportError:
     print("错误：无法导入tkinter。请确保Python安装包含tkinter模块。")
@@ -230,6 +235,39 @@ class UIManager:
         elif selected == "English":
             self.app.change_language("en_US")
     
+    def on_profile_change(self, event=None):
+        """配置切换处理"""
+        self.app.switch_profile(self.profile_var.get())
+        self.refresh_profile_combo()
+    
+    def refresh_profile_combo(self):
+        """刷新配置列表"""
+        self.profile_combo.config(values=list_profiles(self.app.data_dir))
+        self.profile_var.set(self.app.active_profile)
+        self.profile_delete_button.config(state=tk.DISABLED if self.app.active_profile == DEFAULT_PROFILE else tk.NORMAL)
+    
+    def new_profile(self):
+        """新建配置，复制当前配置的MOD列表"""
+        if self.app.is_task_running:
+            messagebox.showwarning(self.app.texts.get("warning_title", "警告"), self.app.texts.get("warning_task_running", "有任务正在运行，请等待完成后再操作"))
+            return
+        name = simpledialog.askstring(self.app.texts.get("new_profile", "新建配置"),
+                                      self.app.texts.get("new_profile_prompt", "配置名称(字母、数字、下划线或中文):"),
+                                      parent=self.app.root)
+        if name:
+            self.app.create_new_profile(name.strip())
+            self.refresh_profile_combo()
+    
+    def delete_profile(self):
+        """删除当前配置"""
+        if self.app.is_task_running:
+            messagebox.showwarning(self.app.texts.get("warning_title", "警告"), self.app.texts.get("warning_task_running", "有任务正在运行，请等待完成后再操作"))
+            return
+        if messagebox.askyesno(self.app.texts.get("confirm_delete", "确认删除"),
+                               self.app.texts.get("confirm_delete_profile", "确定要删除配置 {} 吗？").format(self.app.active_profile)):
+            self.app.delete_current_profile()
+            self.refresh_profile_combo()
+    
     def select_race_paks(self):
         """选择种族pak文件"""
         if self.app.is_task_running:
@@ -238,7 +276,8 @@ class UIManager:
             
         files = filedialog.askopenfilenames(
             title=self.app.texts.get("select_race_dialog_title", "选择种族MOD pak文件"),
-            filetypes=[(self.app.texts.get("file_types_pak", "PAK文件"), "*.pak"), (self.app.texts.get("file_types_all", "所有文件"), "*.*")],
+            filetypes=[(self.app.texts.get("file_types_mod", "MOD文件"), "*.pak *.zip"), (self.app.texts.get("file_types_pak", "PAK文件"), "*.pak"),
+                       (self.app.texts.get("file_types_zip", "ZIP压缩包"), "*.zip"), (self.app.texts.get("file_types_all", "所有文件"), "*.*")],
             multiple=True
         )
         
@@ -259,7 +298,8 @@ class UIManager:
             
         files = filedialog.askopenfilenames(
             title=self.app.texts.get("select_appearance_dialog_title", "选择外观MOD pak文件"),
-            filetypes=[(self.app.texts.get("file_types_pak", "PAK文件"), "*.pak"), (self.app.texts.get("file_types_all", "所有文件"), "*.*")],
+            filetypes=[(self.app.texts.get("file_types_mod", "MOD文件"), "*.pak *.zip"), (self.app.texts.get("file_types_pak", "PAK文件"), "*.pak"),
+                       (self.app.texts.get("file_types_zip", "ZIP压缩包"), "*.zip"), (self.app.texts.get("file_types_all", "所有文件"), "*.*")],
             multiple=True
         )
         
@@ -306,6 +346,27 @@ class UIManager:
         self.language_combo.pack(side=tk.LEFT)
         self.language_combo.bind("<<ComboboxSelected>>", self.on_language_change)
         
+        # 配置选择
+        profile_frame = ttk.Frame(title_frame)
+        profile_frame.grid(row=1, column=1, sticky=tk.E, pady=(5, 0))
+        
+        self.profile_label = ttk.Label(profile_frame, text=self.app.texts.get("profile_label", "配置:"))
+        self.profile_label.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.profile_var = tk.StringVar(value=self.app.active_profile)
+        self.profile_combo = ttk.Combobox(profile_frame, textvariable=self.profile_var, state="readonly", width=12)
+        self.profile_combo.pack(side=tk.LEFT, padx=(0, 5))
+        self.profile_combo.bind("<<ComboboxSelected>>", self.on_profile_change)
+        
+        self.profile_new_button = ttk.Button(profile_frame, text=self.app.texts.get("new_profile", "新建配置"),
+                                             command=self.new_profile)
+        self.profile_new_button.pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.profile_delete_button = ttk.Button(profile_frame, text=self.app.texts.get("delete_profile", "删除配置"),
+                                                command=self.delete_profile)
+        self.profile_delete_button.pack(side=tk.LEFT)
+        self.refresh_profile_combo()
+        
         # 种族pak区域
         self.app.race_frame = ttk.LabelFrame(main_frame, text=self.app.texts.get("race_frame_title", "选择种族MOD (.pak文件)"), padding="15")
         self.app.race_frame.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 20))
@@ -375,7 +436,15 @@ class UIManager:
         
         self.app.refresh_button = ttk.Button(button_frame, text=self.app.texts.get("refresh_pak_list", "刷新PAK列表"), 
                                         command=self.app.refresh_pak_lists)
-        self.app.refresh_button.pack(side=tk.LEFT)
+        self.app.refresh_button.pack(side=tk.LEFT, padx=(0, 15))
+        
+        self.app.stats_button = ttk.Button(button_frame, text=self.app.texts.get("last_run_stats", "上次运行统计"), 
+                                      command=self.app.show_last_run_stats)
+        self.app.stats_button.pack(side=tk.LEFT, padx=(0, 15))
+        
+        self.app.plan_button = ttk.Button(button_frame, text=self.app.texts.get("build_plan", "生成预估"), 
+                                     command=self.app.show_build_plan)
+        self.app.plan_button.pack(side=tk.LEFT)
         
         # 进度条
         self.app.progress_var = tk.StringVar(value=self.app.texts.get("status_ready", "就绪"))
@@ -416,6 +485,9 @@ class UIManager:
         
         # 更新语言标签
         self.language_label.config(text=self.app.texts.get("language_label", "语言:"))
+        self.profile_label.config(text=self.app.texts.get("profile_label", "配置:"))
+        self.profile_new_button.config(text=self.app.texts.get("new_profile", "新建配置"))
+        self.profile_delete_button.config(text=self.app.texts.get("delete_profile", "删除配置"))
         
         # 更新种族框架
         self.app.race_frame.config(text=self.app.texts.get("race_frame_title", "选择种族MOD (.pak文件)"))
@@ -431,6 +503,8 @@ class UIManager:
         self.app.generate_button.config(text=self.app.texts.get("generate_button", "生成兼容性补丁"))
         self.app.open_dir_button.config(text=self.app.texts.get("open_output_dir", "打开输出目录"))
         self.app.refresh_button.config(text=self.app.texts.get("refresh_pak_list", "刷新PAK列表"))
+        self.app.stats_button.config(text=self.app.texts.get("last_run_stats", "上次运行统计"))
+        self.app.plan_button.config(text=self.app.texts.get("build_plan", "生成预估"))
         self.app.support_button.config(text=self.app.texts.get("support_button", "支持作者 ☕"))
         
         # 更新进度文本
@@ -519,6 +593,7 @@ class UIManager:
                     extract_dir = self.app.sourcemod_dir / file_path.stem
                     if extract_dir.exists():
                         shutil.rmtree(extract_dir)
+                    self.app.collect_store_garbage()
                     
                     # 刷新pak列表
                     self.app.refresh_pak_lists()
@@ -547,6 +622,7 @@ class UIManager:
                     extract_dir = self.app.panagway_dir / file_path.stem
                     if extract_dir.exists():
                         shutil.rmtree(extract_dir)
+                    self.app.collect_store_garbage()
                     
                     # 刷新pak列表
                     self.app.refresh_pak_lists()
@@ -569,7 +645,7 @@ class UIManager:
                 return
             
             # 只计算pak文件数量
-            pak_count = len([item for item in contents if item.is_file() and item.suffix.lower() == '.pak'])
+            pak_count = len([item for item in contents if item.is_file() and item.suffix.lower() in PAK_SUFFIXES])
             count = pak_count if pak_count > 0 else len(contents)
             result = messagebox.askyesno(
                 self.app.texts.get("confirm_delete_title", "确认删除"), 
@@ -585,6 +661,7 @@ class UIManager:
                             shutil.rmtree(item)
                     except Exception as e:
                         pass
+                self.app.collect_store_garbage()
                 
                 self.app.refresh_pak_lists()
             
@@ -603,7 +680,7 @@ class UIManager:
                 return
             
             # 只计算pak文件数量
-            pak_count = len([item for item in contents if item.is_file() and item.suffix.lower() == '.pak'])
+            pak_count = len([item for item in contents if item.is_file() and item.suffix.lower() in PAK_SUFFIXES])
             count = pak_count if pak_count > 0 else len(contents)
             result = messagebox.askyesno(
                 self.app.texts.get("confirm_delete_title", "确认删除"), 
@@ -619,6 +696,7 @@ class UIManager:
                             shutil.rmtree(item)
                     except Exception as e:
                         pass
+                self.app.collect_store_garbage()
                 
                 # 清除种族选择数据
                 self.app.appearance_race_selections.clear()
@@ -642,6 +720,41 @@ class UIManager:
         """显示警告消息"""
         messagebox.showwarning(title, message)
 
+    def show_stats_dialog(self, stats):
+        """显示上次运行统计面板"""
+        dialog = tk.Toplevel(self.app.root)
+        dialog.title(self.app.texts.get("last_run_stats", "上次运行统计"))
+        dialog.geometry("760x300")
+        dialog.transient(self.app.root)
+        
+        text = scrolledtext.ScrolledText(dialog, wrap=tk.NONE, font=('Consolas', 9))
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        
+        if stats:
+            text.insert(tk.END, "\n".join(format_stats(stats)))
+        else:
+            text.insert(tk.END, self.app.texts.get("no_run_stats", "暂无运行统计"))
+        text.insert(tk.END, "\n\n" + self.app.texts.get("log_file_location", "日志文件: {path}").format(path=self.app.log_dir / "build.log"))
+        text.config(state='disabled')
+        
+        ttk.Button(dialog, text=self.app.texts.get("ok_button", "确定"), 
+                   command=dialog.destroy).pack(pady=(0, 10))
+    
+    def show_plan_dialog(self, plan):
+        """显示生成预估"""
+        dialog = tk.Toplevel(self.app.root)
+        dialog.title(self.app.texts.get("build_plan", "生成预估"))
+        dialog.geometry("760x400")
+        dialog.transient(self.app.root)
+        
+        text = scrolledtext.ScrolledText(dialog, wrap=tk.NONE, font=('Consolas', 9))
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        text.insert(tk.END, "\n".join(format_plan(plan)))
+        text.config(state='disabled')
+        
+        ttk.Button(dialog, text=self.app.texts.get("ok_button", "确定"), 
+                   command=dialog.destroy).pack(pady=(0, 10))
+    
     def update_race_listbox(self):
         """更新种族列表框"""
         self.app.race_listbox.delete(0, tk.END)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+BG3 MOD兼容性工具 - zip发布包导入
+MOD通常以zip发布(pak + info.json，和create_zip_package生成的结构相同)，
+导入时直接从zip流式写出其中的pak，不需要先解压到临时文件夹
+"""
+
+import os
+import json
+import hashlib
+import logging
+import zipfile
+from pathlib import Path, PurePosixPath
+
+ZIP_SUFFIX = ".zip"
+
+# 写入中的临时后缀，写完后改名
+PART_SUFFIX = ".part"
+
+# macOS压缩时附带的资源文件夹，其中的同名文件不是真正的内容
+MACOSX_DIR = "__MACOSX/"
+
+
+def _zip_members(zf: zipfile.ZipFile) -> list:
+    """zip中的文件，不含目录和__MACOSX"""
+    return [info.filename for info in zf.infolist() if not info.is_dir() and not info.filename.startswith(MACOSX_DIR)]
+
+
+def _pak_members(zf: zipfile.ZipFile) -> list:
+    return [member for member in _zip_members(zf) if member.lower().endswith(".pak")]
+
+
+def read_zip_info(zf: zipfile.ZipFile) -> dict:
+    """读取zip中的info.json，没有或格式不对时返回空字典"""
+    for member in _zip_members(zf):
+        if PurePosixPath(member).name.lower() == "info.json":
+            try:
+                with zf.open(member) as f:
+                    info = json.loads(f.read().decode('utf-8-sig'))
+                return info if isinstance(info, dict) else {}
+            except (ValueError, UnicodeDecodeError):
+                return {}
+    return {}
+
+
+def list_zip_paks(zip_file: Path) -> list:
+    """zip中所有pak的成员名"""
+    with zipfile.ZipFile(zip_file) as zf:
+        return _pak_members(zf)
+
+
+def expected_md5(info: dict, pak_name: str, pak_count: int):
+    """info.json中记录的pak MD5，按folderName匹配，只有一个pak和一个MOD时直接对应"""
+    mods = [mod for mod in info.get("mods", info.get("Mods", [])) if isinstance(mod, dict)]
+    stem = Path(pak_name).stem
+    for mod in mods:
+        if mod.get("folderName") == stem or mod.get("Name") == stem:
+            return mod.get("MD5") or None
+    if pak_count == 1 and len(mods) == 1:
+        return mods[0].get("MD5") or None
+    return None
+
+
+def import_zip_pak(zip_file: Path, member: str, dest_dir: Path, logger: logging.Logger = None):
+    """把zip中的一个pak流式写入导入目录
+    
+    写入时同时计算MD5。info.json中的MD5只是说明信息，发布包中经常没有更新，
+    不一致时只记录警告，照常导入。
+    返回(导入目录中的条目, 方式)，目标已存在时方式为"exists"。
+    """
+    logger = logger or logging.getLogger("bg3_cc")
+    zip_file = Path(zip_file)
+    dest = Path(dest_dir) / PurePosixPath(member).name
+    if dest.exists():
+        return dest, "exists"
+    
+    with zipfile.ZipFile(zip_file) as zf:
+        info = read_zip_info(zf)
+        md5 = expected_md5(info, dest.name, len(_pak_members(zf)))
+        
+        part_file = dest.with_name(dest.name + PART_SUFFIX)
+        hash_md5 = hashlib.md5()
+        try:
+            with zf.open(member) as src, open(part_file, 'wb') as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                    hash_md5.update(chunk)
+                    dst.write(chunk)
+            if md5 and hash_md5.hexdigest().upper() != md5.upper():
+                logger.warning("%s 中的 %s 和info.json记录的MD5不一致(%s != %s)，可能是info.json没有更新",
+                               zip_file.name, dest.name, hash_md5.hexdigest().upper(), md5.upper())
+            os.replace(part_file, dest)
+        finally:
+            if part_file.exists():
+                part_file.unlink()
+    
+    return dest, "zip"
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+内存预算基准: 生成大规模合成矩阵(外观MOD x 节点 x 种族)，比较进程内存峰值和预算
+
+每次运行都是新进程，峰值只包含这一次生成。用法:
+    python -m tests.bench_memory_budget --budget-mb 64 --races 60
+超过预算时返回码为1。
+"""
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+from src.profiler import peak_memory_bytes
+from tests import support
+
+
+def build_matrix(app, mods: int, nodes: int, races: int):
+    """写出races个种族MOD和mods个外观MOD，每个外观MOD有nodes个人类外观"""
+    for index in range(races):
+        support.write_mod_pak(app.sourcemod_dir / f"RaceMod{index}.pak", support.race_mod_files(index))
+    for index in range(mods):
+        support.write_mod_pak(app.panagway_dir / f"AppMod{index}.pak", support.appearance_mod_files(index, nodes))
+    # 源文件夹只用于写pak
+    for source_dir in list(app.sourcemod_dir.glob("*.src")) + list(app.panagway_dir.glob("*.src")):
+        shutil.rmtree(source_dir)
+
+
+def run(mods: int, nodes: int, races: int, budget_mb: int, shard_mode: str) -> dict:
+    work_dir = Path(tempfile.mkdtemp(prefix="bg3_bench_"))
+    try:
+        app = support.make_app(work_dir, {'pak_backend': "native", 'parse_mode': "archive",
+                                          'memory_budget_mb': budget_mb, 'output_shard_mode': shard_mode})
+        build_matrix(app, mods, nodes, races)
+        baseline = peak_memory_bytes()
+        
+        started = time.perf_counter()
+        messages = support.generate(app)
+        wall_time = time.perf_counter() - started
+        if messages[-1]['type'] != "complete":
+            raise RuntimeError(messages[-1]['text'])
+        
+        output_bytes = sum(lsx_file.stat().st_size for lsx_file in support.output_lsx_files(app))
+        peak = peak_memory_bytes()
+        return {
+            'nodes': mods * nodes * races,
+            'output_mb': round(output_bytes / (1024 * 1024), 1),
+            'baseline_mb': round(baseline / (1024 * 1024), 1),
+            'peak_mb': round(peak / (1024 * 1024), 1),
+            'budget_mb': budget_mb,
+            'wall_time': round(wall_time, 2),
+            'within_budget': not budget_mb or peak <= budget_mb * 1024 * 1024,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="内存预算基准")
+    parser.add_argument("--mods", type=int, default=4, help="外观MOD数")
+    parser.add_argument("--nodes", type=int, default=500, help="每个外观MOD的人类外观节点数")
+    parser.add_argument("--races", type=int, default=60, help="种族MOD数")
+    parser.add_argument("--budget-mb", type=int, default=64, help="内存预算(MB)，0为不限制")
+    parser.add_argument("--shard-mode", default="race", choices=("none", "race", "count"), help="分片方式")
+    args = parser.parse_args(argv)
+    
+    if peak_memory_bytes() is None:
+        print("无法获取进程内存峰值", file=sys.stderr)
+        return 2
+    result = run(args.mods, args.nodes, args.races, args.budget_mb, args.shard_mode)
+    print(json.dumps(result, ensure_ascii=False))
+    return 0 if result['within_budget'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+测试用的Divine.exe替身，pak用zip文件代替
+支持extract-package、extract-packages、create-package、list-package，
+通过环境变量模拟失败:
+    DIVINE_STUB_LOG         每次调用的参数追加到这个文件
+    DIVINE_STUB_FAIL_BATCH  extract-packages直接返回错误
+    DIVINE_STUB_SKIP        extract-packages跳过这个pak(不产出文件夹)
+    DIVINE_STUB_DELAY       extract-packages每个pak之后等待的秒数
+    DIVINE_STUB_FAIL_AFTER  extract-packages解包这么多个pak后返回错误
+"""
+
+import os
+import sys
+import time
+import zipfile
+import argparse
+from pathlib import Path
+
+
+def extract(source, destination):
+    destination = Path(destination)
+    destination.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(source) as zf:
+        zf.extractall(destination)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-g", "--game")
+    parser.add_argument("--action")
+    parser.add_argument("--source")
+    parser.add_argument("--destination")
+    parser.add_argument("-l")
+    args, _ = parser.parse_known_args()
+    
+    log_file = os.environ.get("DIVINE_STUB_LOG")
+    if log_file:
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(" ".join(sys.argv[1:]) + "\n")
+    
+    if args.action == "extract-package":
+        extract(args.source, args.destination)
+        print(f"extracted {args.source}")
+    elif args.action == "extract-packages":
+        if os.environ.get("DIVINE_STUB_FAIL_BATCH"):
+            print("batch failed", file=sys.stderr)
+            return 3
+        delay = float(os.environ.get("DIVINE_STUB_DELAY", "0") or 0)
+        fail_after = os.environ.get("DIVINE_STUB_FAIL_AFTER")
+        for index, pak_file in enumerate(sorted(Path(args.source).glob("*.pak"))):
+            if fail_after and index >= int(fail_after):
+                print("batch failed", file=sys.stderr)
+                return 3
+            if pak_file.stem != os.environ.get("DIVINE_STUB_SKIP"):
+                extract(pak_file, Path(args.destination) / pak_file.stem)
+            time.sleep(delay)
+    elif args.action == "create-package":
+        with zipfile.ZipFile(args.destination, "w") as zf:
+            for path in sorted(Path(args.source).rglob("*")):
+                if path.is_file():
+                    zf.write(path, path.relative_to(args.source).as_posix())
+    elif args.action == "list-package":
+        with zipfile.ZipFile(args.source) as zf:
+            for name in zf.namelist():
+                print(name)
+    else:
+        print(f"unknown action {args.action}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
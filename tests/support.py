@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+测试辅助: 生成种族/外观MOD样例，创建不带界面的生成器实例
+"""
+
+import queue
+import uuid
+from unittest import mock
+import importlib.util
+import importlib.machinery
+from pathlib import Path
+
+from src.settings import load_settings
+from src.profiler import BuildProfiler, setup_build_logger
+from src.pak_backends import create_pak_backend
+from src.pipeline import ParseCache
+from src.blob_store import BlobStore
+from src.pak_vfs import PakMounts
+from src.profiles import DEFAULT_PROFILE
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# 外观MOD中的种族
+HUMAN_UUID = "0eb594cb-8820-4be6-a58d-8be7a1a98fba"
+ELF_UUID = "6c038dcb-7eb5-431d-84f8-cecfaf1c0c5a"
+
+_LSX_HEAD = '<?xml version="1.0" encoding="utf-8"?>\n<save>\n    <version major="4" minor="0" revision="9" build="331" />\n'
+
+_app_module = None
+
+
+def load_app_module():
+    """加载bg3_compatibility_generator.pyw"""
+    global _app_module
+    if _app_module is None:
+        loader = importlib.machinery.SourceFileLoader("bg3_compatibility_generator", str(REPO_DIR / "bg3_compatibility_generator.pyw"))
+        spec = importlib.util.spec_from_loader(loader.name, loader)
+        _app_module = importlib.util.module_from_spec(spec)
+        loader.exec_module(_app_module)
+    return _app_module
+
+
+def races_lsx(race_uuid: str, name: str) -> str:
+    return (_LSX_HEAD + '    <region id="Races">\n        <node id="root">\n            <children>\n'
+            '                <node id="Race">\n'
+            f'                    <attribute id="Name" type="FixedString" value="{name}"/>\n'
+            f'                    <attribute id="UUID" type="guid" value="{race_uuid}"/>\n'
+            '                </node>\n            </children>\n        </node>\n    </region>\n</save>')
+
+
+def appearance_node(race_uuid: str, visual_resource: str, slot_name: str = "Hair") -> str:
+    return ('                <node id="CharacterCreationAppearanceVisual">\n'
+            '                    <attribute id="BodyShape" type="uint8" value="0"/>\n'
+            '                    <attribute id="BodyType" type="uint8" value="1"/>\n'
+            '                    <attribute id="DisplayName" type="TranslatedString" handle="h1" version="1"/>\n'
+            f'                    <attribute id="RaceUUID" type="guid" value="{race_uuid}"/>\n'
+            f'                    <attribute id="SlotName" type="FixedString" value="{slot_name}"/>\n'
+            f'                    <attribute id="UUID" type="guid" value="{uuid.uuid4()}"/>\n'
+            f'                    <attribute id="VisualResource" type="guid" value="{visual_resource}"/>\n'
+            '                </node>')
+
+
+def appearance_lsx(nodes: list) -> str:
+    return (_LSX_HEAD + '    <region id="CharacterCreationAppearanceVisuals">\n        <node id="root">\n            <children>\n'
+            + '\n'.join(nodes) + '\n            </children>\n        </node>\n    </region>\n</save>')
+
+
+def race_mod_files(index: int) -> dict:
+    """第index个种族MOD的文件 {pak内路径: bytes}"""
+    race_uuid = str(uuid.UUID(int=1000 + index))
+    return {f"Public/RaceMod{index}/Races/Races.lsx": races_lsx(race_uuid, f"Race{index}").encode("utf-8")}
+
+
+def appearance_mod_files(index: int, nodes: int) -> dict:
+    """第index个外观MOD的文件，nodes个人类外观和一个精灵外观"""
+    node_list = [appearance_node(HUMAN_UUID, str(uuid.UUID(int=(index + 1) * 1000000 + k))) for k in range(nodes)]
+    node_list.append(appearance_node(ELF_UUID, str(uuid.UUID(int=index))))
+    return {f"Public/AppMod{index}/CharacterCreation/CharacterCreationAppearanceVisuals.lsx": appearance_lsx(node_list).encode("utf-8")}
+
+
+def write_mod_pak(pak_file: Path, files: dict) -> Path:
+    """用进程内LSPK写出pak"""
+    from src.lspk import write_pak
+    source_dir = pak_file.with_suffix(".src")
+    for name, data in files.items():
+        target = source_dir / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+    pak_file.parent.mkdir(parents=True, exist_ok=True)
+    write_pak(source_dir, pak_file)
+    return pak_file
+
+
+class _Var:
+    def __init__(self):
+        self.value = None
+    
+    def set(self, value):
+        self.value = value
+    
+    def get(self):
+        return self.value
+
+
+class _NullUI:
+    """忽略所有界面调用"""
+    
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class _NullRoot:
+    def after(self, ms, func=None, *args):
+        pass
+
+
+def make_app(app_dir: Path, settings: dict = None):
+    """创建不带界面的生成器，数据目录在app_dir/Data"""
+    module = load_app_module()
+    app = object.__new__(module.BG3CompatibilityGenerator)
+    app.root = _NullRoot()
+    app.app_dir = Path(app_dir)
+    app.current_language = "zh_CN"
+    app.texts = {}
+    app.divine_exe = app.app_dir / "Data" / "Tools" / "Divine" / "Divine.exe"
+    app.temp_dir = app.app_dir / "temp"
+    app.data_dir = app.app_dir / "Data"
+    app.log_dir = app.data_dir / "Logs"
+    app.settings = load_settings(app.data_dir / "settings.json")
+    app.settings.update(settings or {})
+    app.logger = setup_build_logger(app.log_dir)
+    app.profiler = BuildProfiler(app.logger, app.log_dir)
+    app.pak_backend = create_pak_backend(app.settings, app.divine_exe, app.logger)
+    app.blob_store = BlobStore(app.data_dir / "Store", app.logger)
+    app.active_profile = DEFAULT_PROFILE
+    app._apply_profile_dirs()
+    app.pak_mounts = PakMounts()
+    app.selected_race_paks = []
+    app.selected_appearance_paks = []
+    app.race_data = {}
+    app.appearance_data = {}
+    app.dedup_dropped = 0
+    app.parse_cache = ParseCache()
+    app.appearance_race_selections = {}
+    app.appearance_race_widgets = {}
+    app.appearance_vanilla_races = {}
+    app.fixed_uuid = None
+    app.task_queue = queue.Queue()
+    app.current_task_thread = None
+    app.is_task_running = False
+    app.mod_watcher = None
+    app.pending_mod_changes = set()
+    app.ui_manager = _NullUI()
+    app.progress_var = _Var()
+    app.progress_bar = {}
+    app.patch_info = {'mod_name': "TestPatch", 'author': "test", 'description': "test",
+                      'version': "1.0.0.0", 'regenerate_uuid': True}
+    app.ensure_directories()
+    return app
+
+
+def drain(app) -> list:
+    """取出任务队列中的所有消息"""
+    messages = []
+    while True:
+        try:
+            messages.append(app.task_queue.get_nowait())
+        except queue.Empty:
+            return messages
+
+
+def generate(app, race_uuid: str = HUMAN_UUID) -> list:
+    """刷新列表，所有外观MOD选择race_uuid，同步生成补丁，返回任务消息"""
+    app.refresh_pak_lists()
+    for pak_file in app.selected_appearance_paks:
+        app.appearance_race_selections[pak_file] = race_uuid
+    app._generate_compatibility_async()
+    return drain(app)
+
+
+def click_generate(app, timeout: float = 60) -> list:
+    """按生成按钮的流程: 后台预估、确认补丁信息、后台生成，返回生成任务的消息
+    
+    补丁信息对话框直接返回app.patch_info，root.after(0, ...)立即执行。
+    """
+    module = load_app_module()
+    dialog = mock.Mock(result=dict(app.patch_info))
+    run_now = lambda ms, func=None, *args: func(*args) if ms == 0 else None
+    with mock.patch.object(module, "PatchInfoDialog", return_value=dialog), \
+            mock.patch.object(app.root, "wait_window", create=True), \
+            mock.patch.object(app.root, "after", side_effect=run_now):
+        app.generate_compatibility()
+        app.current_task_thread.join(timeout)
+        # 预估结果回到主线程，确认后启动生成
+        app.process_task_queue()
+        app.current_task_thread.join(timeout)
+    return drain(app)
+
+
+def output_lsx_files(app) -> list:
+    """生成的外观配置文件"""
+    mod_name = app.patch_info['mod_name']
+    return sorted((app.output_dir / mod_name / "Public" / mod_name / "CharacterCreation").glob("*.lsx"))
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+外观去重测试: 各去重策略、内存预算模式的编号去重、生成时报告合并数
+"""
+
+import re
+import uuid
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.appearance_dedup import dedupe_nodes, dedupe_indices, visual_identity
+from tests import support
+
+VISUAL_A = "aaaaaaaa-0000-0000-0000-000000000001"
+VISUAL_B = "bbbbbbbb-0000-0000-0000-000000000002"
+
+
+def make_node(visual_resource: str, source: str, extra: int = 0, race_uuid: str = support.HUMAN_UUID, slot_name: str = "Hair") -> dict:
+    """外观节点，source用于区分保留了哪个，extra为额外属性数"""
+    attributes = re.search(r'(<attribute[\s\S]*)\n\s*</node>', support.appearance_node(race_uuid, visual_resource, slot_name)).group(1)
+    attributes += "".join(f'\n<attribute id="Extra{i}" type="FixedString" value="x"/>' for i in range(extra))
+    return {'description': "", 'attributes': attributes, 'source': source}
+
+
+class DedupePolicyTest(unittest.TestCase):
+    
+    def setUp(self):
+        # A出现三次(第二个属性最多)，B出现两次(属性数相同)，C没有VisualResource
+        self.nodes = [
+            make_node(VISUAL_A, "a1"),
+            make_node(VISUAL_B, "b1", extra=1),
+            make_node(VISUAL_A, "a2", extra=2),
+            make_node("", "c1"),
+            make_node(VISUAL_B, "b2", extra=1),
+            make_node(VISUAL_A, "a3", extra=1),
+        ]
+    
+    def dedupe(self, policy: str, **kwargs):
+        """两种实现的结果必须一致，返回(保留的source, 丢弃数量)"""
+        kept, dropped = dedupe_nodes(self.nodes, policy, **kwargs)
+        kept_indices, dropped_indices = dedupe_indices(iter(self.nodes), policy, **kwargs)
+        self.assertEqual([self.nodes[index]['source'] for index in kept_indices], [node['source'] for node in kept])
+        self.assertEqual(dropped_indices, dropped)
+        return [node['source'] for node in kept], dropped
+    
+    def test_off(self):
+        self.assertEqual(self.dedupe("off"), (["a1", "b1", "a2", "c1", "b2", "a3"], 0))
+    
+    def test_first(self):
+        self.assertEqual(self.dedupe("first"), (["a1", "b1", "c1"], 3))
+    
+    def test_last(self):
+        # 保留最后一个来源，位置仍是第一次出现的位置
+        self.assertEqual(self.dedupe("last"), (["a3", "b2", "c1"], 3))
+    
+    def test_most_complete(self):
+        self.assertEqual(self.dedupe("most_complete"), (["a2", "b1", "c1"], 3))
+    
+    def test_most_complete_tie_keeps_first(self):
+        self.nodes = [make_node(VISUAL_A, "a1", extra=1), make_node(VISUAL_A, "a2", extra=1), make_node(VISUAL_A, "a3")]
+        self.assertEqual(self.dedupe("most_complete"), (["a1"], 2))
+    
+    def test_unknown_policy_keeps_all(self):
+        self.assertEqual(self.dedupe("newest"), (["a1", "b1", "a2", "c1", "b2", "a3"], 0))
+    
+    def test_identity(self):
+        human = make_node(VISUAL_A.upper(), "h")['attributes']
+        elf = make_node(VISUAL_A, "e", race_uuid=support.ELF_UUID)['attributes']
+        # 大小写不同视为相同
+        self.assertEqual(visual_identity(human), visual_identity(elf))
+        self.assertNotEqual(visual_identity(human, include_race=True), visual_identity(elf, include_race=True))
+        self.assertNotEqual(visual_identity(human), visual_identity(make_node(VISUAL_A, "b", slot_name="Beard")['attributes']))
+        self.assertIsNone(visual_identity(make_node("", "c")['attributes']))
+        
+        self.nodes = [make_node(VISUAL_A, "h"), make_node(VISUAL_A, "e", race_uuid=support.ELF_UUID)]
+        self.assertEqual(self.dedupe("first"), (["h"], 1))
+        self.assertEqual(self.dedupe("first", include_race=True), (["h", "e"], 0))
+
+
+class DedupeReportTest(unittest.TestCase):
+    """4个外观MOD x 3个节点，两两相同，生成时合并为6个并报告丢弃数"""
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_dedup_test_"))
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def run_generation(self, budget_mb: int) -> tuple:
+        app = support.make_app(self.work_dir / f"budget{budget_mb}", {'pak_backend': "native", 'parse_mode': "archive",
+                                                                       'memory_budget_mb': budget_mb,
+                                                                       'appearance_dedup_policy': "first"})
+        support.write_mod_pak(app.sourcemod_dir / "RaceMod0.pak", support.race_mod_files(0))
+        for index in range(4):
+            # 0和1、2和3内容相同
+            nodes = [support.appearance_node(support.HUMAN_UUID, str(uuid.UUID(int=(index // 2) * 100 + k)))
+                     for k in range(3)]
+            files = {f"Public/AppMod{index}/CharacterCreation/CharacterCreationAppearanceVisuals.lsx":
+                     support.appearance_lsx(nodes).encode("utf-8")}
+            support.write_mod_pak(app.panagway_dir / f"AppMod{index}.pak", files)
+        
+        messages = support.generate(app)
+        self.assertEqual(messages[-1]['type'], "complete", messages)
+        lsx = "".join(lsx_file.read_text(encoding="utf-8") for lsx_file in support.output_lsx_files(app))
+        return app.dedup_dropped, lsx.count('id="CharacterCreationAppearanceVisual"'), messages[-1]['text']
+    
+    def test_dropped_reported(self):
+        for budget_mb in (0, 16):
+            dropped, nodes, text = self.run_generation(budget_mb)
+            self.assertEqual((dropped, nodes), (6, 6), budget_mb)
+            self.assertIn("6", text.split(")")[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
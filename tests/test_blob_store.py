@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+共享存储测试: 删除或重新导入MOD后清理不再引用的存储文件
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from tests import support
+
+
+class StoreGarbageTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_store_test_"))
+        self.app = support.make_app(self.work_dir)
+        for index in range(2):
+            extract_dir = self.app.panagway_dir / f"AppMod{index}"
+            for name, data in support.appearance_mod_files(index, 2).items():
+                (extract_dir / name).parent.mkdir(parents=True, exist_ok=True)
+                (extract_dir / name).write_bytes(data)
+            (self.app.panagway_dir / f"AppMod{index}.pak").write_bytes(f"PAK{index}".encode())
+            self.app.blob_store.ingest_tree(extract_dir)
+        self.assertEqual(self.app.blob_store.usage()[0], 2)
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_delete_mod_collects_garbage(self):
+        self.app.refresh_pak_lists()
+        pak_path = str(self.app.panagway_dir / "AppMod0.pak")
+        module = support.load_app_module()
+        threads = []
+        collect = self.app.collect_store_garbage
+        with mock.patch.object(module.messagebox, "askyesno", return_value=True), \
+                mock.patch.object(self.app, "collect_store_garbage", side_effect=lambda: threads.append(collect())):
+            self.app.delete_appearance_file_by_path(pak_path)
+        threads[0].join(10)
+        self.assertEqual(self.app.blob_store.usage()[0], 1)
+    
+    def test_reimport_collects_garbage(self):
+        # 重新解包替换了文件夹，旧内容只剩存储中的一份
+        shutil.rmtree(self.app.panagway_dir / "AppMod1")
+        with mock.patch.object(self.app, "collect_store_garbage") as collect:
+            self.app.task_queue.put({'type': 'complete', 'subtype': 'import_files', 'text': "导入完成"})
+            self.app.process_task_queue()
+        collect.assert_called_once_with()
+        self.app.collect_store_garbage().join(10)
+        self.assertEqual(self.app.blob_store.usage()[0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+生成预估测试: 预估在后台线程中进行，不阻塞界面
+"""
+
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from tests import support
+
+
+class BuildPlanThreadTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_plan_test_"))
+        self.app = support.make_app(self.work_dir, {'pak_backend': "native", 'parse_mode': "archive"})
+        support.write_mod_pak(self.app.sourcemod_dir / "RaceMod0.pak", support.race_mod_files(0))
+        support.write_mod_pak(self.app.panagway_dir / "AppMod0.pak", support.appearance_mod_files(0, 2))
+        self.app.refresh_pak_lists()
+        for pak_file in self.app.selected_appearance_paks:
+            self.app.appearance_race_selections[pak_file] = support.HUMAN_UUID
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_generate_plans_off_main_thread(self):
+        main_thread = threading.current_thread()
+        plan_threads = []
+        plan_build = self.app.plan_build
+        
+        def record_thread():
+            plan_threads.append(threading.current_thread())
+            return plan_build()
+        
+        with mock.patch.object(self.app, "plan_build", side_effect=record_thread), \
+                mock.patch.object(self.app.root, "after") as after:
+            self.app.generate_compatibility()
+            self.assertTrue(self.app.is_task_running)
+            self.app.current_task_thread.join(10)
+            self.app.process_task_queue()
+        
+        self.assertEqual(len(plan_threads), 1)
+        self.assertIsNot(plan_threads[0], main_thread)
+        self.assertFalse(self.app.is_task_running)
+        # 确认和补丁信息对话框回到主线程处理
+        message = [call.args[2] for call in after.call_args_list if call.args[1:2] == (self.app._on_build_plan,)][0]
+        self.assertEqual(message['purpose'], "generate")
+        # 2个人类外观 x 1个种族
+        self.assertEqual(message['plan']['total_nodes'], 2)
+    
+    def test_plan_error_reported_on_main_thread(self):
+        with mock.patch.object(self.app, "plan_build", side_effect=OSError("busy")):
+            self.app.show_build_plan()
+            self.app.current_task_thread.join(10)
+        message = support.drain(self.app)[-1]
+        self.assertEqual((message['type'], message['purpose'], message['error']), ("build_plan", "show", "busy"))
+        with mock.patch.object(self.app.ui_manager, "show_error_message", create=True) as show_error:
+            self.app._on_build_plan(message)
+        show_error.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+DivineRunner批量解包测试，用tests/divine_stub.py代替Divine.exe
+"""
+
+import os
+import sys
+import time
+import shutil
+import subprocess
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from src.divine_runner import DivineRunner
+
+STUB_SOURCE = Path(__file__).with_name("divine_stub.py")
+
+
+def make_stub_divine(directory: Path) -> Path:
+    """在directory下生成可执行的Divine.exe替身"""
+    divine_exe = directory / "Divine.exe"
+    divine_exe.write_text(f"#!{sys.executable}\n" + STUB_SOURCE.read_text(encoding="utf-8"), encoding="utf-8")
+    divine_exe.chmod(0o755)
+    return divine_exe
+
+
+def make_zip_pak(pak_file: Path, files: dict) -> Path:
+    """生成替身能解包的pak(zip格式)"""
+    pak_file.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(pak_file, "w") as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+    return pak_file
+
+
+@unittest.skipIf(sys.platform == "win32", "替身脚本需要shebang执行")
+class ExtractPackagesTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_divine_test_"))
+        self.log_file = self.work_dir / "calls.log"
+        self.runner = DivineRunner(make_stub_divine(self.work_dir))
+        self.jobs = []
+        for name in ("RaceA", "RaceB", "RaceC"):
+            pak_file = make_zip_pak(self.work_dir / "paks" / f"{name}.pak", {f"Public/{name}/Races/Races.lsx": name})
+            self.jobs.append((str(pak_file), self.work_dir / "out" / name))
+        self.env = mock.patch.dict(os.environ, {"DIVINE_STUB_LOG": str(self.log_file)})
+        self.env.start()
+        for key in ("DIVINE_STUB_FAIL_BATCH", "DIVINE_STUB_SKIP", "DIVINE_STUB_DELAY", "DIVINE_STUB_FAIL_AFTER"):
+            os.environ.pop(key, None)
+    
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def calls(self) -> list:
+        if not self.log_file.exists():
+            return []
+        return [line.split("--action ")[1].split()[0] for line in self.log_file.read_text(encoding="utf-8").splitlines()]
+    
+    def assert_extracted(self, results: dict):
+        self.assertEqual(results, {pak_file: None for pak_file, _ in self.jobs})
+        for pak_file, extract_dir in self.jobs:
+            name = Path(pak_file).stem
+            self.assertEqual((extract_dir / "Public" / name / "Races" / "Races.lsx").read_text(), name)
+    
+    def test_batch_uses_one_call(self):
+        done = []
+        results = self.runner.extract_packages(self.jobs, on_done=lambda pak_file, error: done.append((pak_file, error)))
+        self.assert_extracted(results)
+        self.assertEqual(self.calls(), ["extract-packages"])
+        self.assertEqual(sorted(done), sorted((pak_file, None) for pak_file, _ in self.jobs))
+    
+    def test_batch_failure_falls_back_per_pak(self):
+        os.environ["DIVINE_STUB_FAIL_BATCH"] = "1"
+        results = self.runner.extract_packages(self.jobs)
+        self.assert_extracted(results)
+        self.assertEqual(self.calls(), ["extract-packages"] + ["extract-package"] * len(self.jobs))
+    
+    def test_missing_batch_output_retried_alone(self):
+        os.environ["DIVINE_STUB_SKIP"] = "RaceB"
+        results = self.runner.extract_packages(self.jobs)
+        self.assert_extracted(results)
+        self.assertEqual(self.calls(), ["extract-packages", "extract-package"])
+    
+    def test_duplicate_names_extracted_separately(self):
+        duplicate = make_zip_pak(self.work_dir / "other" / "RaceA.pak", {"Public/RaceA/Races/Races.lsx": "RaceA"})
+        self.jobs.append((str(duplicate), self.work_dir / "out" / "RaceA_2"))
+        results = self.runner.extract_packages(self.jobs)
+        self.assert_extracted(results)
+        self.assertEqual(self.calls(), ["extract-packages", "extract-package"])
+    
+    def test_paks_reported_while_batch_runs(self):
+        """前面的pak在批量进程结束前就交给调用方，解包和解析可以重叠"""
+        os.environ["DIVINE_STUB_DELAY"] = "0.5"
+        done = []
+        
+        def on_done(pak_file, error):
+            # 交出时文件夹已经完整
+            name = Path(pak_file).stem
+            extract_dir = dict(self.jobs)[pak_file]
+            self.assertEqual((extract_dir / "Public" / name / "Races" / "Races.lsx").read_text(), name)
+            done.append((pak_file, time.monotonic()))
+        
+        results = self.runner.extract_packages(self.jobs, on_done=on_done)
+        finished = time.monotonic()
+        self.assert_extracted(results)
+        self.assertEqual([pak_file for pak_file, _ in done], [pak_file for pak_file, _ in self.jobs])
+        self.assertLess(done[0][1], finished - 0.6)
+        self.assertEqual(self.calls(), ["extract-packages"])
+    
+    def test_batch_order_taken_from_disk(self):
+        """Divine不按jobs顺序解包、一轮检查中出现多个文件夹时，不交出可能还在写入的文件夹"""
+        done = []
+        
+        def fake_run(args, action, on_poll=None, poll_interval=None):
+            output_dir = Path(args[args.index("--destination") + 1])
+            
+            def write(name):
+                target = output_dir / name / "Public" / name / "Races"
+                target.mkdir(parents=True, exist_ok=True)
+                (target / "Races.lsx").write_text(name)
+            
+            # 第一轮: RaceC已完成，RaceB只建了文件夹
+            write("RaceC")
+            (output_dir / "RaceB" / "Public").mkdir(parents=True)
+            on_poll()
+            self.assertEqual(done, [])
+            # 第二轮: RaceB完成，RaceA开始
+            write("RaceB")
+            (output_dir / "RaceA" / "Public").mkdir(parents=True)
+            on_poll()
+            self.assertEqual(sorted(Path(pak_file).stem for pak_file in done), ["RaceB", "RaceC"])
+            write("RaceA")
+            return subprocess.CompletedProcess(args, 0, "", "")
+        
+        with mock.patch.object(self.runner, "run", side_effect=fake_run):
+            results = self.runner.extract_packages(self.jobs, on_done=lambda pak_file, error: done.append(pak_file))
+        self.assert_extracted(results)
+        self.assertEqual(Path(done[-1]).stem, "RaceA")
+    
+    def test_partial_batch_failure_retries_rest(self):
+        os.environ["DIVINE_STUB_DELAY"] = "0.5"
+        os.environ["DIVINE_STUB_FAIL_AFTER"] = "2"
+        results = self.runner.extract_packages(self.jobs)
+        self.assert_extracted(results)
+        # 第一个在运行中已完成，第二个不确定是否完整，和第三个一起重新解包
+        self.assertEqual(self.calls(), ["extract-packages", "extract-package", "extract-package"])
+    
+    def test_failed_pak_reported(self):
+        broken = self.work_dir / "paks" / "Broken.pak"
+        broken.write_bytes(b"not a pak")
+        os.environ["DIVINE_STUB_FAIL_BATCH"] = "1"
+        results = self.runner.extract_packages(self.jobs + [(str(broken), self.work_dir / "out" / "Broken")])
+        self.assertIn("Broken.pak", results.pop(str(broken)))
+        self.assert_extracted(results)
+
+
+if __name__ == "__main__":
+    unittest.main()
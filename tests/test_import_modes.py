@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+导入方式测试: 引用(.pakref)的原文件校验
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.import_modes import import_pak, resolve_pak_path, read_pak_ref, PakRefError
+from tests import support
+
+
+class PakRefTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_import_test_"))
+        self.source = self.work_dir / "downloads" / "RaceMod0.pak"
+        support.write_mod_pak(self.source, support.race_mod_files(0))
+        self.dest_dir = self.work_dir / "Sourcemod"
+        self.dest_dir.mkdir()
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_reference_resolves_to_source(self):
+        ref_file, method = import_pak(self.source, self.dest_dir, "reference")
+        self.assertEqual(method, "reference")
+        self.assertEqual(resolve_pak_path(ref_file), self.source.resolve())
+    
+    def test_touched_source_accepted_and_recorded(self):
+        ref_file, _ = import_pak(self.source, self.dest_dir, "reference")
+        stat = self.source.stat()
+        os.utime(self.source, (stat.st_atime, stat.st_mtime + 100))
+        self.assertEqual(resolve_pak_path(ref_file), self.source.resolve())
+        self.assertEqual(read_pak_ref(ref_file)["mtime"], self.source.stat().st_mtime)
+    
+    def test_replaced_source_rejected(self):
+        ref_file, _ = import_pak(self.source, self.dest_dir, "reference")
+        support.write_mod_pak(self.source, support.race_mod_files(1))
+        with self.assertRaisesRegex(PakRefError, "RaceMod0"):
+            resolve_pak_path(ref_file)
+    
+    def test_moved_source_rejected(self):
+        ref_file, _ = import_pak(self.source, self.dest_dir, "reference")
+        self.source.rename(self.source.with_name("Moved.pak"))
+        with self.assertRaisesRegex(PakRefError, "RaceMod0"):
+            resolve_pak_path(ref_file)
+    
+    def test_generation_fails_on_replaced_source(self):
+        """archive方式下生成时发现引用的原文件被替换，报错而不是使用新内容"""
+        app = support.make_app(self.work_dir / "app", {'pak_backend': "native", 'parse_mode': "archive",
+                                                       'import_mode': "reference"})
+        import_pak(self.source, app.sourcemod_dir, "reference")
+        appearance = support.write_mod_pak(self.work_dir / "downloads" / "AppMod0.pak", support.appearance_mod_files(0, 2))
+        import_pak(appearance, app.panagway_dir, "reference")
+        self.assertEqual(support.generate(app)[-1]['type'], "complete")
+        
+        support.write_mod_pak(self.source, support.race_mod_files(1))
+        messages = support.generate(app)
+        self.assertEqual(messages[-1]['type'], "error")
+        self.assertIn("RaceMod0", messages[-1]['text'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+内存预算模式测试: 临时文件并发写入和清理、count分片输出、大矩阵的内存峰值
+"""
+
+import re
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import subprocess
+from pathlib import Path
+
+from src.spill import spill_text
+from src.profiler import peak_memory_bytes
+from tests import support
+
+
+class SpillTextTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_spill_test_"))
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_concurrent_writes_of_same_content(self):
+        text = "外观" * 100000
+        barrier = threading.Barrier(8)
+        results = []
+        errors = []
+        
+        def worker():
+            barrier.wait()
+            try:
+                results.append(spill_text(self.work_dir, text))
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(results[0][0].read_text(encoding="utf-8"), text)
+        # 没有留下临时文件
+        self.assertEqual([path.name for path in self.work_dir.iterdir()], [results[0][0].name])
+
+
+def node_sequence(lsx_files: list) -> list:
+    """输出中的(RaceUUID, VisualResource)顺序"""
+    pattern = re.compile(r'id="RaceUUID" type="guid" value="([^"]+)"[\s\S]*?id="VisualResource" type="guid" value="([^"]+)"')
+    return [match.groups() for lsx_file in lsx_files for match in pattern.finditer(lsx_file.read_text(encoding="utf-8"))]
+
+
+class BudgetGenerationTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_budget_test_"))
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def make_app(self, name: str, settings: dict):
+        settings = dict({'pak_backend': "native", 'parse_mode': "archive"}, **settings)
+        app = support.make_app(self.work_dir / name, settings)
+        for index in range(3):
+            support.write_mod_pak(app.sourcemod_dir / f"RaceMod{index}.pak", support.race_mod_files(index))
+        for index in range(2):
+            support.write_mod_pak(app.panagway_dir / f"AppMod{index}.pak", support.appearance_mod_files(index, 5))
+        return app
+    
+    def test_spill_pruned_after_generation(self):
+        """生成后只保留解析缓存引用的内容文件，预估和再次生成不重新解析"""
+        app = self.make_app("app", {'memory_budget_mb': 16})
+        spill_dir = app.temp_dir / "spill"
+        # 上次异常退出留下的文件
+        spill_dir.mkdir(parents=True)
+        (spill_dir / "stale.lsx").write_text("")
+        
+        scans = []
+        scan_appearance = app._scan_appearance_folder
+        app._scan_appearance_folder = lambda folder: scans.append(folder.name) or scan_appearance(folder)
+        for _ in range(2):
+            messages = support.generate(app)
+            self.assertEqual(messages[-1]['type'], "complete", messages)
+            self.assertEqual(len(node_sequence(support.output_lsx_files(app))), 3 * 2 * 5)
+            spilled = sorted(path.name for path in spill_dir.iterdir())
+            self.assertEqual(len(spilled), 2)
+            self.assertTrue(all(name.endswith(".lsx") and name != "stale.lsx" for name in spilled))
+            self.assertEqual(app.plan_build()['total_nodes'], 3 * 2 * 5)
+            self.assertEqual(sorted(path.name for path in spill_dir.iterdir()), spilled)
+        self.assertEqual(sorted(scans), ["AppMod0", "AppMod1"])
+    
+    def test_count_shards_match_budget_mode(self):
+        """不限内存时count分片并发写入，文件和节点顺序与内存预算模式相同"""
+        outputs = []
+        for name, budget in (("parallel", 0), ("budget", 16)):
+            app = self.make_app(name, {'memory_budget_mb': budget, 'output_shard_mode': "count",
+                                       'output_shard_max_nodes': 7})
+            messages = support.generate(app)
+            self.assertEqual(messages[-1]['type'], "complete", messages)
+            lsx_files = support.output_lsx_files(app)
+            outputs.append(([lsx_file.name for lsx_file in lsx_files], node_sequence(lsx_files)))
+        
+        self.assertEqual(outputs[0], outputs[1])
+        file_names, nodes = outputs[0]
+        self.assertEqual(len(nodes), 3 * 2 * 5)
+        self.assertEqual(len(file_names), 5)
+        self.assertEqual(file_names[0], "CharacterCreationAppearanceVisuals_001.lsx")
+
+
+@unittest.skipIf(peak_memory_bytes() is None, "无法获取进程内存峰值")
+class MemoryBudgetBenchmarkTest(unittest.TestCase):
+    
+    def test_peak_within_budget(self):
+        """输出大于预算时，新进程中生成的内存峰值不超过预算"""
+        budget_mb = 48
+        for shard_mode in ("race", "count"):
+            process = subprocess.run([sys.executable, "-m", "tests.bench_memory_budget", "--budget-mb", str(budget_mb),
+                                      "--mods", "4", "--nodes", "300", "--races", "60", "--shard-mode", shard_mode],
+                                     cwd=str(support.REPO_DIR), capture_output=True, text=True, timeout=300)
+            self.assertEqual(process.returncode, 0, process.stdout + process.stderr)
+            result = json.loads(process.stdout.splitlines()[-1])
+            self.assertGreater(result['output_mb'], budget_mb)
+            self.assertLessEqual(result['peak_mb'], budget_mb)
+
+
+if __name__ == "__main__":
+    unittest.main()
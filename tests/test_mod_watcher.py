@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+目录变化处理测试: 任务状态、临时文件过滤、重新索引出错、解包文件夹内部修改、直接放入的pak
+"""
+
+import queue
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src import dir_watcher
+from src.dir_watcher import DirWatcher
+from tests import support
+
+
+def _run_now(ms, func=None, *args):
+    """root.after(0, ...)立即执行"""
+    if ms == 0:
+        func(*args)
+
+
+class DirWatcherTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_dir_watcher_test_"))
+        self.mod_dir = self.work_dir / "AppMod0" / "Public" / "AppMod0"
+        self.mod_dir.mkdir(parents=True)
+        (self.mod_dir / "a.lsx").write_text("old")
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def _watch_nested_changes(self):
+        events = queue.Queue()
+        watcher = DirWatcher([self.work_dir], events.put, poll_interval=0.05, debounce=0.05)
+        backend = watcher.start()
+        try:
+            # 修改已有子文件夹中的文件
+            (self.mod_dir / "a.lsx").write_text("new content")
+            self.assertEqual(events.get(timeout=5), [self.work_dir / "AppMod0"])
+            # 启动后新建的子文件夹
+            new_dir = self.work_dir / "AppMod1" / "Public"
+            new_dir.mkdir(parents=True)
+            self.assertEqual(events.get(timeout=5), [self.work_dir / "AppMod1"])
+            time.sleep(0.2)
+            (new_dir / "b.lsx").write_text("b")
+            self.assertEqual(events.get(timeout=5), [self.work_dir / "AppMod1"])
+        finally:
+            watcher.stop()
+        return backend
+    
+    def test_nested_change_inotify(self):
+        if dir_watcher._load_inotify() is None:
+            self.skipTest("inotify不可用")
+        self.assertEqual(self._watch_nested_changes(), "inotify")
+    
+    def test_nested_change_polling(self):
+        with mock.patch.object(dir_watcher, "_load_inotify", return_value=None):
+            self.assertEqual(self._watch_nested_changes(), "polling")
+
+
+class ModWatcherTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_watch_test_"))
+        self.app = support.make_app(self.work_dir)
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_file_error_keeps_task_running(self):
+        self.app.is_task_running = True
+        self.app.task_queue.put({'type': 'error', 'text': "处理文件 A.pak 失败"})
+        self.app.process_task_queue()
+        self.assertTrue(self.app.is_task_running)
+        
+        self.app.task_queue.put({'type': 'error', 'subtype': 'import_files', 'text': "导入失败"})
+        self.app.process_task_queue()
+        self.assertFalse(self.app.is_task_running)
+    
+    def test_changes_wait_for_running_task(self):
+        self.app.is_task_running = True
+        path = str(self.app.panagway_dir / "AppMod0.pak")
+        with mock.patch.object(self.app, "reindex_mod_paths") as reindex:
+            self.app.task_queue.put({'type': 'mod_folder_changed', 'paths': [path]})
+            self.app.process_task_queue()
+            reindex.assert_not_called()
+            self.app.is_task_running = False
+            self.app.process_task_queue()
+            reindex.assert_called_once_with({path})
+    
+    def test_temporary_entries_ignored(self):
+        temp_files = [self.app.panagway_dir / "AppMod0.pak.part", self.app.panagway_dir / "AppMod0.pak.blobtmp",
+                      self.app.sourcemod_dir / "RaceMod0.pak.part"]
+        for temp_file in temp_files:
+            temp_file.write_bytes(b"")
+        # 写完后临时文件已经被改名或删除
+        temp_files.append(self.app.panagway_dir / "AppMod1.pak.part")
+        (self.app.panagway_dir / "notes.txt").write_text("")
+        temp_files.append(self.app.panagway_dir / "notes.txt")
+        
+        with mock.patch.object(self.app, "_reindex_appearance_mod") as reindex_mod:
+            self.app.reindex_mod_paths([str(path) for path in temp_files])
+        reindex_mod.assert_not_called()
+        self.assertEqual(self.app.selected_race_paks, [])
+        self.assertEqual(self.app.selected_appearance_paks, [])
+    
+    def test_reindex_error_does_not_break_queue(self):
+        self.app.task_queue.put({'type': 'mod_folder_changed', 'paths': [str(self.app.panagway_dir / "AppMod0")]})
+        self.app.task_queue.put({'type': 'progress', 'value': 10, 'text': "下一条消息"})
+        with mock.patch.object(self.app, "reindex_mod_paths", side_effect=OSError("busy")), \
+                mock.patch.object(self.app.root, "after") as after:
+            self.app.process_task_queue()
+        self.assertEqual(self.app.progress_var.get(), "下一条消息")
+        after.assert_called_once()
+
+
+
+class ModFolderChangeTest(unittest.TestCase):
+    """不替换reindex_mod_paths，从目录变化一直走到解析结果"""
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_watch_reindex_test_"))
+        self.app = support.make_app(self.work_dir, {'pak_backend': "native", 'parse_mode': "extract",
+                                                    'watch_mod_folders': False, 'watch_poll_interval': 0.05})
+        self.pak_file = self.app.panagway_dir / "AppMod0.pak"
+    
+    def tearDown(self):
+        if self.app.mod_watcher:
+            self.app.mod_watcher.stop()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def _drop_pak(self):
+        """在别处写好pak再移入Panagway，和用户复制文件一样"""
+        pak_file = support.write_mod_pak(self.work_dir / "build" / "AppMod0.pak", support.appearance_mod_files(0, 2))
+        shutil.move(str(pak_file), str(self.pak_file))
+    
+    def test_nested_edit_reindexes(self):
+        self._drop_pak()
+        extract_dir = self.app.panagway_dir / "AppMod0"
+        for name, data in support.appearance_mod_files(0, 2).items():
+            (extract_dir / name).parent.mkdir(parents=True, exist_ok=True)
+            (extract_dir / name).write_bytes(data)
+        self.app.refresh_pak_lists()
+        self.assertEqual(sorted(self.app.appearance_vanilla_races[str(self.pak_file)]), sorted([support.HUMAN_UUID, support.ELF_UUID]))
+        
+        self.app.settings['watch_mod_folders'] = True
+        self.app.start_mod_watcher()
+        # 只改解包文件夹深处的lsx，去掉精灵外观
+        lsx_file = extract_dir / next(iter(support.appearance_mod_files(0, 2)))
+        lsx_file.write_text(support.appearance_lsx([support.appearance_node(support.HUMAN_UUID, "00000000-0000-0000-0000-000000000001")]), encoding="utf-8")
+        message = self.app.task_queue.get(timeout=5)
+        self.assertEqual(message['type'], 'mod_folder_changed')
+        self.assertEqual(message['paths'], [extract_dir])
+        self.app.task_queue.put(message)
+        with mock.patch.object(self.app.root, "after"):
+            self.app.process_task_queue()
+        self.assertEqual(self.app.appearance_vanilla_races[str(self.pak_file)], [support.HUMAN_UUID])
+    
+    def test_dropped_pak_extracted_and_parsed(self):
+        self._drop_pak()
+        with mock.patch.object(self.app.root, "after", side_effect=_run_now):
+            self.app.reindex_mod_paths([str(self.pak_file)])
+            self.assertTrue(self.app.is_task_running)
+            self.app.current_task_thread.join(30)
+            self.app.process_task_queue()
+        self.assertFalse(self.app.is_task_running)
+        self.assertTrue((self.app.panagway_dir / "AppMod0" / "Public").is_dir())
+        self.assertIn(str(self.pak_file), self.app.selected_appearance_paks)
+        self.assertEqual(sorted(self.app.appearance_vanilla_races[str(self.pak_file)]), sorted([support.HUMAN_UUID, support.ELF_UUID]))
+        
+        # 解包后再次收到同一个pak的变化不重复解包
+        self.app.reindex_mod_paths([str(self.pak_file)])
+        self.assertFalse(self.app.is_task_running)
+    
+    def test_dropped_pak_waits_for_running_task(self):
+        self._drop_pak()
+        self.app.is_task_running = True
+        self.app.reindex_mod_paths([str(self.pak_file)])
+        self.assertEqual(self.app.pending_mod_changes, {str(self.pak_file)})
+
+
+if __name__ == "__main__":
+    unittest.main()
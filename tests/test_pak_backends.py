@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+pak后端测试: FakeBackend驱动完整的导入、生成流程，NativeBackend读写往返
+"""
+
+import re
+import shutil
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.pak_backends import FakeBackend, NativeBackend, DivineBackend, create_pak_backend
+from tests import support
+
+
+class FakeBackendTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_backend_test_"))
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_extract_many_reports_each_pak(self):
+        backend = FakeBackend()
+        backend.add_pak("A.pak", {"Public/A/a.lsx": b"a"})
+        done = []
+        results = backend.extract_many([("A.pak", self.work_dir / "A"), ("Missing.pak", self.work_dir / "Missing")],
+                                       on_done=lambda pak_file, error: done.append(pak_file))
+        self.assertIsNone(results["A.pak"])
+        self.assertIn("Missing.pak", results["Missing.pak"])
+        self.assertEqual(done, ["A.pak", "Missing.pak"])
+        self.assertEqual((self.work_dir / "A" / "Public" / "A" / "a.lsx").read_bytes(), b"a")
+    
+    def test_import_and_generate(self):
+        """导入、解包、生成、打包都经过FakeBackend，不需要Divine.exe"""
+        app = support.make_app(self.work_dir)
+        backend = FakeBackend(app.logger)
+        app.pak_backend = backend
+        
+        # 源文件只是占位，内容按导入后的路径注册
+        sources = []
+        for index in range(2):
+            sources.append(("种族", app.sourcemod_dir, self.work_dir / "downloads" / f"RaceMod{index}.pak", support.race_mod_files(index)))
+        for index in range(3):
+            sources.append(("外观", app.panagway_dir, self.work_dir / "downloads" / f"AppMod{index}.pak", support.appearance_mod_files(index, 4)))
+        for file_type, dest_dir, source_file, files in sources:
+            source_file.parent.mkdir(parents=True, exist_ok=True)
+            source_file.write_bytes(b"FAKE")
+            backend.add_pak(dest_dir / source_file.name, files)
+        
+        for file_type, dest_dir in (("种族", app.sourcemod_dir), ("外观", app.panagway_dir)):
+            files = [str(source_file) for kind, _, source_file, _ in sources if kind == file_type]
+            app._import_and_extract_files_async(files, dest_dir, file_type)
+            messages = support.drain(app)
+            self.assertEqual(messages[-1]['type'], "complete", messages)
+        self.assertEqual(sorted(call for call, _ in backend.calls), ["extract"] * 5)
+        
+        messages = support.generate(app)
+        self.assertEqual(messages[-1]['type'], "complete", messages)
+        
+        # 输出pak在内存中: 每个外观MOD的4个人类外观 x 2个种族
+        mod_name = app.patch_info['mod_name']
+        packed = [files for pak_file, files in backend.paks.items() if Path(pak_file).name == f"{mod_name}.pak"]
+        self.assertEqual(len(packed), 1)
+        lsx = packed[0][f"Public/{mod_name}/CharacterCreation/CharacterCreationAppearanceVisuals.lsx"].decode("utf-8")
+        race_uuids = re.findall(r'id="RaceUUID" type="guid" value="([^"]+)"', lsx)
+        self.assertEqual(len(race_uuids), 3 * 4 * 2)
+        self.assertEqual(set(race_uuids), {info['uuid'] for info in app.race_data.values()})
+
+
+class NativeBackendTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_backend_test_"))
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_pack_extract_round_trip(self):
+        files = support.appearance_mod_files(0, 3)
+        files.update(support.race_mod_files(0))
+        pak_file = support.write_mod_pak(self.work_dir / "Mod.pak", files)
+        
+        backend = NativeBackend()
+        self.assertEqual(sorted(backend.list_files(pak_file)), sorted(files))
+        backend.extract(pak_file, self.work_dir / "out")
+        for name, data in files.items():
+            self.assertEqual((self.work_dir / "out" / name).read_bytes(), data)
+
+
+class CreateBackendTest(unittest.TestCase):
+    
+    def test_selectable_backends(self):
+        logger = logging.getLogger("bg3_cc.test")
+        self.assertIsInstance(create_pak_backend({'pak_backend': "native"}, Path("Divine.exe"), logger), NativeBackend)
+        backend = create_pak_backend({'pak_backend': "divine", 'divine_batch_extract': False}, Path("Divine.exe"), logger)
+        self.assertIsInstance(backend, DivineBackend)
+        self.assertFalse(backend.batch_extract)
+        # fake需要先注册内容，不能在设置中选择
+        with self.assertLogs(logger, "WARNING"):
+            self.assertIsInstance(create_pak_backend({'pak_backend': "fake"}, Path("Divine.exe"), logger), DivineBackend)
+
+
+class BackendCheckTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_backend_test_"))
+        self.app = support.make_app(self.work_dir, {'pak_backend': "native"})
+        self.app.selected_race_paks = ["RaceMod0.pak"]
+        self.app.selected_appearance_paks = ["AppMod0.pak"]
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def check_error(self) -> str:
+        """生成时显示的错误信息，同时确认没有开始任务"""
+        with mock.patch.object(self.app.ui_manager, "show_error_message", create=True) as show_error, \
+                mock.patch.object(self.app, "_start_build_plan") as start:
+            self.app.generate_compatibility()
+        start.assert_not_called()
+        show_error.assert_called_once()
+        return show_error.call_args.args[1]
+    
+    def test_native_backend_error_shown(self):
+        with mock.patch.object(NativeBackend, "check", return_value="无法写入pak: 磁盘已满"):
+            self.assertEqual(self.check_error(), "无法写入pak: 磁盘已满")
+    
+    def test_missing_divine_reported(self):
+        self.app.pak_backend = DivineBackend(self.work_dir / "Missing" / "Divine.exe")
+        self.assertIn("Divine.exe", self.check_error())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+pak虚拟文件系统测试: 用src/lspk.py写出的pak列出、读取文件，缺失的条目
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path, PurePosixPath
+
+from src.pak_vfs import PakFileSystem, PakMounts
+from tests import support
+
+
+class PakPathTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_vfs_test_"))
+        self.files = support.race_mod_files(0)
+        self.files.update(support.appearance_mod_files(0, 2))
+        self.files["Mods/RaceMod0/meta.lsx"] = "元数据".encode("utf-8")
+        self.pak_file = support.write_mod_pak(self.work_dir / "RaceMod0.pak", self.files)
+        self.root = PakFileSystem(self.pak_file, cache_bytes=1024 * 1024).root()
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_listing(self):
+        self.assertEqual(self.root.name, "RaceMod0")
+        self.assertEqual([child.name for child in self.root.iterdir()], ["Mods", "Public"])
+        self.assertEqual(sorted(str(path.relative_to(self.root)) for path in self.root.rglob("*.lsx")), sorted(self.files))
+        self.assertEqual([path.name for path in (self.root / "Public").glob("App*")], ["AppMod0"])
+        
+        races = self.root / "Public" / "RaceMod0" / "Races"
+        self.assertTrue(races.is_dir())
+        self.assertFalse(races.is_file())
+        self.assertEqual(races.relative_to(self.root / "Public"), PurePosixPath("RaceMod0/Races"))
+        self.assertEqual(races.parent.parent, self.root / "Public")
+        with self.assertRaises(ValueError):
+            races.relative_to(self.root / "Mods")
+    
+    def test_reading(self):
+        for name, data in self.files.items():
+            path = self.root / name
+            self.assertTrue(path.is_file())
+            self.assertEqual(path.read_bytes(), data)
+            self.assertEqual(path.stat_size(), len(data))
+        meta = self.root / "Mods" / "RaceMod0" / "meta.lsx"
+        self.assertEqual(meta.read_text(encoding="utf-8"), "元数据")
+        with meta.open(encoding="utf-8") as f:
+            self.assertEqual(f.read(), "元数据")
+        with self.assertRaises(PermissionError):
+            meta.open("w")
+        # 第二次读取来自缓存
+        self.assertGreaterEqual(self.root.fs.cache_hits, 1)
+    
+    def test_missing_entry(self):
+        missing = self.root / "Public" / "RaceMod0" / "Missing.lsx"
+        self.assertFalse(missing.exists())
+        self.assertFalse(missing.is_file())
+        with self.assertRaises(FileNotFoundError):
+            missing.read_bytes()
+        with self.assertRaises(NotADirectoryError):
+            list(missing.iterdir())
+        self.assertFalse((self.root / "Nowhere").exists())
+    
+    def test_mounts_reopen_changed_pak(self):
+        mounts = PakMounts()
+        root = mounts.root(self.pak_file)
+        self.assertIs(mounts.root(self.pak_file).fs, root.fs)
+        support.write_mod_pak(self.pak_file, support.race_mod_files(1))
+        reopened = mounts.root(self.pak_file)
+        self.assertIsNot(reopened.fs, root.fs)
+        self.assertTrue((reopened / "Public" / "RaceMod1" / "Races" / "Races.lsx").is_file())
+
+
+if __name__ == "__main__":
+    unittest.main()
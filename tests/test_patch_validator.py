@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+补丁校验测试: RaceUUID范围检查，没有种族数据时保留原版种族
+"""
+
+import re
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.patch_validator import PatchValidator
+from tests import support
+
+
+def write_patch_lsx(lsx_file: Path, race_uuid: str) -> Path:
+    """写一个带正确IconIdOverride的外观配置"""
+    node = support.appearance_node(race_uuid, "11111111-2222-3333-4444-555555555555")
+    node = node.replace('                </node>', '                    <attribute id="IconIdOverride" type="FixedString" '
+                        'value="1_Hair_11111111-2222-3333-4444-555555555555"/>\n                </node>')
+    lsx_file.parent.mkdir(parents=True, exist_ok=True)
+    lsx_file.write_text(support.appearance_lsx([node]), encoding="utf-8")
+    return lsx_file
+
+
+class PatchValidatorTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_validate_test_"))
+        self.lsx_file = write_patch_lsx(self.work_dir / "CharacterCreationAppearanceVisuals.lsx", support.HUMAN_UUID)
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_race_outside_mods_rejected(self):
+        validator = PatchValidator([support.ELF_UUID])
+        problems = validator.validate_files([self.lsx_file])
+        self.assertEqual(len(problems), 1)
+        self.assertIn("RaceUUID", problems[0])
+    
+    def test_vanilla_race_accepted_without_race_list(self):
+        validator = PatchValidator(None)
+        self.assertEqual(validator.validate_files([self.lsx_file]), [])
+        self.assertEqual(validator.nodes_checked, 1)
+    
+    def test_generate_without_races_keeps_vanilla(self):
+        """种族MOD中没有种族时，按生成按钮的流程生成并通过校验，节点保留原版种族"""
+        app = support.make_app(self.work_dir / "app", {'pak_backend': "native", 'parse_mode': "archive"})
+        support.write_mod_pak(app.sourcemod_dir / "EmptyRaceMod.pak", {"Mods/EmptyRaceMod/meta.lsx": b"<save/>"})
+        support.write_mod_pak(app.panagway_dir / "AppMod0.pak", support.appearance_mod_files(0, 3))
+        app.refresh_pak_lists()
+        for pak_file in app.selected_appearance_paks:
+            app.appearance_race_selections[pak_file] = support.HUMAN_UUID
+        
+        messages = support.click_generate(app)
+        self.assertEqual(messages[-1]['type'], "complete", messages)
+        self.assertEqual(app.race_data, {})
+        lsx = "".join(lsx_file.read_text(encoding="utf-8") for lsx_file in support.output_lsx_files(app))
+        race_uuids = re.findall(r'id="RaceUUID" type="guid" value="([^"]+)"', lsx)
+        self.assertEqual(race_uuids, [support.HUMAN_UUID] * 3)
+        
+    def test_generate_checks_race_range(self):
+        app = support.make_app(self.work_dir / "app", {'pak_backend': "native", 'parse_mode': "archive"})
+        support.write_mod_pak(app.sourcemod_dir / "RaceMod0.pak", support.race_mod_files(0))
+        support.write_mod_pak(app.panagway_dir / "AppMod0.pak", support.appearance_mod_files(0, 3))
+        app.refresh_pak_lists()
+        for pak_file in app.selected_appearance_paks:
+            app.appearance_race_selections[pak_file] = support.HUMAN_UUID
+        self.assertEqual(support.click_generate(app)[-1]['type'], "complete")
+        
+        # 输出中混入不是种族MOD的种族时校验失败
+        app.race_data = {"Other": {'uuid': support.ELF_UUID}}
+        with self.assertRaisesRegex(Exception, "RaceUUID"):
+            app.validate_patch()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+性能统计测试: 阶段计数、工作线程的cProfile、日志滚动
+"""
+
+import sys
+import pstats
+import shutil
+import logging
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from src.profiler import BuildProfiler, setup_build_logger, format_stats, LOGGER_NAME
+
+
+def _worker_marker(count: int) -> int:
+    """只在工作线程中调用，用来在cProfile结果中查找"""
+    return sum(range(count))
+
+
+class BuildProfilerTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.log_dir = Path(tempfile.mkdtemp(prefix="bg3_profiler_test_"))
+        self.profiler = BuildProfiler(logging.getLogger("bg3_cc.test"), self.log_dir)
+    
+    def tearDown(self):
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+    
+    def test_stage_counters_accumulate(self):
+        self.profiler.begin("generate")
+        for _ in range(2):
+            with self.profiler.stage("parse"):
+                self.profiler.count("parse", files_scanned=2, bytes_read=100)
+        result = self.profiler.finish()
+        parse = result['stages'][0]
+        self.assertEqual((parse['name'], parse['calls'], parse['files_scanned'], parse['bytes_read']), ("parse", 2, 4, 200))
+        self.assertEqual(self.profiler.load_last_stats()['stages'], result['stages'])
+        self.assertEqual(len(self.profiler.load_history("generate")), 1)
+        # 没有任务时不计数
+        self.profiler.count("parse", files_scanned=1)
+    
+    def test_cprofile_includes_worker_threads(self):
+        self.profiler.begin("generate", enable_cprofile=True)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(_worker_marker, [1000] * 4))
+        thread = threading.Thread(target=_worker_marker, args=(1000,))
+        thread.start()
+        thread.join()
+        result = self.profiler.finish()
+        
+        stats = pstats.Stats(result['profile_file'])
+        calls = sum(stat[1] for (file_name, line, function), stat in stats.stats.items() if function == "_worker_marker")
+        self.assertEqual(calls, 5)
+        if sys.version_info < (3, 12):
+            self.assertGreaterEqual(result['profile_threads'], 3)
+            self.assertIn("个线程", format_stats(result)[-1])
+        # 结束后新线程不再被统计
+        self.assertIsNone(threading._profile_hook)
+
+
+class BuildLoggerTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.log_dir = Path(tempfile.mkdtemp(prefix="bg3_logger_test_"))
+        # setup_build_logger只在没有handler时添加，先移走其他测试的handler
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self.saved_handlers = list(self.logger.handlers)
+        for handler in self.saved_handlers:
+            self.logger.removeHandler(handler)
+    
+    def tearDown(self):
+        for handler in list(self.logger.handlers):
+            handler.close()
+            self.logger.removeHandler(handler)
+        for handler in self.saved_handlers:
+            self.logger.addHandler(handler)
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+    
+    def test_log_rotates(self):
+        logger = setup_build_logger(self.log_dir, max_bytes=500, backup_count=2)
+        self.assertIs(setup_build_logger(self.log_dir), logger)
+        self.assertEqual(len(logger.handlers), 1)
+        for index in range(100):
+            logger.info("第 %d 行日志 %s", index, "x" * 40)
+        log_files = sorted(path.name for path in self.log_dir.iterdir())
+        self.assertEqual(log_files, ["build.log", "build.log.1", "build.log.2"])
+        self.assertLess((self.log_dir / "build.log").stat().st_size, 1000)
+        self.assertIn("第 99 行日志", (self.log_dir / "build.log").read_text(encoding="utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
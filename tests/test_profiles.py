@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+配置测试: 新建配置在后台线程中放进存储，设置文件只保存改过的项
+"""
+
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.settings import DEFAULT_SETTINGS, load_settings, save_settings
+from tests import support
+
+
+class CreateProfileTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_profile_test_"))
+        self.app = support.make_app(self.work_dir, {'watch_mod_folders': False})
+        extract_dir = self.app.panagway_dir / "AppMod0"
+        for name, data in support.appearance_mod_files(0, 2).items():
+            (extract_dir / name).parent.mkdir(parents=True, exist_ok=True)
+            (extract_dir / name).write_bytes(data)
+        (self.app.panagway_dir / "AppMod0.pak").write_bytes(b"PAK0")
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_ingest_runs_on_task_thread(self):
+        ingest_threads = []
+        ingest_tree = self.app.blob_store.ingest_tree
+        
+        def record_ingest(directory):
+            ingest_threads.append(threading.current_thread())
+            return ingest_tree(directory)
+        
+        with mock.patch.object(self.app.blob_store, "ingest_tree", side_effect=record_ingest):
+            self.app.create_new_profile("Second")
+            self.assertTrue(self.app.is_task_running)
+            self.app.current_task_thread.join(10)
+        self.assertTrue(ingest_threads)
+        self.assertTrue(all(thread is not threading.main_thread() for thread in ingest_threads))
+        # 切换在处理完成消息时进行
+        self.assertEqual(self.app.active_profile, "default")
+        self.app.process_task_queue()
+        self.assertFalse(self.app.is_task_running)
+        self.assertEqual(self.app.active_profile, "Second")
+        self.assertTrue((self.app.panagway_dir / "AppMod0" / "Public").is_dir())
+    
+    def test_invalid_name_reports_error(self):
+        with mock.patch.object(self.app.ui_manager, "show_error_message", create=True) as show_error:
+            self.app.create_new_profile("bad/name")
+            self.app.current_task_thread.join(10)
+            self.app.process_task_queue()
+        show_error.assert_called_once()
+        self.assertFalse(self.app.is_task_running)
+        self.assertEqual(self.app.active_profile, "default")
+
+
+class SaveSettingsTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_settings_test_"))
+        self.settings_file = self.work_dir / "settings.json"
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_only_changed_values_saved(self):
+        settings = load_settings(self.settings_file)
+        settings['active_profile'] = "Second"
+        settings['custom_key'] = 1
+        save_settings(self.settings_file, settings)
+        saved = json.loads(self.settings_file.read_text(encoding='utf-8'))
+        self.assertEqual(saved, {'active_profile': "Second", 'custom_key': 1})
+        self.assertEqual(load_settings(self.settings_file), dict(DEFAULT_SETTINGS, active_profile="Second", custom_key=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+分片输出测试: 种族分片在输入不变时复用、未知分片方式、流式写入切分
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.lsx_output import write_lsx_node_stream, LSX_HEADER, LSX_FOOTER
+from tests import support
+
+
+class RaceShardReuseTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_shard_test_"))
+        self.app = support.make_app(self.work_dir, {'pak_backend': "native", 'parse_mode': "archive",
+                                                    'output_shard_mode': "race"})
+        for index in range(2):
+            support.write_mod_pak(self.app.sourcemod_dir / f"RaceMod{index}.pak", support.race_mod_files(index))
+        support.write_mod_pak(self.app.panagway_dir / "AppMod0.pak", support.appearance_mod_files(0, 3))
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def snapshot(self) -> dict:
+        """{文件名: 内容}，节点UUID每次生成都不同，内容相同说明文件没有重写"""
+        messages = support.generate(self.app)
+        self.assertEqual(messages[-1]['type'], "complete", messages)
+        return {lsx_file.name: lsx_file.read_text(encoding="utf-8") for lsx_file in support.output_lsx_files(self.app)}
+    
+    def test_unchanged_shards_reused(self):
+        first = self.snapshot()
+        self.assertEqual(len(first), 2)
+        with self.assertLogs(self.app.logger, "INFO") as logs:
+            second = self.snapshot()
+        self.assertEqual(second, first)
+        self.assertTrue(any("写入 0 个，复用 2 个" in line for line in logs.output))
+        
+        # 新增种族只写新的分片
+        support.write_mod_pak(self.app.sourcemod_dir / "RaceMod2.pak", support.race_mod_files(2))
+        third = self.snapshot()
+        self.assertEqual(len(third), 3)
+        self.assertEqual({name: third[name] for name in first}, first)
+        
+        # 删除种族后删除它的分片
+        (self.app.sourcemod_dir / "RaceMod0.pak").unlink()
+        fourth = self.snapshot()
+        self.assertEqual(len(fourth), 2)
+        self.assertEqual(fourth, {name: content for name, content in third.items() if name in fourth})
+    
+    def test_changed_appearance_rewrites_shards(self):
+        first = self.snapshot()
+        support.write_mod_pak(self.app.panagway_dir / "AppMod0.pak", support.appearance_mod_files(0, 4))
+        second = self.snapshot()
+        self.assertEqual(sorted(second), sorted(first))
+        for name in first:
+            self.assertNotEqual(second[name], first[name])
+    
+    def test_unknown_shard_mode_falls_back(self):
+        self.app.settings['output_shard_mode'] = "per_mod"
+        with self.assertLogs(self.app.logger, "WARNING") as logs:
+            files = self.snapshot()
+        self.assertEqual(list(files), ["CharacterCreationAppearanceVisuals.lsx"])
+        self.assertTrue(any("per_mod" in line for line in logs.output))
+
+
+class NodeStreamTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_stream_test_"))
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def test_split_by_node_count(self):
+        output_files = (self.work_dir / f"part{i}.lsx" for i in range(10))
+        nodes = (f"<node{i}/>" for i in range(5))
+        written = write_lsx_node_stream(output_files, nodes, 2, 64 * 1024)
+        self.assertEqual([(output.name, count) for output, count, _ in written], [("part0.lsx", 2), ("part1.lsx", 2), ("part2.lsx", 1)])
+        self.assertEqual((self.work_dir / "part2.lsx").read_text(encoding="utf-8"), LSX_HEADER + "\n<node4/>" + LSX_FOOTER)
+        self.assertEqual(sum(size for _, _, size in written), sum(path.stat().st_size for path in self.work_dir.iterdir()))
+    
+    def test_no_nodes_no_file(self):
+        self.assertEqual(write_lsx_node_stream([self.work_dir / "empty.lsx"], [], 0), [])
+        self.assertFalse((self.work_dir / "empty.lsx").exists())
+    
+    def test_too_few_files(self):
+        with self.assertRaises(ValueError):
+            write_lsx_node_stream([self.work_dir / "only.lsx"], ["<a/>", "<b/>"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
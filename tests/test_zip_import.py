@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+zip发布包导入测试: info.json中的MD5、__MACOSX、重名的pak
+"""
+
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from src.zip_import import import_zip_pak, list_zip_paks, PART_SUFFIX
+from tests import support
+
+
+class ZipImportTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix="bg3_zip_test_"))
+        self.pak_data = support.write_mod_pak(self.work_dir / "src" / "RaceMod0.pak", support.race_mod_files(0)).read_bytes()
+        self.dest_dir = self.work_dir / "Sourcemod"
+        self.dest_dir.mkdir()
+        self.logger = logging.getLogger("bg3_cc.test")
+    
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def make_zip(self, members: dict, md5: str = None) -> Path:
+        """members为{成员名: 内容}，md5不为空时写info.json"""
+        zip_file = self.work_dir / "RaceMod0.zip"
+        with zipfile.ZipFile(zip_file, "w") as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+            if md5 is not None:
+                info = {"mods": [{"UUID": "x", "folderName": "Other", "version": "1", "MD5": md5}]}
+                zf.writestr("info.json", json.dumps(info))
+        return zip_file
+    
+    def test_matching_md5(self):
+        zip_file = self.make_zip({"RaceMod0.pak": self.pak_data}, hashlib.md5(self.pak_data).hexdigest().upper())
+        with self.assertNoLogs(self.logger, "WARNING"):
+            dest, method = import_zip_pak(zip_file, "RaceMod0.pak", self.dest_dir, self.logger)
+        self.assertEqual((dest.read_bytes(), method), (self.pak_data, "zip"))
+    
+    def test_stale_md5_imported_with_warning(self):
+        zip_file = self.make_zip({"RaceMod0.pak": self.pak_data}, "0" * 32)
+        with self.assertLogs(self.logger, "WARNING") as logs:
+            dest, method = import_zip_pak(zip_file, "RaceMod0.pak", self.dest_dir, self.logger)
+        self.assertIn("MD5", logs.output[0])
+        self.assertEqual((dest.read_bytes(), method), (self.pak_data, "zip"))
+        self.assertFalse(dest.with_name(dest.name + PART_SUFFIX).exists())
+        self.assertEqual(import_zip_pak(zip_file, "RaceMod0.pak", self.dest_dir, self.logger), (dest, "exists"))
+    
+    def test_macosx_entries_ignored(self):
+        # __MACOSX中的同名文件不算pak，info.json中唯一的MOD仍然对应唯一的pak
+        zip_file = self.make_zip({"Mod/RaceMod0.pak": self.pak_data, "__MACOSX/Mod/._RaceMod0.pak": b"\0\5\26\7"}, "0" * 32)
+        self.assertEqual(list_zip_paks(zip_file), ["Mod/RaceMod0.pak"])
+        with self.assertLogs(self.logger, "WARNING"):
+            import_zip_pak(zip_file, "Mod/RaceMod0.pak", self.dest_dir, self.logger)
+    
+    def test_duplicate_names_skipped(self):
+        """不同子文件夹中的同名pak只导入第一个，其余报告"""
+        other = support.write_mod_pak(self.work_dir / "src2" / "RaceMod0.pak", support.race_mod_files(1)).read_bytes()
+        zip_file = self.make_zip({"v1/RaceMod0.pak": self.pak_data, "v2/racemod0.pak": other, "RaceMod1.pak": other})
+        loose_pak = self.work_dir / "src" / "RaceMod1.pak"
+        loose_pak.write_bytes(other)
+        
+        app = support.make_app(self.work_dir / "app")
+        items = app._expand_import_files([str(zip_file), str(loose_pak)])
+        self.assertEqual(items, [(str(zip_file), "v1/RaceMod0.pak"), (str(zip_file), "RaceMod1.pak")])
+        errors = [message['text'] for message in support.drain(app) if message['type'] == "error"]
+        self.assertEqual(len(errors), 2)
+        self.assertIn("v2/racemod0.pak", errors[0])
+        self.assertIn("RaceMod1.pak", errors[1])
+
+
+if __name__ == "__main__":
+    unittest.main()